@@ -0,0 +1,257 @@
+import mmap
+import os
+import struct
+import threading
+import uuid
+import zlib
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Iterator, Optional
+
+# Транзакция из архива: те же поля и порядок, что и у строк выгрузки
+ArchivedTransaction = namedtuple(
+    "ArchivedTransaction",
+    [
+        "id",
+        "wallet_id",
+        "operation_type",
+        "amount",
+        "previous_balance",
+        "new_balance",
+        "created_at",
+    ],
+)
+
+MAGIC = b"WSEG\x01"
+FOOTER_MAGIC = b"WIDX"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Строка блока: id, тип операции, суммы в копейках, created_at в микросекундах
+_ROW = struct.Struct("<16sBqqqq")
+# Неизвестный баланс (NULL) операции над одной полосой кошелька
+_NO_BALANCE = -(2**63)
+# Запись индекса: кошелек, время самой старой и самой новой строки блока,
+# смещение и длина сжатого блока, количество строк
+_ENTRY = struct.Struct("<16sqqQII")
+# Окончание файла: смещение индекса, количество записей индекса
+_FOOTER = struct.Struct("<QI4s")
+
+_OPERATIONS = {"DEPOSIT": 0, "WITHDRAW": 1}
+_OPERATION_NAMES = {code: name for name, code in _OPERATIONS.items()}
+
+
+def to_micros(value: datetime) -> int:
+    """Момент времени в микросекундах от начала эпохи"""
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+def _cents(value: Optional[Decimal]) -> int:
+    return _NO_BALANCE if value is None else int(value.scaleb(2))
+
+
+def _from_cents(value: int) -> Optional[Decimal]:
+    return None if value == _NO_BALANCE else Decimal(value).scaleb(-2)
+
+
+class SegmentWriter:
+    """
+    Запись сегмента архива.
+
+    Строки передаются отсортированными по кошельку, затем от новых к старым.
+    Строки кошелька сжимаются блоками по ``block_rows`` строк, в конце файла
+    пишется индекс блоков по кошельку и интервалу времени. Файл пишется во
+    временный и переименовывается, поэтому сегмент появляется только целиком
+    """
+
+    def __init__(self, path: str, block_rows: int):
+        self.path = path
+        self.block_rows = block_rows
+        self._file = open(f"{path}.tmp", "wb")
+        self._file.write(MAGIC)
+        self._entries: list[bytes] = []
+        self._wallet: Optional[bytes] = None
+        self._rows: list[bytes] = []
+        self._times: list[int] = []
+        self.row_count = 0
+
+    def add(self, row) -> None:
+        wallet = row.wallet_id.bytes
+        if wallet != self._wallet or len(self._rows) >= self.block_rows:
+            self._flush_block()
+            self._wallet = wallet
+        created_at = to_micros(row.created_at)
+        self._rows.append(
+            _ROW.pack(
+                row.id.bytes,
+                _OPERATIONS[row.operation_type],
+                _cents(row.amount),
+                _cents(row.previous_balance),
+                _cents(row.new_balance),
+                created_at,
+            )
+        )
+        self._times.append(created_at)
+        self.row_count += 1
+
+    def _flush_block(self) -> None:
+        if not self._rows:
+            return
+        data = zlib.compress(b"".join(self._rows))
+        offset = self._file.tell()
+        self._file.write(data)
+        self._entries.append(
+            _ENTRY.pack(
+                self._wallet,
+                min(self._times),
+                max(self._times),
+                offset,
+                len(data),
+                len(self._rows),
+            )
+        )
+        self._rows = []
+        self._times = []
+
+    def close(self) -> None:
+        self._flush_block()
+        index_offset = self._file.tell()
+        self._file.write(b"".join(self._entries))
+        self._file.write(_FOOTER.pack(index_offset, len(self._entries), FOOTER_MAGIC))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        os.remove(f"{self.path}.tmp")
+
+
+class SegmentReader:
+    """
+    Чтение сегмента архива через mmap.
+
+    В память читается только индекс блоков, блоки кошелька распаковываются
+    по одному и только если их интервал времени пересекается с запрошенным
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"Файл {path} не является сегментом архива")
+        index_offset, count, magic = _FOOTER.unpack_from(
+            self._mmap, len(self._mmap) - _FOOTER.size
+        )
+        if magic != FOOTER_MAGIC:
+            raise ValueError(f"Поврежден индекс сегмента архива {path}")
+        self._entries = list(
+            _ENTRY.iter_unpack(
+                self._mmap[index_offset : index_offset + count * _ENTRY.size]
+            )
+        )
+        self._wallets = [entry[0] for entry in self._entries]
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def find_blocks(
+        self,
+        wallet_id: uuid.UUID,
+        newest: Optional[int] = None,
+        oldest: Optional[int] = None,
+    ) -> list[tuple]:
+        """
+        Записи индекса блоков кошелька от новых к старым.
+
+        ``newest`` и ``oldest`` (микросекунды) позволяют пропустить блоки вне
+        интервала, точную фильтрацию границ выполняет вызывающий. Читается
+        только индекс в памяти, блоки не распаковываются
+        """
+        wallet = wallet_id.bytes
+        blocks = []
+        position = bisect_left(self._wallets, wallet)
+        while position < len(self._entries) and self._wallets[position] == wallet:
+            entry = self._entries[position]
+            position += 1
+            _, block_oldest, block_newest, _, _, _ = entry
+            if newest is not None and block_oldest > newest:
+                continue
+            if oldest is not None and block_newest < oldest:
+                # Блоки кошелька идут от новых к старым, дальше только старше
+                break
+            blocks.append(entry)
+        return blocks
+
+    def read_block(
+        self, wallet_id: uuid.UUID, entry: tuple
+    ) -> list[ArchivedTransaction]:
+        """Распаковка блока из find_blocks: транзакции от новых к старым"""
+        _, _, _, offset, length, _ = entry
+        data = zlib.decompress(self._mmap[offset : offset + length])
+        return [
+            ArchivedTransaction(
+                uuid.UUID(bytes=raw_id),
+                wallet_id,
+                _OPERATION_NAMES[operation],
+                Decimal(amount).scaleb(-2),
+                _from_cents(previous),
+                _from_cents(new),
+                _from_micros(created_at),
+            )
+            for raw_id, operation, amount, previous, new, created_at in (
+                _ROW.iter_unpack(data)
+            )
+        ]
+
+    def scan(
+        self,
+        wallet_id: uuid.UUID,
+        newest: Optional[int] = None,
+        oldest: Optional[int] = None,
+    ) -> Iterator[ArchivedTransaction]:
+        """Транзакции кошелька от новых к старым, блоки читаются по одному"""
+        for entry in self.find_blocks(wallet_id, newest, oldest):
+            yield from self.read_block(wallet_id, entry)
+
+
+class SegmentCache:
+    """
+    Открытые сегменты архива с вытеснением давно не использованных.
+
+    Сегменты открываются и читаются из пула потоков, поэтому доступ
+    к кэшу защищен блокировкой. Вытесненный сегмент не закрывается явно:
+    его еще может читать другой поток, mmap закроется вместе с последней
+    ссылкой на читателя
+    """
+
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self._readers: OrderedDict[str, SegmentReader] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> SegmentReader:
+        with self._lock:
+            reader = self._readers.get(path)
+            if reader is None:
+                reader = self._readers[path] = SegmentReader(path)
+                while len(self._readers) > self.max_size:
+                    self._readers.popitem(last=False)
+            self._readers.move_to_end(path)
+            return reader
+
+    def clear(self) -> None:
+        with self._lock:
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
+
+
+segment_cache = SegmentCache()
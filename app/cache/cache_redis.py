@@ -1,92 +1,444 @@
+import asyncio
 import json
+import math
+import random
+import time
 import uuid
-from typing import Optional
+from datetime import date
+from typing import Any, Optional
 from functools import wraps
 import redis.asyncio as redis
 from loguru import logger
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+from app import metrics
+from app.cache.local_cache import LocalCache
+from app.config import settings
+from app.database import read_from_primary
 
 # Глобальный клиент Redis
 redis_client: Optional[redis.Redis] = None
 
+# Кэш в памяти процесса (L1) перед Redis (L2), включается CACHE_L1_ENABLED
+local_cache: Optional[LocalCache] = None
+_invalidation_listener: Optional[asyncio.Task] = None
+
+# Канал, через который все воркеры узнают об инвалидации кошельков
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Счетчики попаданий и промахов по уровням кэша
+cache_stats = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0}
+
+# Простые типы параметров, которые входят в ключ кэша
+_KEY_PARAM_TYPES = (str, int, float, bool, uuid.UUID, date)
+
+# Вычисляемые сейчас в этом процессе ключи (single-flight)
+_inflight: dict[str, asyncio.Future] = {}
+_LOCK_POLL_INTERVAL = 0.01
+# Снятие блокировки, только если она еще принадлежит этому запросу:
+# проверка и удаление в одной команде, иначе между ними блокировка может
+# истечь и достаться другому воркеру
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
 
 async def init_redis():
     """Инициализация Redis"""
     global redis_client
     try:
-        redis_client = redis.Redis(host="redis", port=6379, decode_responses=True)
+        redis_client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            decode_responses=True,
+        )
         await redis_client.ping()
         logger.info("Соединение с Redis выполнено успешно")
     except Exception as e:
         logger.warning(f"Redis не доступен: {e}")
         redis_client = None
+        return
+
+    if settings.CACHE_L1_ENABLED:
+        await enable_local_cache(settings.CACHE_L1_MAX_SIZE, settings.CACHE_L1_TTL)
 
 
 async def close_redis():
     """Закрытие соединения с Redis"""
+    await disable_local_cache()
     if redis_client:
         await redis_client.close()
 
 
-def cached(ttl: int = 60):
+async def enable_local_cache(max_size: int, ttl: float) -> None:
+    """Включение L1 кэша и подписки на инвалидации от других воркеров"""
+    global local_cache, _invalidation_listener
+    local_cache = LocalCache(max_size=max_size, ttl=ttl)
+    subscribed = asyncio.Event()
+    _invalidation_listener = asyncio.create_task(_listen_invalidations(subscribed))
+    await subscribed.wait()
+    logger.info(f"Включен L1 кэш: {max_size} записей, TTL {ttl} с")
+
+
+async def disable_local_cache() -> None:
+    """Отключение L1 кэша"""
+    global local_cache, _invalidation_listener
+    if _invalidation_listener:
+        _invalidation_listener.cancel()
+        try:
+            await _invalidation_listener
+        except asyncio.CancelledError:
+            pass
+    _invalidation_listener = None
+    local_cache = None
+
+
+async def _listen_invalidations(subscribed: asyncio.Event) -> None:
+    """Сброс записей L1 по сообщениям об инвалидации из Redis pub/sub"""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Сообщения, пришедшие до подписки, потеряны - сбрасываем весь L1
+            local_cache.clear()
+            subscribed.set()
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                for wallet_id in message["data"].split(","):
+                    local_cache.invalidate(uuid.UUID(wallet_id))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Подписка на инвалидации кэша прервана: {e}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+
+def get_cache_stats() -> dict:
+    """Счетчики и доли попаданий L1 и L2 кэша"""
+    stats: dict = dict(cache_stats)
+    for level in ("l1", "l2"):
+        total = stats[f"{level}_hits"] + stats[f"{level}_misses"]
+        stats[f"{level}_hit_ratio"] = stats[f"{level}_hits"] / total if total else 0.0
+    stats["l1_size"] = len(local_cache) if local_cache is not None else 0
+    return stats
+
+
+def generation_key(wallet_id: uuid.UUID) -> str:
+    """Ключ счетчика поколений кэша кошелька"""
+    return f"cache:gen:{wallet_id}"
+
+
+def build_cache_key(
+    namespace: str, wallet_id: uuid.UUID, generation: int, params: dict[str, Any]
+) -> str:
+    """
+    Ключ кэша: отдельное пространство имен для каждого эндпоинта,
+    поколение кошелька и значения параметров запроса
+    """
+    return f"cache:{namespace}:{wallet_id}:g{generation}" + _params_key(params)
+
+
+def _params_key(params: dict[str, Any]) -> str:
+    if not params:
+        return ""
+    return ":" + "&".join(f"{name}={params[name]}" for name in sorted(params))
+
+
+def _find_wallet_id(args, kwargs) -> Optional[uuid.UUID]:
+    """Поиск wallet_id в аргументах эндпоинта"""
+    wallet_id = kwargs.get("wallet_id")
+    if wallet_id:
+        return wallet_id
+    for arg in args:
+        if isinstance(arg, uuid.UUID):
+            return arg
+    return None
+
+
+def _find_response(kwargs) -> Optional[Response]:
+    """Поиск объекта Response, через который эндпоинт задает заголовки"""
+    for value in kwargs.values():
+        if isinstance(value, Response):
+            return value
+    return None
+
+
+def dump_entry(entry: dict) -> str:
+    """
+    Запись кэша: строка метаданных в JSON, затем готовое тело ответа.
+    Тело хранится как есть, чтобы при попадании не разбирать его заново
+    """
+    meta = {name: value for name, value in entry.items() if name != "body"}
+    return json.dumps(meta) + "\n" + entry["body"]
+
+
+def load_entry(raw: str) -> dict:
+    meta, body = raw.split("\n", 1)
+    entry = json.loads(meta)
+    entry["body"] = body
+    return entry
+
+
+def to_response(entry: dict) -> Response:
+    """
+    Готовый ответ из записи кэша: без повторной валидации pydantic
+    и сериализации в FastAPI
+    """
+    return Response(
+        content=entry["body"], media_type="application/json", headers=entry["headers"]
+    )
+
+
+async def _get_generation(wallet_id: uuid.UUID) -> int:
+    generation = await redis_client.get(generation_key(wallet_id))
+    return int(generation) if generation else 0
+
+
+def _should_refresh_early(entry: dict, beta: float) -> bool:
+    """
+    Вероятностное досрочное обновление (XFetch): чем ближе истечение TTL
+    и чем дольше вычисляется значение, тем выше шанс обновить его заранее
+    """
+    if beta <= 0 or "expires_at" not in entry:
+        return False
+    jitter = -entry["delta"] * beta * math.log(1.0 - random.random())
+    return time.time() + jitter >= entry["expires_at"]
+
+
+async def _wait_for_entry(cache_key: str, timeout: float) -> Optional[dict]:
+    """Ожидание значения, которое вычисляет другой воркер"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(_LOCK_POLL_INTERVAL)
+        try:
+            cached = await redis_client.get(cache_key)
+        except redis.RedisError:
+            return None
+        if cached:
+            return load_entry(cached)
+    return None
+
+
+async def _release_lock(lock_key: str, token: str) -> None:
+    try:
+        await redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+    except redis.RedisError as e:
+        logger.warning(f"Ошибка снятия блокировки кэша: {e}")
+
+
+def cached(
+    ttl: int = 60,
+    response_model: Any = None,
+    namespace: Optional[str] = None,
+    early_refresh_beta: float = 1.0,
+    lock_timeout: float = 5.0,
+):
+    """
+    Декоратор для кэширования ответов эндпоинтов кошелька.
+
+    Ключ включает имя эндпоинта, поколение кошелька и простые параметры
+    запроса (skip, limit, cursor...). После операции над кошельком
+    достаточно увеличить его поколение (см. invalidate_wallet_cache),
+    старые записи перестают читаться и истекают по TTL.
+
+    При промахе значение вычисляет только один запрос на ключ: внутри
+    процесса остальные ждут его future, между воркерами - блокировку
+    в Redis. Горячие ключи обновляются досрочно (``early_refresh_beta``,
+    0 - отключить), пока остальные запросы получают текущее значение.
+
+    Ответ сериализуется по ``response_model`` один раз (или берется готовое
+    тело, если эндпоинт вернул Response) и хранится готовым JSON; при работающем Redis декоратор возвращает готовый Response,
+    минуя повторную валидацию и сериализацию в FastAPI
+    """
+
     def decorator(func):
+        adapter = TypeAdapter(response_model if response_model else Any)
+        key_namespace = namespace or func.__name__
+
+        async def recompute(args, kwargs, cache_key, response, stale):
+            """Вычисление значения под блокировкой Redis"""
+            lock_key = f"{cache_key}:lock"
+            token = uuid.uuid4().hex
+            try:
+                locked = bool(
+                    await redis_client.set(
+                        lock_key, token, nx=True, px=int(lock_timeout * 1000)
+                    )
+                )
+                busy = not locked
+            except redis.RedisError as e:
+                # Без Redis вычисляем значение без блокировки
+                logger.warning(f"Ошибка блокировки кэша: {e}")
+                metrics.cache_errors.inc(key_namespace)
+                locked = busy = False
+
+            if busy and stale is not None:
+                # Значение уже обновляет другой воркер, отдаем текущее
+                return stale
+            if busy:
+                entry = await _wait_for_entry(cache_key, lock_timeout)
+                if entry is not None:
+                    return entry
+
+            try:
+                started = time.perf_counter()
+                # Реплика может отставать от поколения кошелька, поэтому
+                # значение для кэша всегда читается из основной БД
+                with read_from_primary():
+                    result = await func(*args, **kwargs)
+                delta = time.perf_counter() - started
+
+                if isinstance(result, Response):
+                    # Эндпоинт сам отдал готовое тело ответа
+                    body = result.body.decode()
+                else:
+                    # Тело сериализуется один раз в том же виде, что и в FastAPI
+                    body = adapter.dump_json(
+                        adapter.validate_python(result, from_attributes=True)
+                    ).decode()
+                entry = {
+                    "body": body,
+                    "headers": dict(response.headers) if response is not None else {},
+                    "expires_at": time.time() + ttl,
+                    "delta": delta,
+                }
+
+                logger.debug("Создаем новый кэш: {}", cache_key)
+                try:
+                    await redis_client.setex(cache_key, ttl, dump_entry(entry))
+                except redis.RedisError as e:
+                    logger.warning(f"Ошибка записи кэша: {e}")
+                    metrics.cache_errors.inc(key_namespace)
+                return entry
+            finally:
+                if locked:
+                    await _release_lock(lock_key, token)
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
             if not redis_client:
                 return await func(*args, **kwargs)
 
-            # Для GET /{wallet_id} - используем только wallet_id
-            # wallet_id будет первым аргументом после self (если есть)
-            wallet_id = None
-
-            # Ищем wallet_id в аргументах
-            for arg in args:
-                if isinstance(arg, uuid.UUID):
-                    wallet_id = arg
-                    break
-
-            # Если не нашли в позиционных аргументах, ищем в именованных
-            if not wallet_id:
-                wallet_id = kwargs.get("wallet_id")
-
+            wallet_id = _find_wallet_id(args, kwargs)
             if not wallet_id:
                 # Если не можем найти wallet_id, не кэшируем
                 return await func(*args, **kwargs)
 
-            cache_key = f"cache:wallet:{wallet_id}"
+            params = {
+                name: value
+                for name, value in kwargs.items()
+                if name != "wallet_id"
+                and (value is None or isinstance(value, _KEY_PARAM_TYPES))
+            }
+            response = _find_response(kwargs)
 
-            # Проверяем кэш
-            cached = await redis_client.get(cache_key)
-            if cached:
-                logger.debug(f"Используется кэш: {cache_key}")
-                return json.loads(cached)
+            # L1: ключ без поколения, инвалидация приходит через pub/sub
+            if local_cache is not None:
+                local_key = f"{key_namespace}:{wallet_id}" + _params_key(params)
+                local_version = local_cache.version(wallet_id)
+                entry = local_cache.get(local_key)
+                if entry is not None:
+                    cache_stats["l1_hits"] += 1
+                    return to_response(entry)
+                cache_stats["l1_misses"] += 1
 
-            # Выполняем и кэшируем
-            result = await func(*args, **kwargs)
+            try:
+                generation = await _get_generation(wallet_id)
+                cache_key = build_cache_key(
+                    key_namespace, wallet_id, generation, params
+                )
+                cached = await redis_client.get(cache_key)
+            except redis.RedisError as e:
+                logger.warning(f"Ошибка чтения кэша: {e}")
+                metrics.cache_errors.inc(key_namespace)
+                return await func(*args, **kwargs)
 
-            # Сериализуем результат перед кэшированием
-            if hasattr(result, "dict"):
-                # Для Pydantic моделей
-                serialized = result.dict()
-            elif hasattr(result, "__dict__"):
-                # Для обычных объектов
-                serialized = vars(result)
+            stale = None
+            if cached:
+                cache_stats["l2_hits"] += 1
+                metrics.cache_hits.inc(key_namespace)
+                entry = load_entry(cached)
+                if not _should_refresh_early(entry, early_refresh_beta):
+                    logger.debug("Используется кэш: {}", cache_key)
+                    if local_cache is not None:
+                        local_cache.set(local_key, wallet_id, entry, local_version)
+                    return to_response(entry)
+                logger.debug("Досрочное обновление кэша: {}", cache_key)
+                stale = entry
             else:
-                serialized = result
+                cache_stats["l2_misses"] += 1
+                metrics.cache_misses.inc(key_namespace)
 
-            logger.debug(f"Создаем новый кэш: {cache_key}")
-            await redis_client.setex(
-                cache_key, ttl, json.dumps(serialized, default=str)
-            )
-            return result
+            # Single-flight: пока ключ вычисляется, остальные ждут результат
+            inflight = _inflight.get(cache_key)
+            if inflight is not None:
+                try:
+                    entry = await asyncio.shield(inflight)
+                except asyncio.CancelledError:
+                    if not inflight.cancelled():
+                        raise
+                    return await func(*args, **kwargs)
+                return to_response(entry)
+
+            future = asyncio.get_running_loop().create_future()
+            _inflight[cache_key] = future
+            try:
+                entry = await recompute(args, kwargs, cache_key, response, stale)
+            except Exception as e:
+                future.set_exception(e)
+                # Ошибка уже передана ожидающим, повторно не сообщаем о ней
+                future.exception()
+                raise
+            except BaseException:
+                future.cancel()
+                raise
+            finally:
+                _inflight.pop(cache_key, None)
+
+            future.set_result(entry)
+            if local_cache is not None:
+                local_cache.set(local_key, wallet_id, entry, local_version)
+            return to_response(entry)
 
         return wrapper
 
     return decorator
 
 
-def invalidate_cache(pattern: str):
+async def invalidate_wallet_cache(*wallet_ids: uuid.UUID) -> None:
     """
-    Декоратор для инвалидации кэша
+    Инвалидация кэша кошельков: один INCR счетчика поколений на кошелек,
+    без поиска и удаления ключей. Если включен L1, остальные воркеры
+    узнают об инвалидации через pub/sub
+    """
+    if not redis_client or not wallet_ids:
+        return
+    wallet_ids = set(wallet_ids)
+    if local_cache is not None:
+        for wallet_id in wallet_ids:
+            local_cache.invalidate(wallet_id)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for wallet_id in wallet_ids:
+                pipe.incr(generation_key(wallet_id))
+            if local_cache is not None:
+                pipe.publish(INVALIDATION_CHANNEL, ",".join(str(w) for w in wallet_ids))
+            await pipe.execute()
+        logger.debug("Кэш инвалидирован для кошельков: {}", len(wallet_ids))
+    except redis.RedisError as e:
+        logger.warning(f"Ошибка инвалидации кэша: {e}")
+
+
+def invalidate_cache():
+    """
+    Декоратор для инвалидации кэша кошелька после успешной операции
     """
 
     def decorator(func):
@@ -94,14 +446,39 @@ def invalidate_cache(pattern: str):
         async def wrapper(*args, **kwargs):
             # Выполняем функцию
             result = await func(*args, **kwargs)
-            # Удаляем кэш по паттерну
-            if redis_client:
-                keys = await redis_client.keys(pattern)
-                if keys:
-                    await redis_client.delete(*keys)
-                    logger.debug(f"Кэш инвалидирован: {pattern}")
+            wallet_id = _find_wallet_id(args, kwargs)
+            if wallet_id:
+                await invalidate_wallet_cache(wallet_id)
             return result
 
         return wrapper
 
     return decorator
+
+
+def _idempotency_key(key: str) -> str:
+    return f"idempotency:{key}"
+
+
+async def get_idempotency_record(key: str) -> Optional[dict]:
+    """Сохраненный результат операции по ключу идемпотентности"""
+    if not redis_client:
+        return None
+    try:
+        raw = await redis_client.get(_idempotency_key(key))
+    except redis.RedisError as e:
+        logger.warning(f"Ошибка чтения ключа идемпотентности: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+async def set_idempotency_record(key: str, record: dict, ttl: int) -> None:
+    """Сохранение результата операции по ключу идемпотентности"""
+    if not redis_client:
+        return
+    try:
+        await redis_client.setex(
+            _idempotency_key(key), ttl, json.dumps(record, default=str)
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Ошибка записи ключа идемпотентности: {e}")
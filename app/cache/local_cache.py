@@ -0,0 +1,76 @@
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class LocalCache:
+    """
+    Кэш в памяти процесса (L1) с ограничением размера, TTL и вытеснением LRU.
+
+    Записи группируются по кошельку, чтобы инвалидировать все ответы
+    кошелька сразу. Счетчик версий кошелька защищает от записи в L1
+    значения, прочитанного до инвалидации
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, uuid.UUID, Any]] = OrderedDict()
+        self._by_wallet: dict[uuid.UUID, set[str]] = {}
+        self._versions: dict[uuid.UUID, int] = {}
+        self._epoch = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def version(self, wallet_id: uuid.UUID) -> tuple[int, int]:
+        return self._epoch, self._versions.get(wallet_id, 0)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, wallet_id, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key, wallet_id)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(
+        self, key: str, wallet_id: uuid.UUID, value: Any, version: tuple[int, int]
+    ) -> None:
+        """Сохранить значение, если кошелек не инвалидировали после чтения"""
+        if version != self.version(wallet_id):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, wallet_id, value)
+        self._entries.move_to_end(key)
+        self._by_wallet.setdefault(wallet_id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            old_key, (_, old_wallet_id, _) = next(iter(self._entries.items()))
+            self._remove(old_key, old_wallet_id)
+
+    def invalidate(self, wallet_id: uuid.UUID) -> None:
+        if len(self._versions) >= self.max_size:
+            # Счетчики версий не должны расти бесконечно: сбрасываем их,
+            # меняя эпоху, что отменяет все незавершенные записи в L1
+            self._versions.clear()
+            self._epoch += 1
+        self._versions[wallet_id] = self._versions.get(wallet_id, 0) + 1
+        for key in self._by_wallet.pop(wallet_id, ()):
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_wallet.clear()
+        self._versions.clear()
+        self._epoch += 1
+
+    def _remove(self, key: str, wallet_id: uuid.UUID) -> None:
+        self._entries.pop(key, None)
+        keys = self._by_wallet.get(wallet_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_wallet[wallet_id]
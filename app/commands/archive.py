@@ -0,0 +1,33 @@
+"""
+Перенос месяцев старше срока хранения из БД в сегменты архива.
+
+    python -m app.commands.archive --retention-months 12
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+
+from loguru import logger
+
+from app.config import settings
+from app.database import AsyncSessionLocal, engine
+from app.services.archive import ArchiveService
+from app.utils.partition import add_months, month_start
+
+
+async def main(retention_months: int):
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -retention_months)
+    async with AsyncSessionLocal() as session:
+        archived = await ArchiveService(session).archive_before(cutoff)
+    logger.success(f"Перенесено в архив партиций: {len(archived)} {archived}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--retention-months", type=int, default=settings.ARCHIVE_RETENTION_MONTHS
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.retention_months))
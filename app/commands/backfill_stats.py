@@ -0,0 +1,33 @@
+"""
+Заполнение дневной сводки операций по существующей истории транзакций.
+
+    python -m app.commands.backfill_stats --batch-size 500
+"""
+
+import argparse
+import asyncio
+
+from loguru import logger
+
+from app.cache.cache_redis import close_redis, init_redis
+from app.database import AsyncSessionLocal, engine
+from app.services.stats import WalletStatsService
+
+
+async def main(batch_size: int):
+    # Кэш пересчитанных кошельков инвалидируется после каждой пачки
+    await init_redis()
+    try:
+        async with AsyncSessionLocal() as session:
+            processed = await WalletStatsService(session).backfill(batch_size)
+    finally:
+        await close_redis()
+    logger.success(f"Сводка операций пересчитана для {processed} кошельков")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size))
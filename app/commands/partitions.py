@@ -0,0 +1,61 @@
+"""
+Обслуживание месячных партиций таблицы transactions.
+
+    python -m app.commands.partitions ensure --months-ahead 3
+    python -m app.commands.partitions detach --before 2024-01-01
+
+Отключенные партиции остаются отдельными таблицами transactions_yYYYYmMM:
+их можно выгрузить (pg_dump -t transactions_y2023m12) и удалить.
+
+Отключение на время DETACH блокирует все операции с transactions
+(ACCESS EXCLUSIVE), поэтому оно запускается только этой командой, не
+фоновой задачей приложения. Если блокировку не удалось получить за
+PARTITION_LOCK_TIMEOUT_MS, команда завершается ошибкой: повторите позже.
+Команда, как и фоновая задача, берет advisory-блокировку обслуживания
+партиций и завершается ошибкой, если ее держит другой процесс.
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+
+from loguru import logger
+
+from app.config import settings
+from app.database import AsyncSessionLocal, advisory_lock, engine
+from app.services.partition import PARTITION_LOCK, TransactionPartitionService
+from app.utils.dates import as_utc
+
+
+async def main(args) -> int:
+    try:
+        async with advisory_lock(engine, PARTITION_LOCK) as acquired:
+            if not acquired:
+                logger.error("Партиции обслуживает другой процесс, повторите позже")
+                return 1
+            async with AsyncSessionLocal() as session:
+                service = TransactionPartitionService(session)
+                if args.command == "ensure":
+                    names = await service.ensure_partitions(args.months_ahead)
+                else:
+                    before = as_utc(datetime.fromisoformat(args.before))
+                    names = await service.detach_partitions(before)
+        logger.success(f"Обработано партиций: {len(names)} {names}")
+        return 0
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    ensure = commands.add_parser("ensure", help="создать партиции заранее")
+    ensure.add_argument(
+        "--months-ahead", type=int, default=settings.TRANSACTIONS_PARTITIONS_AHEAD
+    )
+    detach = commands.add_parser("detach", help="отключить старые партиции")
+    detach.add_argument("--before", required=True, help="дата, например 2024-01-01")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,44 @@
+"""
+Режим полос баланса для очень нагруженных кошельков.
+
+    python -m app.commands.stripes enable <wallet_id> --stripes 16
+    python -m app.commands.stripes disable <wallet_id>
+
+В режиме полос баланс кошелька разделен на несколько строк wallet_stripes,
+поэтому конкурентные пополнения не ждут блокировку одной строки кошелька.
+"""
+
+import argparse
+import asyncio
+import uuid
+
+from loguru import logger
+
+from app.config import settings
+from app.database import AsyncSessionLocal, engine
+from app.services.wallet import WalletService
+
+
+async def main(args):
+    stripes = args.stripes if args.command == "enable" else 0
+    async with AsyncSessionLocal() as session:
+        service = WalletService(session)
+        await service.set_stripes(uuid.UUID(args.wallet_id), stripes)
+        wallet = await service.get_wallet_by_id(uuid.UUID(args.wallet_id))
+    logger.success(
+        f"Кошелек {wallet.id}: полос баланса {wallet.stripes}, баланс {wallet.balance}"
+    )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    enable = commands.add_parser("enable", help="разделить баланс на полосы")
+    enable.add_argument("wallet_id")
+    enable.add_argument("--stripes", type=int, default=settings.WALLET_STRIPES)
+    disable = commands.add_parser("disable", help="вернуть баланс в строку кошелька")
+    disable.add_argument("wallet_id")
+    asyncio.run(main(parser.parse_args()))
@@ -1,8 +1,10 @@
 import os
-from loguru import logger
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from app.log import configure_logging
+
 
 class Settings(BaseSettings):
     # БД
@@ -15,13 +17,33 @@ class Settings(BaseSettings):
     # Путь к тестоовому БД
     TEST_DB_URL: str
 
+    # Реплика для чтения (необязательно) и как часто проверять, до какой
+    # позиции WAL она воспроизвела журнал, миллисекунды
+    REPLICA_DB_URL: Optional[str] = None
+    REPLICA_STATUS_INTERVAL_MS: float = 10.0
+
     # Логирование
     FORMAT_LOG: str
     LOG_ROTATION: str
+    LOG_LEVEL: str = "INFO"
+    # Рабочий режим: запись в файл в отдельном потоке через очередь на
+    # LOG_QUEUE_SIZE записей, LOG_BACKUP_COUNT файлов после ротации
+    LOG_ASYNC: bool = False
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_BACKUP_COUNT: int = 10
+    # Записи в формате JSON
+    LOG_JSON: bool = False
+    # Доля сохраняемых записей ниже WARNING: по умолчанию и по шаблонам
+    # маршрутов, например {"/api/v1/wallets/{wallet_id}/operation": 0.01}
+    LOG_SAMPLE_RATE: float = 1.0
+    LOG_SAMPLE_RATES: dict[str, float] = {}
 
     # Настройки безопасности
     SECRET_KEY: str
     ALGORITHM: str
+    # Эндпоинты /admin (профилирование SQL) выключены по умолчанию, при
+    # включении требуют заголовок X-Admin-Token со значением SECRET_KEY
+    ADMIN_ENDPOINTS_ENABLED: bool = False
 
     # Настройки приложения
     DEBUG: bool
@@ -33,6 +55,62 @@ class Settings(BaseSettings):
     REDIS_PORT: int
     REDIS_DECODE_RESPONSE: bool
 
+    # Кэш в памяти процесса (L1) перед Redis
+    CACHE_L1_ENABLED: bool = False
+    CACHE_L1_MAX_SIZE: int = 10000
+    CACHE_L1_TTL: float = 5.0
+
+    # Группировка операций над одним кошельком (group commit)
+    OPERATION_COALESCING: bool = False
+    COALESCE_WINDOW_MS: float = 5.0
+    COALESCE_MAX_BATCH: int = 100
+
+    # Время жизни ключей идемпотентности операций, секунды
+    IDEMPOTENCY_KEY_TTL: int = 86400
+
+    # Снимки баланса: каждые N транзакций или каждые T секунд истории кошелька,
+    # учитываются транзакции старше LAG секунд, запуск каждые RUN_INTERVAL секунд
+    BALANCE_SNAPSHOT_EVERY: int = 1000
+    BALANCE_SNAPSHOT_INTERVAL: int = 86400
+    BALANCE_SNAPSHOT_LAG: int = 60
+    BALANCE_SNAPSHOT_RUN_INTERVAL: int = 300
+
+    # На сколько месяцев вперед создаются партиции таблицы транзакций
+    TRANSACTIONS_PARTITIONS_AHEAD: int = 3
+    # Сколько ждать блокировку transactions при отключении партиции (мс):
+    # пока DETACH ждет блокировку, операции с кошельками стоят за ним
+    PARTITION_LOCK_TIMEOUT_MS: int = 3000
+
+    # Архив старых транзакций: каталог сегментов, срок хранения в БД (месяцы)
+    # и количество строк в сжатом блоке сегмента
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_RETENTION_MONTHS: int = 12
+    ARCHIVE_BLOCK_ROWS: int = 1000
+
+    # Количество полос баланса по умолчанию при включении режима полос кошелька
+    WALLET_STRIPES: int = 16
+
+    # Максимальный размер страницы истории операций
+    HISTORY_MAX_PAGE_SIZE: int = 1000
+
+    # Размер пачки строк при потоковой выгрузке истории операций
+    EXPORT_CHUNK_SIZE: int = 1000
+
+    # Сколько кошельков создается одним INSERT (и одной транзакцией)
+    # при массовом создании
+    BULK_WALLETS_CHUNK_SIZE: int = 5000
+
+    # Профилирование SQL: включить при запуске, порог медленного запроса (мс)
+    # и сколько разных запросов хранить в статистике
+    SQL_PROFILING: bool = False
+    SQL_SLOW_QUERY_MS: float = 200.0
+    SQL_PROFILE_MAX_STATEMENTS: int = 2000
+
+    # Выполнение горячих запросов репозиториев: "orm" - через ORM SQLAlchemy,
+    # "asyncpg" - заранее скомпилированным SQL через подготовленные запросы
+    # адаптера asyncpg
+    REPOSITORY_BACKEND: Literal["orm", "asyncpg"] = "orm"
+
     @property
     def get_db(self) -> str:
         return (
@@ -50,9 +128,4 @@ settings = Settings()
 
 # Настройка логирования
 log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs.log.txt")
-logger.add(
-    log_file_path,
-    format=settings.FORMAT_LOG,
-    level="INFO",
-    rotation=settings.LOG_ROTATION,
-)
+configure_logging(settings, log_file_path)
@@ -1,27 +1,77 @@
-from typing import AsyncGenerator
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncGenerator, AsyncIterator, Optional
 
+from fastapi import Depends, Header
+from loguru import logger
+from sqlalchemy import func, select, text
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     create_async_engine,
     async_sessionmaker,
     AsyncAttrs,
 )
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app import metrics
 from app.config import settings
+from app.profiling import sql_profiler
+from app.utils.lsn import format_lsn, parse_lsn
 
 
 class Base(AsyncAttrs, DeclarativeBase):
     __abstract__ = True
 
 
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который отдает в метрики время ожидания соединения.
+    Метка пула - pool_logging_name движка
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.db_pool_wait.observe(
+                time.perf_counter() - started, self._orig_logging_name or "primary"
+            )
+
+
 # Создание асинхронного движка базы данных
 engine = create_async_engine(
     url=settings.get_db,
     echo=True if settings.DEBUG else False,
+    poolclass=InstrumentedPool,
+    pool_logging_name="primary",
     pool_size=20,
     max_overflow=40,
     pool_pre_ping=True,
 )
+metrics.track_pool("primary", engine)
+
+# Движок реплики для чтения (если задан REPLICA_DB_URL)
+replica_engine: Optional[AsyncEngine] = (
+    create_async_engine(
+        url=settings.REPLICA_DB_URL,
+        echo=True if settings.DEBUG else False,
+        poolclass=InstrumentedPool,
+        pool_logging_name="replica",
+        pool_size=20,
+        max_overflow=40,
+        pool_pre_ping=True,
+    )
+    if settings.REPLICA_DB_URL
+    else None
+)
+if replica_engine is not None:
+    metrics.track_pool("replica", replica_engine)
+
+if settings.SQL_PROFILING:
+    sql_profiler.enable(engine, replica_engine)
 
 # Создание фабрики сессий
 AsyncSessionLocal = async_sessionmaker(
@@ -32,13 +82,198 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+# Чтение только из основной БД в текущем контексте (см. read_from_primary)
+_read_primary: ContextVar[bool] = ContextVar("read_primary", default=False)
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Сессии только для чтения, которые выполнят первый запрос внутри блока,
+    читают основную БД, даже если выбрана реплика
+    """
+    reset = _read_primary.set(True)
+    try:
+        yield
+    finally:
+        _read_primary.reset(reset)
+
+
+class RoutingSession(Session):
+    """
+    Сессия, которая выбирает базу при первом запросе: реплику, если она
+    назначена сессии (info["replica"]) и чтение не переведено на основную БД
+    """
+
+    def get_bind(self, mapper=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None and not _read_primary.get():
+            return replica.sync_engine
+        return super().get_bind(mapper, **kw)
+
+
+class SessionRouter:
+    """
+    Маршрутизация сессий только для чтения между основной БД и репликой.
+
+    Запросы выполняются в режиме AUTOCOMMIT без BEGIN/COMMIT. Клиент,
+    получивший от операции токен согласованности (позицию WAL после
+    фиксации), передает его при чтении; пока реплика не воспроизвела
+    журнал до этой позиции, его чтения идут в основную БД. Последняя
+    известная позиция реплики хранится в процессе и запрашивается
+    у реплики не чаще, чем раз в ``refresh_interval`` секунд
+    """
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replica: Optional[AsyncEngine] = None,
+        refresh_interval: float = 0.01,
+    ):
+        self.primary = primary.execution_options(isolation_level="AUTOCOMMIT")
+        self.replica = (
+            replica.execution_options(isolation_level="AUTOCOMMIT")
+            if replica is not None
+            else None
+        )
+        self.refresh_interval = refresh_interval
+        self.session_factory = async_sessionmaker(
+            self.primary,
+            class_=AsyncSession,
+            sync_session_class=RoutingSession,
+            expire_on_commit=False,
+            autoflush=False,
+        )
+        self._replayed_lsn = 0
+        self._replayed_at = 0.0
+
+    async def session(self, token: Optional[str] = None) -> AsyncSession:
+        """Сессия только для чтения, которая читает реплику, если можно"""
+        session = self.session_factory()
+        if self.replica is not None and await self._replica_caught_up(token):
+            session.info["replica"] = self.replica
+        return session
+
+    async def consistency_token(self) -> Optional[str]:
+        """
+        Токен согласованности: позиция WAL основной БД после фиксации
+        операции. Без реплики токен не нужен и не запрашивается
+        """
+        if self.replica is None:
+            return None
+        async with self.primary.connect() as conn:
+            return await conn.scalar(text("SELECT pg_current_wal_insert_lsn()::text"))
+
+    async def _replica_caught_up(self, token: Optional[str]) -> bool:
+        if token is None:
+            return True
+        lsn = parse_lsn(token)
+        if lsn is None:
+            logger.warning(f"Неверный токен согласованности: {token}")
+            return False
+        if lsn <= self._replayed_lsn:
+            return True
+        if time.monotonic() - self._replayed_at < self.refresh_interval:
+            return False
+
+        self._replayed_at = time.monotonic()
+        try:
+            replayed = parse_lsn(await self._replay_lsn())
+        except Exception as e:
+            logger.warning(f"Реплика не доступна: {e}")
+            return False
+        if replayed is not None and replayed > self._replayed_lsn:
+            self._replayed_lsn = replayed
+        if lsn > self._replayed_lsn:
+            logger.opt(lazy=True).debug(
+                "Реплика отстает: {} < {}, чтение из основной БД",
+                lambda: format_lsn(self._replayed_lsn),
+                lambda: token,
+            )
+            return False
+        return True
+
+    async def _replay_lsn(self) -> Optional[str]:
+        """Позиция WAL, до которой реплика воспроизвела журнал"""
+        async with self.replica.connect() as conn:
+            return await conn.scalar(text("SELECT pg_last_wal_replay_lsn()::text"))
+
+
+session_router = SessionRouter(
+    engine, replica_engine, refresh_interval=settings.REPLICA_STATUS_INTERVAL_MS / 1000
+)
+
 
 async def get_async_db_session() -> AsyncGenerator[AsyncSession, None]:
-    """Зависимость для получения сессии базы данных"""
+    """
+    Зависимость для получения сессии базы данных.
+
+    Соединение берется из пула только при первом запросе к БД, поэтому
+    запрос, не дошедший до БД (например, ответ из кэша), не фиксирует
+    и не откатывает транзакцию
+    """
     async with AsyncSessionLocal() as session:
         try:
             yield session
-            await session.commit()
+            if session.in_transaction():
+                await session.commit()
         except Exception:
-            await session.rollback()
+            if session.in_transaction():
+                await session.rollback()
             raise
+
+
+@asynccontextmanager
+async def advisory_lock(bind: AsyncEngine, name: str) -> AsyncIterator[bool]:
+    """
+    Advisory-блокировка PostgreSQL ``name`` на время блока: True, если
+    взята, False, если ее держит другой процесс (без ожидания).
+
+    Блокировка уровня сессии держится на отдельном соединении в режиме
+    AUTOCOMMIT (без открытой транзакции) и снимается при выходе из блока
+    или при разрыве соединения, если процесс завершился аварийно
+    """
+    key = func.hashtext(name)
+    async with bind.execution_options(isolation_level="AUTOCOMMIT").connect() as conn:
+        acquired = await conn.scalar(select(func.pg_try_advisory_lock(key)))
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(select(func.pg_advisory_unlock(key)))
+
+
+def get_session_factory() -> async_sessionmaker:
+    """
+    Зависимость для получения фабрики сессий основной БД.
+
+    Тело потокового ответа отправляется после выхода из обработчика,
+    когда сессии из зависимостей уже могут быть закрыты, поэтому такие
+    ответы открывают свою сессию внутри генератора
+    """
+    return AsyncSessionLocal
+
+
+def get_session_router() -> SessionRouter:
+    """Зависимость для получения маршрутизатора сессий чтения"""
+    return session_router
+
+
+async def get_read_db_session(
+    consistency_token: Optional[str] = Header(
+        None,
+        alias="X-Consistency-Token",
+        description="Токен из ответа операции: чтение увидит результат этой операции",
+    ),
+    router: SessionRouter = Depends(get_session_router),
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Зависимость для получения сессии только для чтения.
+
+    Запросы выполняются без транзакции, поэтому в конце не нужен COMMIT,
+    а соединение возвращается в пул при закрытии сессии. Если настроена
+    реплика, сессия читает ее, кроме случая, когда реплика еще не дошла
+    до переданного токена согласованности
+    """
+    async with await router.session(consistency_token) as session:
+        yield session
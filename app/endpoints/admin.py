@@ -0,0 +1,89 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+
+from loguru import logger
+
+from app.config import settings
+from app.database import engine, replica_engine
+from app.profiling import sql_profiler
+from app.schemas.admin import SqlProfilingOrder, StatementStatsResponse
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Доступ к /admin: выключенные ADMIN_ENDPOINTS_ENABLED эндпоинты
+    отвечают 404, включенные требуют X-Admin-Token равный SECRET_KEY.
+    """
+    if not settings.ADMIN_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if x_admin_token is None or not secrets.compare_digest(
+        x_admin_token.encode(), settings.SECRET_KEY.encode()
+    ):
+        logger.warning("Отказ в доступе к /admin: неверный X-Admin-Token")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+
+router = APIRouter(
+    prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)]
+)
+
+
+def _statement_stats(limit: int, order_by: str) -> StatementStatsResponse:
+    return StatementStatsResponse(
+        enabled=sql_profiler.enabled,
+        slow_query_ms=sql_profiler.slow_query_threshold * 1000,
+        dropped=sql_profiler.dropped,
+        statements=sql_profiler.top(limit, order_by),
+    )
+
+
+@router.get(
+    "/sql/statements",
+    response_model=StatementStatsResponse,
+    summary="Самые затратные SQL запросы",
+)
+async def get_sql_statements(
+    limit: int = Query(20, ge=1, le=1000),
+    order_by: str = Query(
+        SqlProfilingOrder.TOTAL_TIME,
+        pattern=(
+            f"^({SqlProfilingOrder.TOTAL_TIME}|{SqlProfilingOrder.MEAN_TIME}"
+            f"|{SqlProfilingOrder.MAX_TIME}|{SqlProfilingOrder.CALLS})$"
+        ),
+        description="Сортировка: total_time, mean_time, max_time или calls",
+    ),
+):
+    """
+    Первые **limit** нормализованных запросов с местом вызова (метод
+    репозитория) по суммарному времени или другой сортировке.
+    """
+    return _statement_stats(limit, order_by)
+
+
+@router.delete(
+    "/sql/statements",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Сбросить статистику SQL запросов",
+)
+async def reset_sql_statements():
+    sql_profiler.reset()
+    logger.info("Статистика SQL запросов сброшена")
+
+
+@router.post(
+    "/sql/profiling",
+    response_model=StatementStatsResponse,
+    summary="Включить или выключить профилирование SQL",
+)
+async def set_sql_profiling(enabled: bool = Query(...)):
+    """
+    Включение профилирования SQL во время работы без перезапуска.
+    Действует только на текущий воркер.
+    """
+    if enabled:
+        sql_profiler.enable(engine, replica_engine)
+    else:
+        sql_profiler.disable()
+    return _statement_stats(20, SqlProfilingOrder.TOTAL_TIME)
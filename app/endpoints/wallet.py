@@ -1,32 +1,85 @@
+import time
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from loguru import logger
 
-from app.schemas.transaction import TransactionResponse
+from app.schemas.transaction import ExportFormat, TransactionResponse
 from app.schemas.wallet import (
     WalletResponse,
+    BulkWalletCreateRequest,
+    BalanceAtResponse,
+    StatsBucket,
+    WalletStatsItem,
+    WalletStatsResponse,
     ErrorResponse,
     OperationResponse,
     OperationRequest,
+    BatchMode,
+    BatchOperationRequest,
+    BatchOperationResponse,
+    BatchOperationResult,
+)
+from app import metrics
+from app.config import settings
+from app.database import (
+    SessionRouter,
+    get_async_db_session,
+    get_read_db_session,
+    get_session_factory,
+    get_session_router,
+)
+from app.exceptions import (
+    IdempotencyKeyReusedError,
+    InsufficientFundsError,
+    WalletError,
+    WalletNotFoundError,
 )
-from app.database import get_async_db_session
-from app.models.wallet import Transaction
-from app.exceptions import InsufficientFundsError, WalletNotFoundError
+from app.services.snapshot import BalanceSnapshotService
+from app.services.stats import WalletStatsService
 from app.services.wallet import WalletService
-from app.cache.cache_redis import cached, invalidate_cache
+from app.services.coalescer import OperationCoalescer, get_operation_coalescer
+from app.utils.dates import as_utc
+from app.utils.export import (
+    EXPORT_MEDIA_TYPES,
+    format_csv_header,
+    format_csv_rows,
+    format_history_json,
+    format_ndjson_rows,
+)
+from app.cache.cache_redis import cached, invalidate_cache, invalidate_wallet_cache
 
 router = APIRouter(prefix="/wallets", tags=["wallets"])
 
 
+async def _set_consistency_token(
+    response: Response, session_router: SessionRouter
+) -> None:
+    """
+    Заголовок X-Consistency-Token: с ним последующие чтения клиента увидят
+    результат операции, даже если реплика еще отстает
+    """
+    token = await session_router.consistency_token()
+    if token is not None:
+        response.headers["X-Consistency-Token"] = token
+
+
 @router.post(
     "/",
     response_model=WalletResponse,
     summary="Создать новый кошелек",
     status_code=status.HTTP_201_CREATED,
 )
-async def create_wallet(db: AsyncSession = Depends(get_async_db_session)):
+async def create_wallet(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db_session),
+    session_router: SessionRouter = Depends(get_session_router),
+):
     """
     Создание нового кошелька с нулевым балансом.
     """
@@ -34,17 +87,101 @@ async def create_wallet(db: AsyncSession = Depends(get_async_db_session)):
     try:
         wallet_service: WalletService = WalletService(db)
         wallet = await wallet_service.create_new_wallet()
-        logger.info(f"Кошелек с ID {wallet.id} создан успешно")
+        logger.info("Кошелек с ID {} создан успешно", wallet.id)
+        await _set_consistency_token(response, session_router)
         return wallet
     except Exception as e:
         # Логирование ошибки
-        logger.error(f"Не удалось создать кошелек: {e}", exc_info=True)
+        logger.opt(exception=True).error("Не удалось создать кошелек: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Не удалось создать кошелек",
         )
 
 
+@router.post(
+    "/bulk",
+    summary="Массовое создание кошельков",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        201: {
+            "content": {"application/x-ndjson": {}},
+            "description": (
+                'id созданных кошельков, по строке {"id": ...} на кошелек, '
+                'с репликой последняя строка {"consistency_token": ...}'
+            ),
+        }
+    },
+)
+async def create_wallets_bulk(
+    request: BulkWalletCreateRequest,
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+    session_router: SessionRouter = Depends(get_session_router),
+):
+    """
+    Массовое создание кошельков для импорта: **count** кошельков с нулевым
+    балансом или список **wallets** с id клиента и начальным балансом.
+
+    Кошельки вставляются пачками по BULK_WALLETS_CHUNK_SIZE одним запросом
+    на пачку, id созданных кошельков отдаются потоком NDJSON по мере
+    фиксации пачек. Уже существующие id пропускаются и в ответ не попадают.
+
+    Заголовки уже отправлены, когда фиксируется последняя пачка, поэтому
+    токен согласованности (как X-Consistency-Token других операций)
+    отдается последней строкой потока, если настроена реплика
+    """
+    total = request.count or len(request.wallets)
+    logger.info("Массовое создание кошельков: {}", total)
+    wallets = (
+        [(wallet.id, wallet.balance) for wallet in request.wallets]
+        if request.wallets
+        else None
+    )
+
+    async def content():
+        created = 0
+        started = time.perf_counter()
+        try:
+            # Сессия зависимости закрывается до отправки тела ответа,
+            # поток пишет в свою сессию
+            async with session_factory() as bulk_session:
+                chunks = WalletService(bulk_session).create_wallets(
+                    count=request.count,
+                    wallets=wallets,
+                    chunk_size=settings.BULK_WALLETS_CHUNK_SIZE,
+                )
+                async for wallet_ids in chunks:
+                    created += len(wallet_ids)
+                    yield "".join(
+                        f'{{"id":"{wallet_id}"}}\n' for wallet_id in wallet_ids
+                    ).encode()
+            token = await session_router.consistency_token()
+            if token is not None:
+                yield f'{{"consistency_token":"{token}"}}\n'.encode()
+        except Exception as e:
+            # Статус уже отправлен, клиент увидит оборванный поток
+            logger.opt(exception=True).error(
+                "Массовое создание кошельков прервано после {} из {}: {}",
+                created,
+                total,
+                e,
+            )
+            raise
+        logger.info(
+            "Создано кошельков: {} из {} за {:.2f} с",
+            created,
+            total,
+            time.perf_counter() - started,
+        )
+
+    return StreamingResponse(
+        content(),
+        status_code=status.HTTP_201_CREATED,
+        media_type="application/x-ndjson",
+    )
+
+
 @router.get(
     "/{wallet_id}",
     response_model=WalletResponse,
@@ -56,10 +193,10 @@ async def create_wallet(db: AsyncSession = Depends(get_async_db_session)):
         }
     },
 )
-@cached(ttl=60)  # Кэшируем на 1 минуту
+@cached(ttl=60, response_model=WalletResponse)  # Кэшируем на 1 минуту
 async def get_wallet_balance(
     wallet_id: uuid.UUID,
-    db: AsyncSession = Depends(get_async_db_session),
+    db: AsyncSession = Depends(get_read_db_session),
 ):
     """
     Получение текущего баланса кошелька по его UUID.
@@ -68,12 +205,13 @@ async def get_wallet_balance(
     wallet_service: WalletService = WalletService(db)
     wallet = await wallet_service.get_wallet_by_id(wallet_id)
     if not wallet:
-        logger.warning(f"Кошелек с ID {wallet_id} не найден")
+        logger.warning("Кошелек с ID {} не найден", wallet_id)
+        metrics.wallet_not_found.inc()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Кошелек с ID {wallet_id} не найден",
         )
-    logger.info(f"Кошелек {wallet_id} получен. Баланс кошелька {wallet.balance}")
+    logger.info("Кошелек {} получен. Баланс кошелька {}", wallet_id, wallet.balance)
     return wallet
 
 
@@ -82,48 +220,221 @@ async def get_wallet_balance(
     response_model=list[TransactionResponse],
     summary="Показать историю операций",
     responses={
+        400: {
+            "model": ErrorResponse,
+            "description": "Неверный курсор",
+        },
         404: {
             "model": ErrorResponse,
             "description": "Кошелек не найден",
         },
     },
 )
-@cached(ttl=60)  # Кэшируем на 1 минуту
+@cached(ttl=60, response_model=list[TransactionResponse])  # Кэшируем на 1 минуту
 async def show_wallet_transactions(
     wallet_id: uuid.UUID,
-    skip: int = 0,
-    limit: int = 100,
-    session: AsyncSession = Depends(get_async_db_session),
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_read_db_session),
 ):
     """
     Отобразить выполненные операции в текущем кошельке
+
+    Операции отдаются от новых к старым. Если есть следующая страница,
+    ее курсор возвращается в заголовке **X-Next-Cursor**; переданный
+    параметр **cursor** имеет приоритет над **skip**
     """
     wallet_service: WalletService = WalletService(session)
     wallet = await wallet_service.get_wallet_by_id(wallet_id)
 
     if not wallet:
+        metrics.wallet_not_found.inc()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Кошелек с ID {wallet_id} не найден",
         )
-    result: list[Transaction] = await wallet_service.get_wallet_transactions(
-        wallet_id, skip, limit
+    try:
+        result, next_cursor = await wallet_service.get_wallet_transactions(
+            wallet_id, skip, limit, cursor
+        )
+    except ValueError as e:
+        logger.warning("Ошибка проверки входных данных: {}", e)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    # Страница уже в формате list[TransactionResponse], повторная
+    # валидация и сериализация в FastAPI не нужна
+    return Response(
+        content=format_history_json(result),
+        media_type="application/json",
+        headers=dict(response.headers),
     )
-    if not result:
-        return {"message": f"У кошелька не было выполнено еще ни одной транзакций"}
 
-    return [
-        TransactionResponse(
-            id=res.id,
-            wallet_id=wallet_id,
-            operation_type=res.operation_type,
-            amount=res.amount,
-            previous_balance=res.previous_balance,
-            new_balance=res.new_balance,
-            created_at=res.created_at,
+
+@router.get(
+    "/{wallet_id}/transactions/export",
+    summary="Выгрузить историю операций",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}, "text/csv": {}},
+            "description": "История операций в формате NDJSON или CSV",
+        },
+        404: {
+            "model": ErrorResponse,
+            "description": "Кошелек не найден",
+        },
+    },
+)
+async def export_wallet_transactions(
+    wallet_id: uuid.UUID,
+    format: str = Query(
+        ExportFormat.NDJSON,
+        pattern=f"^({ExportFormat.NDJSON}|{ExportFormat.CSV})$",
+        description="Формат выгрузки: ndjson или csv",
+    ),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    session: AsyncSession = Depends(get_async_db_session),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+):
+    """
+    Потоковая выгрузка всей истории операций кошелька (от старых к новым).
+
+    Строки читаются из БД серверным курсором и отдаются пачками, поэтому
+    память не зависит от объема истории. Необязательные **date_from** и
+    **date_to** ограничивают интервал [date_from, date_to), время без
+    часового пояса считается временем UTC
+    """
+    date_from, date_to = as_utc(date_from), as_utc(date_to)
+    wallet_service: WalletService = WalletService(session)
+    wallet = await wallet_service.get_wallet_by_id(wallet_id)
+
+    if not wallet:
+        metrics.wallet_not_found.inc()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Кошелек с ID {wallet_id} не найден",
         )
-        for res in result
-    ]
+    logger.info("Выгрузка истории операций кошелька {} в формате {}", wallet_id, format)
+
+    async def content():
+        # Тело отправляется после выхода из обработчика, поэтому выгрузка
+        # открывает свою сессию: серверный курсор живет все время выгрузки
+        # и не зависит от порядка закрытия зависимостей
+        async with session_factory() as export_session:
+            partitions = WalletService(export_session).export_wallet_transactions(
+                wallet_id, date_from, date_to, settings.EXPORT_CHUNK_SIZE
+            )
+            if format == ExportFormat.CSV:
+                yield format_csv_header()
+            async for rows in partitions:
+                if format == ExportFormat.CSV:
+                    yield format_csv_rows(rows)
+                else:
+                    yield format_ndjson_rows(rows)
+
+    return StreamingResponse(
+        content(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="transactions_{wallet_id}.{format}"'
+            )
+        },
+    )
+
+
+@router.get(
+    "/{wallet_id}/balance",
+    response_model=BalanceAtResponse,
+    summary="Получить баланс кошелька на момент времени",
+    responses={
+        404: {
+            "model": ErrorResponse,
+            "description": "Кошелек не найден",
+        }
+    },
+)
+async def get_wallet_balance_at(
+    wallet_id: uuid.UUID,
+    at: Optional[datetime] = Query(
+        None,
+        description="Момент времени (без часового пояса - UTC), "
+        "по умолчанию - текущий баланс",
+    ),
+    db: AsyncSession = Depends(get_read_db_session),
+):
+    """
+    Получение баланса кошелька на произвольный момент времени.
+
+    Баланс считается от ближайшего снимка баланса, поэтому время ответа
+    не зависит от длины истории операций.
+    """
+    at = as_utc(at)
+    logger.debug("Запрос баланса кошелька {} на момент {}", wallet_id, at)
+    snapshot_service: BalanceSnapshotService = BalanceSnapshotService(db)
+    try:
+        balance = await snapshot_service.get_balance_at(wallet_id, at)
+    except WalletNotFoundError as e:
+        logger.warning("Кошелек с ID {} не найден", wallet_id)
+        metrics.wallet_not_found.inc()
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return BalanceAtResponse(
+        wallet_id=wallet_id,
+        balance=balance,
+        at=at or datetime.now(timezone.utc),
+    )
+
+
+@router.get(
+    "/{wallet_id}/stats",
+    response_model=WalletStatsResponse,
+    summary="Получить сводку операций кошелька",
+    responses={
+        404: {
+            "model": ErrorResponse,
+            "description": "Кошелек не найден",
+        }
+    },
+)
+@cached(ttl=60, response_model=WalletStatsResponse)  # Кэшируем на 1 минуту
+async def get_wallet_stats(
+    wallet_id: uuid.UUID,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    bucket: str = Query(
+        StatsBucket.DAY,
+        pattern=f"^({StatsBucket.DAY}|{StatsBucket.MONTH})$",
+        description="Период группировки: day или month",
+    ),
+    db: AsyncSession = Depends(get_read_db_session),
+):
+    """
+    Суммы и количество пополнений и списаний, минимальный и максимальный
+    баланс кошелька по дням или месяцам (UTC).
+
+    Читается только дневная сводка, границы **from** и **to** включительные.
+    """
+    logger.debug("Запрос сводки операций кошелька {}", wallet_id)
+    stats_service: WalletStatsService = WalletStatsService(db)
+    try:
+        rows = await stats_service.get_wallet_stats(
+            wallet_id, date_from, date_to, bucket
+        )
+    except WalletNotFoundError as e:
+        logger.warning("Кошелек с ID {} не найден", wallet_id)
+        metrics.wallet_not_found.inc()
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return WalletStatsResponse(
+        wallet_id=wallet_id,
+        bucket=bucket,
+        items=[WalletStatsItem.model_validate(row) for row in rows],
+    )
 
 
 @router.post(
@@ -146,11 +457,20 @@ async def show_wallet_transactions(
         },
     },
 )
-@invalidate_cache("cache:get_wallet_balance:*")  # Инвалидируем кэш при операциях
+@invalidate_cache()  # Инвалидируем кэш кошелька при операциях
 async def perform_wallet_operation(
     wallet_id: uuid.UUID,
     operation_request: OperationRequest,
+    response: Response,
     db: AsyncSession = Depends(get_async_db_session),
+    session_router: SessionRouter = Depends(get_session_router),
+    coalescer: Optional[OperationCoalescer] = Depends(get_operation_coalescer),
+    idempotency_key: Optional[str] = Header(
+        None,
+        alias="Idempotency-Key",
+        max_length=255,
+        description="Ключ идемпотентности: повтор с тем же ключом вернет прежний результат",
+    ),
 ):
     """
     Выполнение операции пополнения (DEPOSIT) или списания (WITHDRAW) средств с кошелька.
@@ -160,41 +480,145 @@ async def perform_wallet_operation(
     """
 
     logger.info(
-        f"Тип операции: {operation_request.operation_type}, запрашиваемая сумма: {operation_request.amount}"
+        "Тип операции: {}, запрашиваемая сумма: {}",
+        operation_request.operation_type,
+        operation_request.amount,
     )
     try:
-        wallet_service: WalletService = WalletService(db)
-        wallet, transaction = await wallet_service.perform_operation(
+        wallet_service: WalletService = WalletService(db, coalescer=coalescer)
+        transaction = await wallet_service.perform_operation(
             wallet_id=wallet_id,
             operation_type=operation_request.operation_type,
             amount=operation_request.amount,
+            idempotency_key=idempotency_key,
         )
 
         logger.info(
-            f"Операция выполнена успешно. "
-            f"Кошелек: {wallet_id}, Транзакция: {transaction.id}, "
-            f"Новый баланс: {wallet.balance}"
+            "Операция выполнена успешно. Кошелек: {}, Транзакция: {}, Новый баланс: {}",
+            wallet_id,
+            transaction.id,
+            transaction.new_balance,
         )
+        await _set_consistency_token(response, session_router)
         return OperationResponse(
             success=True,
             message=f"Операция {operation_request.operation_type} успешно выполнена",
             wallet_id=wallet_id,
-            new_balance=wallet.balance,
+            new_balance=transaction.new_balance,
             transaction_id=transaction.id,
         )
 
     except WalletNotFoundError as e:
-        logger.warning(f"Во время операции кошелек с ID {wallet_id} не был найден")
+        logger.warning("Во время операции кошелек с ID {} не был найден", wallet_id)
+        metrics.wallet_not_found.inc()
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except InsufficientFundsError as e:
-        logger.warning(f"Недостаточно средств для проведения операции: {wallet_id}")
+        logger.warning("Недостаточно средств для проведения операции: {}", wallet_id)
+        metrics.insufficient_funds.inc()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except IdempotencyKeyReusedError as e:
+        logger.warning("Ключ идемпотентности {} использован повторно", idempotency_key)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
     except ValueError as e:
-        logger.error(f"Ошибка проверки входных данных: {str(e)}")
+        logger.error("Ошибка проверки входных данных: {}", e)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
-        logger.error(f"Непредвиденная ошибка во время работы: {str(e)}")
+        logger.error("Непредвиденная ошибка во время работы: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Внутренняя ошибка сервера",
         )
+
+
+@router.post(
+    "/operations/batch",
+    response_model=BatchOperationResponse,
+    summary="Выполнить пакет операций над кошельками",
+    status_code=status.HTTP_200_OK,
+    responses={
+        422: {
+            "model": ErrorResponse,
+            "description": "Ошибка валидации",
+        },
+    },
+)
+async def perform_batch_operations(
+    batch_request: BatchOperationRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db_session),
+    session_router: SessionRouter = Depends(get_session_router),
+):
+    """
+    Выполнение пакета операций над несколькими кошельками в одной транзакции БД.
+
+    - **ALL_OR_NOTHING**: пакет применяется, только если все операции успешны
+    - **BEST_EFFORT**: применяются все успешные операции, ошибочные пропускаются
+    """
+    logger.info(
+        "Пакет операций: {}, режим: {}",
+        len(batch_request.operations),
+        batch_request.mode,
+    )
+    try:
+        wallet_service: WalletService = WalletService(db)
+        outcomes = await wallet_service.perform_batch_operations(
+            [
+                (item.wallet_id, item.operation_type, item.amount)
+                for item in batch_request.operations
+            ],
+            atomic=batch_request.mode == BatchMode.ALL_OR_NOTHING,
+        )
+    except Exception as e:
+        logger.error("Непредвиденная ошибка во время работы: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Внутренняя ошибка сервера",
+        )
+
+    results = []
+    for index, (item, outcome) in enumerate(zip(batch_request.operations, outcomes)):
+        # Транзакция - объект ORM или строка подготовленного запроса
+        if outcome is not None and not isinstance(outcome, WalletError):
+            results.append(
+                BatchOperationResult(
+                    index=index,
+                    wallet_id=item.wallet_id,
+                    success=True,
+                    new_balance=outcome.new_balance,
+                    transaction_id=outcome.id,
+                )
+            )
+        else:
+            if isinstance(outcome, WalletNotFoundError):
+                metrics.wallet_not_found.inc()
+            elif isinstance(outcome, InsufficientFundsError):
+                metrics.insufficient_funds.inc()
+            results.append(
+                BatchOperationResult(
+                    index=index,
+                    wallet_id=item.wallet_id,
+                    success=False,
+                    error=(
+                        str(outcome)
+                        if isinstance(outcome, WalletError)
+                        else "Операция отменена: пакет содержит ошибочные операции"
+                    ),
+                )
+            )
+
+    applied = sum(result.success for result in results)
+    if applied:
+        # Инвалидируем кэш всех кошельков, над которыми прошли операции
+        await invalidate_wallet_cache(
+            *(result.wallet_id for result in results if result.success)
+        )
+    logger.info("Пакет операций выполнен: {} из {}", applied, len(results))
+    if applied:
+        await _set_consistency_token(response, session_router)
+    return BatchOperationResponse(
+        success=applied == len(results),
+        applied=applied,
+        results=results,
+    )
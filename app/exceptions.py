@@ -29,3 +29,13 @@ class InsufficientFundsError(WalletError):
             f"Недостаточно средств на кошельке {wallet_id}. "
             f"Текущий баланс: {current_balance}, запрошено: {requested_amount}"
         )
+
+
+class IdempotencyKeyReusedError(WalletError):
+    """Ошибка: ключ идемпотентности использован для другого запроса"""
+
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(
+            f"Ключ идемпотентности {key} уже использован для другой операции"
+        )
@@ -0,0 +1,251 @@
+"""
+Журнал приложения для рабочего режима.
+
+При LOG_ASYNC записи журнала не пишутся в файл в потоке цикла событий:
+обработчик loguru только кладет запись в ограниченную очередь, а
+форматирование (JSON при LOG_JSON) и запись в файл с ротацией выполняет
+отдельный поток. Если очередь заполнена, запись отбрасывается и
+учитывается в метрике log_records_dropped_total.
+
+Успешные записи (уровень ниже WARNING) можно выборочно сохранять по
+маршрутам (LOG_SAMPLE_RATE, LOG_SAMPLE_RATES): решение принимается один
+раз на запрос, предупреждения и ошибки сохраняются всегда.
+"""
+
+import asyncio
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import threading
+import traceback
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from loguru import logger
+
+from app import metrics
+
+# Записи этого уровня и выше не отбрасываются выборкой
+_ALWAYS_KEEP_LEVEL = logger.level("WARNING").no
+
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(B|KB|MB|GB)\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3}
+
+_STOP = object()
+
+# Сколько записей из очереди поток записи объединяет в одну запись в файл
+_WRITE_BATCH = 1000
+
+# Запрос, в котором пишется запись: ASGI scope и решение выборки
+_request_context: ContextVar[Optional[dict]] = ContextVar(
+    "log_request_context", default=None
+)
+
+
+def parse_size(value: str) -> Optional[int]:
+    """Размер ротации вида "10 MB" в байтах, None - если задан не размером"""
+    match = _SIZE.match(value or "")
+    if match is None:
+        return None
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def format_json(record: dict) -> str:
+    """Запись loguru в виде одной строки JSON"""
+    data = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+    }
+    if record["extra"]:
+        data.update(record["extra"])
+    exception = record["exception"]
+    if exception is not None:
+        data["exception"] = "".join(
+            traceback.format_exception(
+                exception.type, exception.value, exception.traceback
+            )
+        )
+    return json.dumps(data, ensure_ascii=False, default=str) + "\n"
+
+
+def rotating_file_writer(
+    path: str, max_bytes: Optional[int], backup_count: int
+) -> Callable[[str], None]:
+    """Запись готовых строк в файл с ротацией по размеру"""
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes or 0, backupCount=backup_count, encoding="utf-8"
+    )
+    handler.terminator = ""
+
+    def write(line: str) -> None:
+        handler.emit(logging.makeLogRecord({"msg": line}))
+
+    return write
+
+
+class QueueSink:
+    """
+    Обработчик loguru с ограниченной очередью и потоком записи.
+
+    loguru вызывает ``write`` в потоке, где пишется запись, ``stop`` - при
+    удалении обработчика и выходе из процесса, ``complete`` - в
+    ``await logger.complete()``
+    """
+
+    def __init__(
+        self, write: Callable[[str], None], maxsize: int, serialize: bool = False
+    ):
+        self._write = write
+        self._serialize = serialize
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, message) -> None:
+        # Для JSON запись форматируется в потоке записи
+        item = message.record if self._serialize else str(message)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            metrics.log_records_dropped.inc("queue_full")
+
+    def _run(self) -> None:
+        while True:
+            # Все накопившиеся записи пишутся в файл одним вызовом
+            items = [self._queue.get()]
+            while len(items) < _WRITE_BATCH:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in items
+            try:
+                lines = [item for item in items if item is not _STOP]
+                if self._serialize:
+                    lines = [format_json(record) for record in lines]
+                if lines:
+                    self._write("".join(lines))
+            except Exception as e:
+                print(f"Ошибка записи журнала: {e!r}", file=sys.stderr)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    # Не flush: loguru вызывает flush потока после каждой записи
+    def drain(self) -> None:
+        """Ожидание записи всех записей, уже находящихся в очереди"""
+        self._queue.join()
+
+    async def complete(self) -> None:
+        await asyncio.to_thread(self.drain)
+
+    def stop(self) -> None:
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+
+
+class RouteSampler:
+    """
+    Фильтр loguru: записи ниже WARNING внутри запроса сохраняются с долей
+    ``rates[шаблон маршрута]`` (по умолчанию ``default_rate``), решение
+    принимается один раз на запрос. Шаблон маршрута добавляется в extra
+    записи как ``route``
+    """
+
+    def __init__(
+        self,
+        default_rate: float = 1.0,
+        rates: Optional[dict[str, float]] = None,
+        random_value: Callable[[], float] = random.random,
+    ):
+        self.default_rate = default_rate
+        self.rates = rates or {}
+        self._random_value = random_value
+
+    def __call__(self, record: dict) -> bool:
+        context = _request_context.get()
+        if context is None:
+            return True
+        route = context["scope"].get("route")
+        if route is None:
+            # Маршрут еще не найден, решение о запросе не принимается
+            return True
+        record["extra"]["route"] = route.path
+        if record["level"].no >= _ALWAYS_KEEP_LEVEL:
+            return True
+
+        keep = context["keep"]
+        if keep is None:
+            rate = self.rates.get(route.path, self.default_rate)
+            keep = context["keep"] = self._random_value() < rate
+        if not keep:
+            metrics.log_records_dropped.inc("sampled")
+        return keep
+
+
+class LogContextMiddleware:
+    """ASGI middleware: запрос, к которому относятся записи журнала"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_context.set({"scope": scope, "keep": None})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_context.reset(token)
+
+
+def configure_logging(settings, path: str) -> None:
+    """Обработчик журнала приложения по настройкам LOG_*"""
+    sampler = None
+    if settings.LOG_SAMPLE_RATE < 1 or settings.LOG_SAMPLE_RATES:
+        sampler = RouteSampler(settings.LOG_SAMPLE_RATE, settings.LOG_SAMPLE_RATES)
+
+    if not settings.LOG_ASYNC:
+        logger.add(
+            path,
+            format=settings.FORMAT_LOG,
+            level=settings.LOG_LEVEL,
+            rotation=settings.LOG_ROTATION,
+            filter=sampler,
+            serialize=settings.LOG_JSON,
+        )
+        return
+
+    # Обработчик stderr по умолчанию тоже пишет в потоке цикла событий
+    logger.remove()
+    max_bytes = parse_size(settings.LOG_ROTATION)
+    sink = QueueSink(
+        rotating_file_writer(path, max_bytes, settings.LOG_BACKUP_COUNT),
+        settings.LOG_QUEUE_SIZE,
+        serialize=settings.LOG_JSON,
+    )
+    logger.add(
+        sink,
+        # Для JSON форматируется только текст сообщения, остальное - в потоке записи
+        format="{message}" if settings.LOG_JSON else settings.FORMAT_LOG,
+        level=settings.LOG_LEVEL,
+        filter=sampler,
+    )
+    if max_bytes is None:
+        logger.warning(
+            "LOG_ROTATION задан не размером, при LOG_ASYNC ротация отключена: {}",
+            settings.LOG_ROTATION,
+        )
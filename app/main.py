@@ -1,14 +1,88 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from datetime import timedelta
 
 from loguru import logger
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
 
-from app.database import engine
+from app import metrics
+from app.database import AsyncSessionLocal, advisory_lock, engine
+from app.endpoints.admin import router as admin_router
 from app.endpoints.wallet import router as wallets_router
-from app.cache.cache_redis import init_redis, close_redis
+from app.cache.cache_redis import init_redis, close_redis, get_cache_stats
+from app.config import settings
+from app.log import LogContextMiddleware
+from app.repository.idempotency import IdempotencyRepository
+from app.services.partition import PARTITION_LOCK, TransactionPartitionService
+from app.services.snapshot import CHECKPOINT_LOCK, BalanceSnapshotService
+
+# Период очистки истекших ключей идемпотентности, секунды
+IDEMPOTENCY_CLEANUP_INTERVAL = 3600
+
+# Период проверки партиций таблицы транзакций, секунды
+PARTITION_MAINTENANCE_INTERVAL = 86400
+
+
+async def _purge_idempotency_keys():
+    """Периодическое удаление истекших ключей идемпотентности"""
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_CLEANUP_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as session:
+                async with session.begin():
+                    deleted = await IdempotencyRepository(session).delete_expired()
+            logger.info(f"Удалено истекших ключей идемпотентности: {deleted}")
+        except Exception as e:
+            logger.error(f"Не удалось удалить истекшие ключи идемпотентности: {e}")
+
+
+async def _checkpoint_balances():
+    """
+    Периодическое создание снимков баланса кошельков. Задача запущена
+    в каждом воркере, но запуск выполняет только взявший advisory-блокировку,
+    остальные его пропускают
+    """
+    while True:
+        await asyncio.sleep(settings.BALANCE_SNAPSHOT_RUN_INTERVAL)
+        try:
+            async with advisory_lock(engine, CHECKPOINT_LOCK) as acquired:
+                if not acquired:
+                    logger.debug("Снимки баланса создает другой процесс")
+                    continue
+                async with AsyncSessionLocal() as session:
+                    await BalanceSnapshotService(session).checkpoint(
+                        every=settings.BALANCE_SNAPSHOT_EVERY,
+                        interval=timedelta(seconds=settings.BALANCE_SNAPSHOT_INTERVAL),
+                        lag=timedelta(seconds=settings.BALANCE_SNAPSHOT_LAG),
+                    )
+        except Exception as e:
+            logger.error(f"Не удалось создать снимки баланса: {e}")
+
+
+async def _maintain_partitions():
+    """
+    Создание партиций транзакций заранее: при запуске и затем раз в сутки.
+    Старые партиции отключаются только командой app.commands.partitions:
+    DETACH блокирует таблицу transactions. Воркеры запускаются одновременно,
+    партиции создает только взявший advisory-блокировку, остальные
+    пропускают запуск
+    """
+    while True:
+        try:
+            async with advisory_lock(engine, PARTITION_LOCK) as acquired:
+                if acquired:
+                    async with AsyncSessionLocal() as session:
+                        await TransactionPartitionService(session).ensure_partitions(
+                            settings.TRANSACTIONS_PARTITIONS_AHEAD
+                        )
+                else:
+                    logger.debug("Партиции транзакций обслуживает другой процесс")
+        except Exception as e:
+            logger.error(f"Не удалось создать партиции транзакций: {e}")
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
 
 
 @asynccontextmanager
@@ -24,11 +98,22 @@ async def lifespan(app: FastAPI):
         logger.error(f"Не удалось подключиться к БД: {e}")
         raise
 
+    background = [
+        asyncio.create_task(_purge_idempotency_keys()),
+        asyncio.create_task(_checkpoint_balances()),
+        asyncio.create_task(_maintain_partitions()),
+    ]
     yield
     logger.info("Завершена работа приложения...")
+    for task in background:
+        task.cancel()
+    with suppress(asyncio.CancelledError):
+        await asyncio.gather(*background)
     await close_redis()
     await engine.dispose()
     logger.info("Соединение с БД закрыто")
+    # Дописываем записи журнала из очереди (LOG_ASYNC)
+    await logger.complete()
 
 
 app = FastAPI(
@@ -39,6 +124,8 @@ app = FastAPI(
 )
 
 
+app.add_middleware(LogContextMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -49,6 +136,9 @@ app.add_middleware(
 
 
 app.include_router(wallets_router, prefix="/api/v1", tags=["wallets"])
+# Доступ к /admin проверяет require_admin при каждом запросе, в схеме
+# OpenAPI эндпоинты видны только при ADMIN_ENDPOINTS_ENABLED
+app.include_router(admin_router, include_in_schema=settings.ADMIN_ENDPOINTS_ENABLED)
 
 
 @app.get("/")
@@ -72,6 +162,18 @@ async def health_check():
     return {"status": health}
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Статистика попаданий в L1 (память процесса) и L2 (Redis) кэш"""
+    return get_cache_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Метрики процесса в текстовом формате Prometheus"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 async def _check_redis() -> bool:
     """Проверка доступности Redis"""
     from app.cache.cache_redis import redis_client
@@ -0,0 +1,290 @@
+"""
+Метрики приложения в текстовом формате Prometheus без внешних зависимостей.
+
+Запись значения - обращение к словарю по кортежу меток и увеличение
+счетчика, накопительные суммы гистограмм считаются только при выдаче
+/metrics. Значения хранятся в памяти процесса, каждый воркер отдает свои.
+"""
+
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+
+# Границы гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: list["_Metric"] = []
+
+
+def _escape_help(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape(value: str) -> str:
+    return _escape_help(value).replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        registry: Optional[list] = _registry,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        if registry is not None:
+            registry.append(self)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = (
+            f"# HELP {self.name} {_escape_help(self.documentation)}\n"
+            f"# TYPE {self.name} {self.type_name}\n"
+        )
+        return header + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    """Счетчик, значения меток передаются позиционно: ``inc("GET", "/")``"""
+
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[str]:
+        if not self.labelnames and not self._values:
+            yield f"{self.name} 0"
+        for labels, value in list(self._values.items()):
+            yield (
+                f"{self.name}{_format_labels(self.labelnames, labels)} "
+                f"{_format_value(value)}"
+            )
+
+
+class Gauge(_Metric):
+    """
+    Текущее значение. ``function`` вызывается при выдаче метрик и
+    возвращает словарь {значения меток: значение}
+    """
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        function: Optional[Callable[[], dict[tuple, float]]] = None,
+        registry: Optional[list] = _registry,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: dict[tuple, float] = {}
+        self.function = function
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def samples(self) -> Iterable[str]:
+        values = self.function() if self.function else self._values
+        for labels, value in list(values.items()):
+            yield (
+                f"{self.name}{_format_labels(self.labelnames, labels)} "
+                f"{_format_value(value)}"
+            )
+
+
+class Histogram(_Metric):
+    """
+    Гистограмма: для каждого набора меток хранится число значений в каждом
+    интервале и их сумма, накопительные счетчики считаются при выдаче
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+        registry: Optional[list] = _registry,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        child = self._values.get(labels)
+        if child is None:
+            child = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        child[0][bisect_left(self.buckets, value)] += 1
+        child[1] += value
+
+    def count(self, *labels: str) -> int:
+        child = self._values.get(labels)
+        return sum(child[0]) if child else 0
+
+    def samples(self) -> Iterable[str]:
+        bounds = self.buckets + (math.inf,)
+        for labels, (counts, total) in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    self.labelnames + ("le",), labels + (_format_value(bound),)
+                )
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(total)}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+def render() -> str:
+    """Все метрики процесса в текстовом формате Prometheus"""
+    return "".join(metric.render() for metric in _registry)
+
+
+# Движки БД, состояние пулов которых отдается в метриках
+_engines: dict[str, object] = {}
+
+
+def track_pool(name: str, engine) -> None:
+    """Отдавать в метриках занятые и сверх лимита соединения пула движка"""
+    _engines[name] = engine
+
+
+def _pool_values(value: Callable) -> dict[tuple, float]:
+    return {
+        (name,): value(engine.pool)
+        for name, engine in _engines.items()
+        if hasattr(engine.pool, "overflow")
+    }
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки HTTP запроса",
+    ("method", "route", "status"),
+)
+operation_lock_wait = Histogram(
+    "wallet_operation_lock_wait_seconds",
+    "Время запроса, изменяющего баланс, включая ожидание блокировки строки баланса",
+)
+operation_lock_hold = Histogram(
+    "wallet_operation_lock_hold_seconds",
+    "Время от изменения баланса до фиксации транзакции, пока блокировка удерживается",
+)
+db_pool_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Время получения соединения из пула БД, включая открытие нового соединения",
+    ("pool",),
+)
+db_pool_in_use = Gauge(
+    "db_pool_connections_in_use",
+    "Соединения, выданные из пула БД",
+    ("pool",),
+    function=lambda: _pool_values(lambda pool: pool.checkedout()),
+)
+db_pool_overflow = Gauge(
+    "db_pool_overflow_connections",
+    "Открытые соединения сверх размера пула БД (max_overflow)",
+    ("pool",),
+    function=lambda: _pool_values(lambda pool: max(pool.overflow(), 0)),
+)
+cache_hits = Counter("cache_redis_hits_total", "Попадания в кэш Redis", ("endpoint",))
+cache_misses = Counter("cache_redis_misses_total", "Промахи кэша Redis", ("endpoint",))
+cache_errors = Counter(
+    "cache_redis_errors_total", "Ошибки обращения к кэшу Redis", ("endpoint",)
+)
+insufficient_funds = Counter(
+    "wallet_insufficient_funds_total", "Операции, отклоненные из-за нехватки средств"
+)
+wallet_not_found = Counter(
+    "wallet_not_found_total", "Запросы к несуществующим кошелькам"
+)
+log_records_dropped = Counter(
+    "log_records_dropped_total",
+    "Записи журнала, отброшенные выборкой или из-за заполненной очереди",
+    ("reason",),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: время обработки запроса по шаблону маршрута и статусу.
+    Запросы без найденного маршрута собираются под route="other"
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = "500"
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            request_duration.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                route.path if route is not None else "other",
+                status_code,
+            )
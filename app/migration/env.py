@@ -9,7 +9,15 @@ from alembic import context
 
 from app.config import settings
 from app.database import Base
-from app.models.wallet import Transaction, Wallet
+from app.models.wallet import (
+    ArchiveSegment,
+    BalanceSnapshot,
+    IdempotencyKey,
+    Transaction,
+    Wallet,
+    WalletDailyStats,
+    WalletStripe,
+)
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -30,6 +38,14 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+
+def include_name(name, type_, parent_names) -> bool:
+    """Партиции transactions создаются заданием, а не миграциями"""
+    if type_ == "table":
+        return not name.startswith("transactions_")
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -52,6 +68,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -61,7 +78,11 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -0,0 +1,48 @@
+"""Nullable balances of striped operations
+
+Revision ID: 5c2e9a7d1f3b
+Revises: 2f1685fea13f
+Create Date: 2026-10-17 09:12:31.402117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5c2e9a7d1f3b"
+down_revision: Union[str, None] = "2f1685fea13f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Операция над одной полосой не знает точный суммарный баланс кошелька
+    for table, columns in (
+        ("transactions", ("previous_balance", "new_balance")),
+        ("wallet_daily_stats", ("min_balance", "max_balance")),
+    ):
+        for column in columns:
+            op.alter_column(
+                table,
+                column,
+                existing_type=sa.Numeric(precision=20, scale=2),
+                nullable=True,
+            )
+
+
+def downgrade() -> None:
+    # Откат возможен, только если нет операций над одной полосой без баланса
+    for table, columns in (
+        ("transactions", ("previous_balance", "new_balance")),
+        ("wallet_daily_stats", ("min_balance", "max_balance")),
+    ):
+        for column in columns:
+            op.alter_column(
+                table,
+                column,
+                existing_type=sa.Numeric(precision=20, scale=2),
+                nullable=False,
+            )
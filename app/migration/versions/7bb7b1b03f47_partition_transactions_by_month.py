@@ -0,0 +1,145 @@
+"""Partition transactions by month
+
+Revision ID: 7bb7b1b03f47
+Revises: a6e4d2fa0ace
+Create Date: 2026-10-17 04:10:14.450686
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "7bb7b1b03f47"
+down_revision: Union[str, None] = "a6e4d2fa0ace"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Партиции создаются на столько месяцев вперед от текущего
+MONTHS_AHEAD = 3
+
+COLUMNS = (
+    "id, wallet_id, operation_type, amount, previous_balance, new_balance, created_at"
+)
+
+
+def _transactions_columns() -> list:
+    return [
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("wallet_id", sa.UUID(), nullable=False),
+        sa.Column("operation_type", sa.String(length=10), nullable=False),
+        sa.Column("amount", sa.Numeric(precision=20, scale=2), nullable=False),
+        sa.Column(
+            "previous_balance", sa.Numeric(precision=20, scale=2), nullable=False
+        ),
+        sa.Column("new_balance", sa.Numeric(precision=20, scale=2), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    ]
+
+
+def upgrade() -> None:
+    op.rename_table("transactions", "transactions_unpartitioned")
+    op.execute(
+        "ALTER INDEX transactions_pkey RENAME TO transactions_unpartitioned_pkey"
+    )
+    op.drop_index("ix_transactions_created_at", table_name="transactions_unpartitioned")
+    op.drop_index("ix_transactions_wallet_id", table_name="transactions_unpartitioned")
+    op.drop_index(
+        "ix_transactions_wallet_id_created_at",
+        table_name="transactions_unpartitioned",
+    )
+
+    # Ключ партиционирования обязан входить в первичный ключ.
+    # Отдельный индекс по wallet_id не нужен: это префикс
+    # ix_transactions_wallet_id_created_at
+    op.create_table(
+        "transactions",
+        *_transactions_columns(),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    op.create_index("ix_transactions_created_at", "transactions", ["created_at"])
+    op.create_index(
+        "ix_transactions_wallet_id_created_at",
+        "transactions",
+        ["wallet_id", "created_at"],
+    )
+
+    # Месячные партиции (границы по UTC) от самой старой транзакции
+    # до MONTHS_AHEAD месяцев вперед
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month timestamp;
+        BEGIN
+            FOR month IN SELECT generate_series(
+                date_trunc('month', coalesce(
+                    (SELECT min(created_at) FROM transactions_unpartitioned),
+                    now()
+                ) AT TIME ZONE 'UTC'),
+                date_trunc('month', now() AT TIME ZONE 'UTC')
+                    + interval '{MONTHS_AHEAD} months',
+                interval '1 month'
+            ) LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF transactions '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    'transactions_y' || to_char(month, 'YYYY')
+                        || 'm' || to_char(month, 'MM'),
+                    month AT TIME ZONE 'UTC',
+                    (month + interval '1 month') AT TIME ZONE 'UTC'
+                );
+            END LOOP;
+        END $$;
+        """)
+    # Страховочная партиция для строк вне созданных месяцев
+    op.execute("CREATE TABLE transactions_default PARTITION OF transactions DEFAULT")
+
+    op.execute(
+        f"INSERT INTO transactions ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM transactions_unpartitioned"
+    )
+    op.drop_table("transactions_unpartitioned")
+
+
+def downgrade() -> None:
+    op.rename_table("transactions", "transactions_partitioned")
+    op.execute(
+        "ALTER INDEX ix_transactions_created_at "
+        "RENAME TO ix_transactions_partitioned_created_at"
+    )
+    op.execute(
+        "ALTER INDEX ix_transactions_wallet_id_created_at "
+        "RENAME TO ix_transactions_partitioned_wallet_id_created_at"
+    )
+    op.execute(
+        "ALTER TABLE transactions_partitioned "
+        "RENAME CONSTRAINT transactions_pkey TO transactions_partitioned_pkey"
+    )
+
+    op.create_table(
+        "transactions",
+        *_transactions_columns(),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute(
+        f"INSERT INTO transactions ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM transactions_partitioned"
+    )
+    op.create_index("ix_transactions_created_at", "transactions", ["created_at"])
+    op.create_index("ix_transactions_wallet_id", "transactions", ["wallet_id"])
+    op.create_index(
+        "ix_transactions_wallet_id_created_at",
+        "transactions",
+        ["wallet_id", "created_at"],
+    )
+    # Партиции удаляются вместе с родительской таблицей
+    op.drop_table("transactions_partitioned")
@@ -1,7 +1,18 @@
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
+from typing import Optional
 
-from sqlalchemy import String, Numeric, DateTime, CheckConstraint, Index
+from sqlalchemy import (
+    DDL,
+    String,
+    Numeric,
+    DateTime,
+    Date,
+    Integer,
+    CheckConstraint,
+    Index,
+    event,
+)
 from sqlalchemy.orm import Mapped
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID
@@ -29,6 +40,14 @@ class Wallet(Base):
         nullable=False,
         default=0.00,
     )
+    # Количество полос баланса (0 - баланс хранится в этой строке). В режиме
+    # полос баланс кошелька - сумма балансов в wallet_stripes
+    stripes: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -51,6 +70,36 @@ class Wallet(Base):
         return f"<Wallet(id={self.id}, balance={self.balance})>"
 
 
+class WalletStripe(Base):
+    """Полоса баланса кошелька в режиме полос (для очень нагруженных кошельков)"""
+
+    __tablename__ = "wallet_stripes"
+
+    wallet_id: Mapped[str] = mapped_column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        nullable=False,
+    )
+    stripe: Mapped[int] = mapped_column(
+        Integer,
+        primary_key=True,
+        nullable=False,
+    )
+    balance: Mapped[Decimal] = mapped_column(
+        Numeric(precision=20, scale=2),
+        nullable=False,
+        default=0,
+    )
+
+    # Каждая полоса неотрицательна, поэтому и сумма полос неотрицательна
+    __table_args__ = (
+        CheckConstraint("balance >= 0", name="non_negative_stripe_balance"),
+    )
+
+    def __repr__(self):
+        return f"<WalletStripe(wallet_id={self.wallet_id}, stripe={self.stripe}, balance={self.balance})>"
+
+
 class Transaction(Base):
     """Модель транзакции для аудита операций"""
 
@@ -65,7 +114,6 @@ class Transaction(Base):
     wallet_id: Mapped[str] = mapped_column(
         UUID(as_uuid=True),
         nullable=False,
-        index=True,
     )
     operation_type: Mapped[str] = mapped_column(
         String(10),
@@ -76,25 +124,205 @@ class Transaction(Base):
         Numeric(precision=20, scale=2),
         nullable=False,
     )
-    previous_balance: Mapped[Decimal] = mapped_column(
+    # Баланс кошелька до и после операции. NULL у операции над одной
+    # полосой кошелька в режиме полос: она не видит точный суммарный баланс
+    previous_balance: Mapped[Optional[Decimal]] = mapped_column(
         Numeric(precision=20, scale=2),
-        nullable=False,
+        nullable=True,
     )
-    new_balance: Mapped[Decimal] = mapped_column(
+    new_balance: Mapped[Optional[Decimal]] = mapped_column(
         Numeric(precision=20, scale=2),
-        nullable=False,
+        nullable=True,
     )
+    # Ключ партиционирования, поэтому входит в первичный ключ
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
+        primary_key=True,
         nullable=False,
     )
 
-    # Индексы для быстрого поиска транзакций по кошельку
+    # Индексы для быстрого поиска транзакций по кошельку,
+    # таблица разбита на месячные партиции по created_at
     __table_args__ = (
         Index("ix_transactions_wallet_id_created_at", "wallet_id", "created_at"),
         Index("ix_transactions_created_at", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
     def __repr__(self):
         return f"<Transaction(wallet_id={self.wallet_id}, operation={self.operation_type}, amount={self.amount})>"
+
+
+# Партиция для строк вне созданных месячных партиций (при create_all)
+event.listen(
+    Transaction.__table__,
+    "after_create",
+    DDL("CREATE TABLE transactions_default PARTITION OF transactions DEFAULT"),
+)
+
+
+class IdempotencyKey(Base):
+    """Ключ идемпотентности операции и сохраненный результат для повторов"""
+
+    __tablename__ = "idempotency_keys"
+
+    key: Mapped[str] = mapped_column(
+        String(255),
+        primary_key=True,
+        nullable=False,
+    )
+    wallet_id: Mapped[str] = mapped_column(
+        UUID(as_uuid=True),
+        nullable=False,
+    )
+    request_hash: Mapped[str] = mapped_column(
+        String(64),
+        nullable=False,
+    )
+    transaction_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        nullable=True,
+    )
+    new_balance: Mapped[Decimal] = mapped_column(
+        Numeric(precision=20, scale=2),
+        nullable=True,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+    )
+
+    # Индекс для очистки истекших ключей
+    __table_args__ = (Index("ix_idempotency_keys_expires_at", "expires_at"),)
+
+    def __repr__(self):
+        return f"<IdempotencyKey(key={self.key}, transaction_id={self.transaction_id})>"
+
+
+class BalanceSnapshot(Base):
+    """Контрольная точка баланса кошелька для запросов баланса на момент времени"""
+
+    __tablename__ = "balance_snapshots"
+
+    wallet_id: Mapped[str] = mapped_column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        nullable=False,
+    )
+    # Снимок учитывает все транзакции кошелька с created_at <= taken_at
+    taken_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        primary_key=True,
+        nullable=False,
+    )
+    balance: Mapped[Decimal] = mapped_column(
+        Numeric(precision=20, scale=2),
+        nullable=False,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self):
+        return f"<BalanceSnapshot(wallet_id={self.wallet_id}, taken_at={self.taken_at}, balance={self.balance})>"
+
+
+class WalletDailyStats(Base):
+    """Дневная сводка операций кошелька (по дням UTC)"""
+
+    __tablename__ = "wallet_daily_stats"
+
+    wallet_id: Mapped[str] = mapped_column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        nullable=False,
+    )
+    day: Mapped[date] = mapped_column(
+        Date,
+        primary_key=True,
+        nullable=False,
+    )
+    # Полоса кошелька в режиме полос (иначе 0): операции над разными полосами
+    # обновляют разные строки сводки и не ждут друг друга
+    stripe: Mapped[int] = mapped_column(
+        Integer,
+        primary_key=True,
+        nullable=False,
+        default=0,
+        server_default="0",
+    )
+    deposit_total: Mapped[Decimal] = mapped_column(
+        Numeric(precision=20, scale=2),
+        nullable=False,
+        default=0,
+    )
+    deposit_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+    )
+    withdraw_total: Mapped[Decimal] = mapped_column(
+        Numeric(precision=20, scale=2),
+        nullable=False,
+        default=0,
+    )
+    withdraw_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+    )
+    # Минимальный и максимальный баланс за день, включая баланс до первой
+    # операции. Операции без баланса (над одной полосой) не учитываются,
+    # NULL - за день не было операций с известным балансом
+    min_balance: Mapped[Optional[Decimal]] = mapped_column(
+        Numeric(precision=20, scale=2),
+        nullable=True,
+    )
+    max_balance: Mapped[Optional[Decimal]] = mapped_column(
+        Numeric(precision=20, scale=2),
+        nullable=True,
+    )
+
+    def __repr__(self):
+        return f"<WalletDailyStats(wallet_id={self.wallet_id}, day={self.day})>"
+
+
+class ArchiveSegment(Base):
+    """Сегмент архива: файл с транзакциями, перенесенными из БД"""
+
+    __tablename__ = "archive_segments"
+
+    name: Mapped[str] = mapped_column(
+        String(64),
+        primary_key=True,
+        nullable=False,
+    )
+    # Сегмент содержит транзакции с range_start <= created_at < range_end
+    range_start: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+    )
+    range_end: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+    )
+    row_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self):
+        return f"<ArchiveSegment(name={self.name}, rows={self.row_count})>"
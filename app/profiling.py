@@ -0,0 +1,222 @@
+"""
+Профилирование SQL по событиям движка SQLAlchemy.
+
+Для каждого нормализованного запроса (значения и списки параметров
+заменены на ``?``) и вызвавшего его метода репозитория накапливаются
+количество выполнений, суммарное и максимальное время и число строк.
+Запросы дольше порога пишутся в журнал медленных запросов, вместо
+значений параметров в журнал попадают только их типы.
+"""
+
+import re
+import sys
+import time
+from dataclasses import dataclass
+
+import greenlet
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+
+# Модули, методы которых считаются источником запроса (в порядке приоритета)
+_CALLER_MODULES = ("app.repository.", "app.services.", "app.")
+
+# Модули, которые пропускаются при поиске источника запроса
+_SKIP_MODULES = ("app.profiling", "app.database", "app.repository.prepared")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$.])-?\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(
+    r"\$\d+(?:::[A-Z_]+(?:\(\d+(?:,\s*\d+)*\))?(?: WITH(?:OUT)? TIME ZONE)?(?:\[\])?)?"
+    r"|%\(\w+\)s"
+)
+_PARAMETER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(\(\.\.\.\)|\(\?\))(?:\s*,\s*(?:\(\.\.\.\)|\(\?\)))+")
+_WHITESPACE = re.compile(r"\s+")
+
+# Сколько разных текстов запросов запоминать вместе с их нормализацией
+_NORMALIZED_CACHE_SIZE = 10000
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Текст запроса без значений: параметры и литералы заменяются на ``?``,
+    списки параметров (IN) и строк VALUES сворачиваются в один ``(...)``
+    """
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PARAMETER.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PARAMETER_LIST.sub("(...)", statement)
+    return _VALUES_LIST.sub(r"\1", statement)
+
+
+def redact_parameters(parameters) -> str:
+    """Параметры запроса для журнала: только типы значений"""
+    if isinstance(parameters, dict):
+        return (
+            "{"
+            + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items())
+            + "}"
+        )
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            # executemany: типы первой строки и количество строк
+            return f"{redact_parameters(parameters[0])} x {len(parameters)}"
+        return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+    return type(parameters).__name__
+
+
+def find_caller() -> str:
+    """
+    Метод приложения, выполнивший запрос: предпочтительно метод репозитория.
+
+    Обработчики событий движка выполняются в greenlet, который SQLAlchemy
+    создает для асинхронной сессии; стек вызвавших корутин доступен через
+    кадр родительского greenlet, ожидающего результат запроса
+    """
+    parent = greenlet.getcurrent().parent
+    frame = parent.gr_frame if parent is not None else sys._getframe(1)
+    found: dict[str, str] = {}
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.") and not module.startswith(_SKIP_MODULES):
+            for prefix in _CALLER_MODULES:
+                if module.startswith(prefix):
+                    found.setdefault(prefix, f"{module}.{frame.f_code.co_qualname}")
+                    break
+            if _CALLER_MODULES[0] in found:
+                break
+        frame = frame.f_back
+    for prefix in _CALLER_MODULES:
+        if prefix in found:
+            return found[prefix]
+    return "-"
+
+
+@dataclass
+class StatementStats:
+    """Накопленная статистика одного запроса из одного места вызова"""
+
+    statement: str
+    caller: str
+    calls: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    rows: int = 0
+    slow_calls: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "statement": self.statement,
+            "caller": self.caller,
+            "calls": self.calls,
+            "total_ms": round(self.total_time * 1000, 3),
+            "mean_ms": round(self.total_time * 1000 / self.calls, 3),
+            "max_ms": round(self.max_time * 1000, 3),
+            "rows": self.rows,
+            "slow_calls": self.slow_calls,
+        }
+
+
+class StatementProfiler:
+    """
+    Статистика выполнения SQL по событиям before/after_cursor_execute.
+
+    Включается и выключается во время работы (``enable``/``disable``).
+    Количество разных пар (запрос, место вызова) ограничено
+    ``max_statements``, остальные учитываются только в ``dropped``
+    """
+
+    def __init__(self, slow_query_threshold: float, max_statements: int):
+        self.slow_query_threshold = slow_query_threshold
+        self.max_statements = max_statements
+        self.stats: dict[tuple[str, str], StatementStats] = {}
+        self.dropped = 0
+        self._engines: list[AsyncEngine] = []
+        self._normalized: dict[str, str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._engines)
+
+    def enable(self, *engines: AsyncEngine) -> None:
+        for engine in engines:
+            if engine is None or engine in self._engines:
+                continue
+            event.listen(engine.sync_engine, "before_cursor_execute", self._before)
+            event.listen(engine.sync_engine, "after_cursor_execute", self._after)
+            self._engines.append(engine)
+        logger.info(f"Профилирование SQL включено, движков: {len(self._engines)}")
+
+    def disable(self) -> None:
+        for engine in self._engines:
+            event.remove(engine.sync_engine, "before_cursor_execute", self._before)
+            event.remove(engine.sync_engine, "after_cursor_execute", self._after)
+        self._engines = []
+        logger.info("Профилирование SQL выключено")
+
+    def reset(self) -> None:
+        self.stats = {}
+        self.dropped = 0
+
+    def top(self, limit: int = 20, order_by: str = "total_time") -> list[dict]:
+        """Запросы с наибольшим суммарным (или max/средним) временем"""
+        if order_by == "mean_time":
+            key = lambda s: s.total_time / s.calls
+        else:
+            key = lambda s: getattr(s, order_by)
+        items = sorted(self.stats.values(), key=key, reverse=True)
+        return [item.as_dict() for item in items[:limit]]
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        context._profiling_started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_profiling_started", None)
+        if started is None:
+            return
+        self._record(
+            statement, parameters, time.perf_counter() - started, cursor.rowcount
+        )
+
+    def _record(self, statement: str, parameters, elapsed: float, rows: int) -> None:
+        normalized = self._normalized.get(statement)
+        if normalized is None:
+            normalized = normalize_statement(statement)
+            if len(self._normalized) < _NORMALIZED_CACHE_SIZE:
+                self._normalized[statement] = normalized
+        caller = find_caller()
+
+        key = (normalized, caller)
+        stats = self.stats.get(key)
+        if stats is None:
+            if len(self.stats) >= self.max_statements:
+                self.dropped += 1
+                stats = None
+            else:
+                stats = self.stats[key] = StatementStats(normalized, caller)
+        slow = elapsed >= self.slow_query_threshold
+        if stats is not None:
+            stats.calls += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            stats.rows += max(rows, 0)
+            stats.slow_calls += slow
+
+        if slow:
+            logger.warning(
+                f"Медленный запрос {elapsed * 1000:.1f} мс, {caller}, "
+                f"строк: {rows}: {normalized} "
+                f"параметры: {redact_parameters(parameters)}"
+            )
+
+
+# Профилировщик процесса; движки подключаются в app.database, если включен
+# SQL_PROFILING, или во время работы через /admin/sql
+sql_profiler = StatementProfiler(
+    slow_query_threshold=settings.SQL_SLOW_QUERY_MS / 1000,
+    max_statements=settings.SQL_PROFILE_MAX_STATEMENTS,
+)
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.archive.segment import ArchivedTransaction, segment_cache, to_micros
+from app.config import settings
+from app.models.wallet import ArchiveSegment
+
+
+class ArchiveRepository:
+    """Каталог сегментов архива в БД и чтение транзакций из файлов сегментов"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.model = ArchiveSegment
+
+    @staticmethod
+    def segment_path(name: str) -> str:
+        return os.path.join(settings.ARCHIVE_DIR, f"{name}.seg")
+
+    async def list_segments(self) -> list[ArchiveSegment]:
+        """Сегменты архива от новых к старым"""
+        result = await self.session.execute(
+            select(self.model).order_by(self.model.range_start.desc())
+        )
+        return list(result.scalars().all())
+
+    async def add_segment(
+        self, name: str, range_start: datetime, range_end: datetime, row_count: int
+    ) -> None:
+        self.session.add(
+            ArchiveSegment(
+                name=name,
+                range_start=range_start,
+                range_end=range_end,
+                row_count=row_count,
+            )
+        )
+        await self.session.flush()
+
+    async def read_blocks(
+        self,
+        wallet_id: uuid.UUID,
+        segments: Iterable[ArchiveSegment],
+        newest: Optional[datetime] = None,
+        oldest: Optional[datetime] = None,
+        oldest_first: bool = False,
+    ) -> AsyncIterator[list[ArchivedTransaction]]:
+        """
+        Транзакции кошелька из сегментов (переданных от новых к старым)
+        по блокам: от новых к старым, с ``oldest_first`` - от старых к новым.
+
+        Сегменты и блоки вне интервала [oldest, newest] не читаются,
+        точные границы проверяет вызывающий. Блок распаковывается, только
+        когда нужен следующий, поэтому в памяти не больше одного блока.
+        Открытие сегментов и распаковка блоков идут в пуле потоков и не
+        останавливают цикл событий
+        """
+        newest_us = to_micros(newest) if newest else None
+        oldest_us = to_micros(oldest) if oldest else None
+        if oldest_first:
+            segments = reversed(list(segments))
+        for segment in segments:
+            if newest and segment.range_start > newest:
+                continue
+            if oldest and segment.range_end <= oldest:
+                continue
+            reader = await asyncio.to_thread(
+                segment_cache.get, self.segment_path(segment.name)
+            )
+            blocks = reader.find_blocks(wallet_id, newest=newest_us, oldest=oldest_us)
+            if oldest_first:
+                blocks.reverse()
+            for entry in blocks:
+                rows = await asyncio.to_thread(reader.read_block, wallet_id, entry)
+                if oldest_first:
+                    rows.reverse()
+                yield rows
+
+    async def read_history(
+        self,
+        wallet_id: uuid.UUID,
+        segments: Iterable[ArchiveSegment],
+        newest: Optional[datetime] = None,
+        oldest: Optional[datetime] = None,
+    ) -> AsyncIterator[ArchivedTransaction]:
+        """Транзакции кошелька из сегментов от новых к старым (см. read_blocks)"""
+        async for rows in self.read_blocks(wallet_id, segments, newest, oldest):
+            for row in rows:
+                yield row
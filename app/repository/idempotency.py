@@ -0,0 +1,76 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.wallet import IdempotencyKey
+
+
+class IdempotencyRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.model = IdempotencyKey
+
+    async def claim(
+        self, key: str, wallet_id: uuid.UUID, request_hash: str, ttl: int
+    ) -> bool:
+        """
+        Захват ключа идемпотентности для выполнения операции.
+
+        Если ключ уже захвачен незавершенной транзакцией, INSERT ждет ее
+        окончания. Истекший ключ захватывается заново. Возвращает False,
+        если ключ занят действующей записью
+        """
+        expires_at = func.now() + timedelta(seconds=ttl)
+        query = (
+            insert(self.model)
+            .values(
+                key=key,
+                wallet_id=wallet_id,
+                request_hash=request_hash,
+                expires_at=expires_at,
+            )
+            .on_conflict_do_update(
+                index_elements=[self.model.key],
+                set_={
+                    "wallet_id": wallet_id,
+                    "request_hash": request_hash,
+                    "transaction_id": None,
+                    "new_balance": None,
+                    "created_at": func.now(),
+                    "expires_at": expires_at,
+                },
+                where=self.model.expires_at < func.now(),
+            )
+            .returning(self.model.key)
+        )
+        result = await self.session.execute(query)
+        return result.scalar_one_or_none() is not None
+
+    async def get(self, key: str) -> Optional[IdempotencyKey]:
+        result = await self.session.execute(
+            select(self.model).where(self.model.key == key)
+        )
+        return result.scalar_one_or_none()
+
+    async def complete(
+        self, key: str, transaction_id: uuid.UUID, new_balance: Decimal
+    ) -> None:
+        """Сохранение результата операции для повторных запросов"""
+        await self.session.execute(
+            update(self.model)
+            .where(self.model.key == key)
+            .values(transaction_id=transaction_id, new_balance=new_balance)
+        )
+
+    async def delete_expired(self) -> int:
+        """Удаление истекших ключей"""
+        result = await self.session.execute(
+            delete(self.model).where(self.model.expires_at < func.now())
+        )
+        return result.rowcount
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+from loguru import logger
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.utils.partition import PARTITION_PREFIX, add_months, partition_name
+
+DEFAULT_PARTITION = "transactions_default"
+
+
+class TransactionPartitionRepository:
+    """Управление месячными партициями таблицы transactions"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def list_partitions(self) -> dict[str, datetime]:
+        """Подключенные месячные партиции: имя -> начало месяца"""
+        result = await self.session.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'transactions'::regclass "
+                "AND c.relname LIKE :prefix ORDER BY c.relname"
+            ),
+            {"prefix": f"{PARTITION_PREFIX}%"},
+        )
+        return {
+            name: datetime.strptime(name[len(PARTITION_PREFIX) :] + "+0000", "%Ym%m%z")
+            for name in result.scalars()
+        }
+
+    async def create_partition(self, month: datetime) -> str:
+        """
+        Создание партиции месяца.
+
+        Партиция создается отдельной таблицей, в нее переносятся строки
+        этого месяца из партиции по умолчанию (если задание не успело
+        создать партицию заранее), затем она подключается к transactions
+        """
+        name = partition_name(month)
+        lower = month.isoformat()
+        upper = add_months(month, 1).isoformat()
+        await self.session.execute(
+            text(
+                f"CREATE TABLE {name} "
+                f"(LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+        )
+        moved = await self.session.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                f"WHERE created_at >= '{lower}' AND created_at < '{upper}' "
+                f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+            )
+        )
+        if moved.rowcount:
+            logger.warning(
+                f"В партицию {name} перенесено {moved.rowcount} строк "
+                f"из {DEFAULT_PARTITION}"
+            )
+        await self.session.execute(
+            text(
+                f"ALTER TABLE transactions ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+            )
+        )
+        return name
+
+    async def detach_partition(self, name: str) -> None:
+        """
+        Отключение партиции: она остается отдельной таблицей для архивации.
+
+        DETACH берет ACCESS EXCLUSIVE на transactions до конца транзакции
+        и блокирует все операции с кошельками; DETACH ... CONCURRENTLY
+        недоступен, пока есть партиция по умолчанию. Поэтому ожидание
+        блокировки ограничено PARTITION_LOCK_TIMEOUT_MS: при долгих
+        транзакциях отключение завершается ошибкой, а не останавливает
+        операции. Вызывается только из команд обслуживания (CLI)
+        """
+        await self.session.execute(
+            text("SELECT set_config('lock_timeout', :timeout, true)"),
+            {"timeout": f"{settings.PARTITION_LOCK_TIMEOUT_MS}ms"},
+        )
+        await self.session.execute(
+            text(f"ALTER TABLE transactions DETACH PARTITION {name}")
+        )
+
+    async def drop_partition(self, name: str) -> None:
+        """Отключение и удаление партиции"""
+        await self.detach_partition(name)
+        await self.session.execute(text(f"DROP TABLE {name}"))
@@ -0,0 +1,78 @@
+"""
+Горячие запросы репозиториев готовым SQL на соединении сессии.
+
+При REPOSITORY_BACKEND=asyncpg поиск кошелька, изменение баланса с записью
+транзакции, вставка транзакций и страница истории выполняются готовым
+текстом SQL через ``exec_driver_sql``, минуя компиляцию запроса и
+identity map SQLAlchemy. Текст запроса строится из тех же конструкций
+SQLAlchemy Core, что и в ORM, и компилируется один раз; адаптер asyncpg
+SQLAlchemy готовит его как подготовленный запрос и хранит в кэше
+соединения (prepared_statement_cache_size). Транзакцию, как и для ORM,
+начинает адаптер при первом запросе (в сессиях AUTOCOMMIT - без BEGIN),
+строки возвращаются как ``Row`` SQLAlchemy, а не как объекты ORM.
+"""
+
+from typing import Optional, Sequence, Union
+
+from sqlalchemy import Row
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ClauseElement
+
+from app.config import settings
+
+_DIALECT = asyncpg_dialect()
+
+
+def is_enabled() -> bool:
+    return settings.REPOSITORY_BACKEND == "asyncpg"
+
+
+class HotStatement:
+    """
+    Запрос, скомпилированный один раз в SQL asyncpg ($1, $2...).
+
+    Именованные параметры запроса (bindparam) передаются в ``fetch``
+    ключевыми аргументами, параметры со значениями в самом запросе
+    (константы) подставляются автоматически
+    """
+
+    def __init__(self, name: str, query: Union[ClauseElement, str], *positions):
+        self.name = name
+        if isinstance(query, str):
+            self.sql = query
+            self._positions = positions
+            self._defaults = {}
+        else:
+            compiled = query.compile(dialect=_DIALECT)
+            self.sql = compiled.string
+            self._positions = tuple(compiled.positiontup)
+            self._defaults = {
+                key: compiled.binds[key].effective_value
+                for key in self._positions
+                if not compiled.binds[key].required
+            }
+
+    def arguments(self, params: dict) -> list:
+        return [
+            params[key] if key in params else self._defaults[key]
+            for key in self._positions
+        ]
+
+
+async def fetch(
+    session: AsyncSession, statement: HotStatement, **params
+) -> Sequence[Row]:
+    """Строки запроса в транзакции сессии"""
+    connection = await session.connection()
+    result = await connection.exec_driver_sql(
+        statement.sql, tuple(statement.arguments(params))
+    )
+    return result.all()
+
+
+async def fetchrow(
+    session: AsyncSession, statement: HotStatement, **params
+) -> Optional[Row]:
+    rows = await fetch(session, statement, **params)
+    return rows[0] if rows else None
@@ -0,0 +1,178 @@
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Optional, Sequence
+
+from sqlalchemy import Row, exists, func, literal, literal_column, or_, select, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.models.wallet import BalanceSnapshot, Transaction, Wallet
+from app.repository.transaction import signed_amount
+
+# Нижняя граница истории для кошельков без снимка
+NO_SNAPSHOT = literal_column("'-infinity'::timestamptz")
+
+
+class BalanceSnapshotRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.model = BalanceSnapshot
+
+    async def get_balance_at(self, wallet_id: uuid.UUID, at: datetime) -> Row:
+        """
+        Баланс кошелька на момент ``at`` одним запросом.
+
+        Берется ближайший снимок не позже ``at`` (поиск по первичному ключу),
+        к нему прибавляются суммы транзакций после снимка по индексу
+        ix_transactions_wallet_id_created_at. Без снимка суммируется вся
+        история кошелька. Возвращает (balance, taken_at) - баланс и время
+        использованного снимка
+        """
+        snapshot = (
+            select(self.model.taken_at, self.model.balance)
+            .where(self.model.wallet_id == wallet_id, self.model.taken_at <= at)
+            .order_by(self.model.taken_at.desc())
+            .limit(1)
+            .cte("snapshot")
+        )
+        delta = (
+            select(func.coalesce(func.sum(signed_amount()), 0))
+            .where(
+                Transaction.wallet_id == wallet_id,
+                Transaction.created_at <= at,
+                Transaction.created_at
+                > func.coalesce(
+                    select(snapshot.c.taken_at).scalar_subquery(),
+                    NO_SNAPSHOT,
+                ),
+            )
+            .scalar_subquery()
+        )
+        query = select(
+            (
+                func.coalesce(select(snapshot.c.balance).scalar_subquery(), 0) + delta
+            ).label("balance"),
+            select(snapshot.c.taken_at).scalar_subquery().label("taken_at"),
+        )
+        result = await self.session.execute(query)
+        return result.one()
+
+    async def create_boundary_snapshots(
+        self, date_from: datetime, date_to: datetime
+    ) -> None:
+        """
+        Снимки баланса на последнюю транзакцию каждого кошелька
+        в интервале [date_from, date_to).
+
+        Нужны перед переносом интервала в архив: после удаления строк
+        из БД баланс на более поздние моменты считается от этих снимков
+        """
+        last = (
+            select(
+                Transaction.wallet_id, func.max(Transaction.created_at).label("last_at")
+            )
+            .where(
+                Transaction.created_at >= date_from, Transaction.created_at < date_to
+            )
+            .group_by(Transaction.wallet_id)
+            .subquery("last")
+        )
+        latest = (
+            select(self.model.taken_at, self.model.balance)
+            .where(
+                self.model.wallet_id == last.c.wallet_id,
+                self.model.taken_at <= last.c.last_at,
+            )
+            .order_by(self.model.taken_at.desc())
+            .limit(1)
+            .lateral("latest")
+        )
+        delta = (
+            select(func.coalesce(func.sum(signed_amount()), 0))
+            .where(
+                Transaction.wallet_id == last.c.wallet_id,
+                Transaction.created_at <= last.c.last_at,
+                Transaction.created_at > func.coalesce(latest.c.taken_at, NO_SNAPSHOT),
+            )
+            .scalar_subquery()
+        )
+        source = select(
+            last.c.wallet_id,
+            last.c.last_at,
+            func.coalesce(latest.c.balance, 0) + delta,
+        ).select_from(last.outerjoin(latest, true()))
+        await self.session.execute(
+            insert(self.model)
+            .from_select(["wallet_id", "taken_at", "balance"], source)
+            .on_conflict_do_nothing(
+                index_elements=[self.model.wallet_id, self.model.taken_at]
+            )
+        )
+
+    async def find_pending_wallets(
+        self,
+        horizon: datetime,
+        every: int,
+        interval: timedelta,
+        after: Optional[uuid.UUID],
+        limit: int,
+    ) -> Sequence[Row]:
+        """
+        Кошельки, которым нужен новый снимок, вместе с последним снимком.
+
+        Снимок нужен, если после последнего снимка (до ``horizon``) накопилось
+        не меньше ``every`` транзакций или есть транзакция позже него на
+        ``interval``. Для кошелька без снимков отсчет идет от первой
+        транзакции. Кошельки перебираются по возрастанию id, ``after`` - id
+        последнего кошелька предыдущей страницы
+        """
+        latest = (
+            select(self.model.taken_at, self.model.balance)
+            .where(self.model.wallet_id == Wallet.id)
+            .order_by(self.model.taken_at.desc())
+            .limit(1)
+            .lateral("latest")
+        )
+        earliest = aliased(Transaction)
+        first_transaction = (
+            select(func.min(earliest.created_at))
+            .where(earliest.wallet_id == Wallet.id)
+            .correlate(Wallet)
+            .scalar_subquery()
+        )
+        pending = select(literal(1)).where(
+            Transaction.wallet_id == Wallet.id,
+            Transaction.created_at <= horizon,
+            Transaction.created_at > func.coalesce(latest.c.taken_at, NO_SNAPSHOT),
+        )
+        anchor = func.coalesce(latest.c.taken_at, first_transaction)
+        query = (
+            select(Wallet.id, latest.c.taken_at, latest.c.balance)
+            .select_from(Wallet)
+            .outerjoin(latest, true())
+            .where(
+                or_(
+                    # EXISTS с OFFSET читает не больше every строк индекса
+                    exists(pending.offset(every - 1)),
+                    exists(pending.where(Transaction.created_at >= anchor + interval)),
+                )
+            )
+            .order_by(Wallet.id)
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.where(Wallet.id > after)
+        result = await self.session.execute(query)
+        return result.all()
+
+    async def create_many(self, rows: list[dict]) -> None:
+        """Сохранение снимков, уже существующие снимки не перезаписываются"""
+        await self.session.execute(
+            insert(self.model).on_conflict_do_nothing(
+                index_elements=[self.model.wallet_id, self.model.taken_at]
+            ),
+            rows,
+        )
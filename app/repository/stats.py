@@ -0,0 +1,171 @@
+import uuid
+from collections import defaultdict
+from datetime import date, timezone
+from decimal import Decimal
+from typing import Iterable, Sequence
+
+from sqlalchemy import Date, Row, cast, delete, func, literal, select
+from sqlalchemy.dialects.postgresql import Insert, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.wallet import Transaction, WalletDailyStats
+
+
+def day_of(created_at):
+    """День UTC момента времени для группировки в сводке"""
+    return cast(func.timezone("UTC", created_at), Date)
+
+
+def upsert_daily_stats(query: Insert) -> Insert:
+    """
+    INSERT сводки с накоплением: суммы и счетчики прибавляются к уже
+    записанным за день, минимальный и максимальный баланс обновляются
+    (least/greatest пропускают NULL операций без баланса)
+    """
+    model = WalletDailyStats
+    excluded = query.excluded
+    return query.on_conflict_do_update(
+        index_elements=[model.wallet_id, model.day, model.stripe],
+        set_={
+            "deposit_total": model.deposit_total + excluded.deposit_total,
+            "deposit_count": model.deposit_count + excluded.deposit_count,
+            "withdraw_total": model.withdraw_total + excluded.withdraw_total,
+            "withdraw_count": model.withdraw_count + excluded.withdraw_count,
+            "min_balance": func.least(model.min_balance, excluded.min_balance),
+            "max_balance": func.greatest(model.max_balance, excluded.max_balance),
+        },
+    )
+
+
+def daily_stats_select(source, stripe=None):
+    """
+    SELECT дневной сводки по строкам транзакций из ``source``.
+
+    ``stripe`` - выражение с номером полосы кошелька, по умолчанию 0.
+    Транзакции без баланса (NULL) не учитываются в минимуме и максимуме
+    """
+    is_deposit = source.c.operation_type == "DEPOSIT"
+    day = day_of(source.c.created_at)
+    stripe = literal(0) if stripe is None else stripe
+    return select(
+        source.c.wallet_id,
+        day,
+        stripe,
+        func.coalesce(func.sum(source.c.amount).filter(is_deposit), 0),
+        func.count().filter(is_deposit),
+        func.coalesce(func.sum(source.c.amount).filter(~is_deposit), 0),
+        func.count().filter(~is_deposit),
+        func.min(func.least(source.c.previous_balance, source.c.new_balance)),
+        func.max(func.greatest(source.c.previous_balance, source.c.new_balance)),
+    ).group_by(source.c.wallet_id, day, stripe)
+
+
+STATS_COLUMNS = [
+    "wallet_id",
+    "day",
+    "stripe",
+    "deposit_total",
+    "deposit_count",
+    "withdraw_total",
+    "withdraw_count",
+    "min_balance",
+    "max_balance",
+]
+
+
+class WalletStatsRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.model = WalletDailyStats
+
+    async def add_transactions(self, transactions: Iterable[Transaction]) -> None:
+        """
+        Учет новых транзакций в дневной сводке одним многострочным upsert.
+
+        Транзакции учитываются в строке полосы 0, поэтому для кошелька
+        в режиме полос вызывать нужно под блокировкой всех его полос
+        """
+        stats: dict[tuple[uuid.UUID, date], dict] = {}
+        for transaction in transactions:
+            day = transaction.created_at.astimezone(timezone.utc).date()
+            low = min(transaction.previous_balance, transaction.new_balance)
+            high = max(transaction.previous_balance, transaction.new_balance)
+            row = stats.get((transaction.wallet_id, day))
+            if row is None:
+                row = stats[(transaction.wallet_id, day)] = {
+                    "wallet_id": transaction.wallet_id,
+                    "day": day,
+                    "deposit_total": Decimal(0),
+                    "deposit_count": 0,
+                    "withdraw_total": Decimal(0),
+                    "withdraw_count": 0,
+                    "min_balance": low,
+                    "max_balance": high,
+                }
+            kind = "deposit" if transaction.operation_type == "DEPOSIT" else "withdraw"
+            row[f"{kind}_total"] += transaction.amount
+            row[f"{kind}_count"] += 1
+            row["min_balance"] = min(row["min_balance"], low)
+            row["max_balance"] = max(row["max_balance"], high)
+
+        if stats:
+            await self.session.execute(
+                upsert_daily_stats(insert(self.model).values(list(stats.values())))
+            )
+
+    async def get_stats(
+        self,
+        wallet_id: uuid.UUID,
+        date_from: date | None,
+        date_to: date | None,
+        bucket: str,
+    ) -> Sequence[Row]:
+        """
+        Сводка кошелька за период по дням или месяцам, только из сводной
+        таблицы. Границы периода включительные
+        """
+        if bucket == "month":
+            period = cast(func.date_trunc("month", self.model.day), Date)
+        else:
+            period = self.model.day
+        query = (
+            select(
+                period.label("period"),
+                func.sum(self.model.deposit_total).label("deposit_total"),
+                func.sum(self.model.deposit_count).label("deposit_count"),
+                func.sum(self.model.withdraw_total).label("withdraw_total"),
+                func.sum(self.model.withdraw_count).label("withdraw_count"),
+                func.min(self.model.min_balance).label("min_balance"),
+                func.max(self.model.max_balance).label("max_balance"),
+            )
+            .where(self.model.wallet_id == wallet_id)
+            .group_by(period)
+            .order_by(period)
+        )
+        if date_from:
+            query = query.where(self.model.day >= date_from)
+        if date_to:
+            query = query.where(self.model.day <= date_to)
+        result = await self.session.execute(query)
+        return result.all()
+
+    async def rebuild(self, wallet_ids: list[uuid.UUID]) -> None:
+        """
+        Пересчет сводки кошельков по всей истории транзакций.
+
+        Существующие строки сводки заменяются, поэтому вызывать нужно
+        под блокировкой кошельков (и их полос), чтобы не потерять
+        конкурентные операции
+        """
+        source = (
+            select(Transaction)
+            .where(Transaction.wallet_id.in_(wallet_ids))
+            .subquery("source")
+        )
+        await self.session.execute(
+            delete(self.model).where(self.model.wallet_id.in_(wallet_ids))
+        )
+        await self.session.execute(
+            insert(self.model).from_select(STATS_COLUMNS, daily_stats_select(source))
+        )
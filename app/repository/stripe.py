@@ -0,0 +1,138 @@
+import random
+import uuid
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import Row, cast, delete, func, literal, null, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.models.wallet import WalletDailyStats, WalletStripe
+from app.repository.stats import STATS_COLUMNS, daily_stats_select, upsert_daily_stats
+from app.repository.transaction import insert_operation
+
+
+class WalletStripeRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.model = WalletStripe
+
+    async def apply_operation(
+        self,
+        wallet_id: uuid.UUID,
+        operation_type: str,
+        amount: Decimal,
+        delta: Decimal,
+    ) -> Optional[Row]:
+        """
+        Применение операции к одной полосе кошелька одним запросом.
+
+        Пополнение зачисляется на случайную полосу, списание - на самую
+        богатую полосу, которой хватает на всю сумму. Запрос блокирует
+        только изменяемую полосу, строка кошелька не блокируется, поэтому
+        точный суммарный баланс кошелька до и после операции неизвестен:
+        в транзакции previous_balance и new_balance - NULL, в минимум
+        и максимум дневной сводки операция не попадает.
+        Возвращает колонки транзакции или None, если подходящей полосы нет
+        """
+        other = aliased(self.model)
+        if delta < 0:
+            stripe = (
+                select(other.stripe)
+                .where(other.wallet_id == wallet_id, other.balance + delta >= 0)
+                .order_by(other.balance.desc(), other.stripe)
+                .limit(1)
+                .scalar_subquery()
+            )
+        else:
+            # Случайное число выбирается заранее: при повторной проверке
+            # строки после конкурентного изменения полоса должна остаться той же
+            count = (
+                select(func.count())
+                .where(other.wallet_id == wallet_id)
+                .scalar_subquery()
+            )
+            stripe = literal(random.getrandbits(31)) % func.nullif(count, 0)
+
+        updated = (
+            update(self.model)
+            .where(
+                self.model.wallet_id == wallet_id,
+                self.model.stripe == stripe,
+                self.model.balance + delta >= 0,
+            )
+            .values(balance=self.model.balance + delta)
+            .returning(self.model.wallet_id, self.model.stripe, self.model.balance)
+            .cte("updated")
+        )
+        # Остальные полосы могут меняться конкурентно, баланс не записывается
+        total = select(
+            updated.c.wallet_id.label("id"),
+            cast(null(), self.model.balance.type).label("balance"),
+        ).cte("total")
+        inserted = insert_operation(total, operation_type, amount, delta).cte(
+            "inserted"
+        )
+        # Сводка ведется по полосам, чтобы операции не ждали одну строку сводки
+        rollup = upsert_daily_stats(
+            insert(WalletDailyStats).from_select(
+                STATS_COLUMNS,
+                daily_stats_select(
+                    inserted, select(updated.c.stripe).scalar_subquery()
+                ),
+            )
+        ).cte("rollup")
+        result = await self.session.execute(select(inserted).add_cte(rollup))
+        return result.one_or_none()
+
+    async def lock_stripes(
+        self, wallet_ids: list[uuid.UUID]
+    ) -> dict[uuid.UUID, dict[int, Decimal]]:
+        """
+        Балансы всех полос кошельков с блокировкой FOR UPDATE.
+
+        Полосы блокируются в порядке (кошелек, номер полосы), поэтому
+        конкурентные списания не могут взаимно заблокироваться
+        """
+        query = (
+            select(self.model.wallet_id, self.model.stripe, self.model.balance)
+            .where(self.model.wallet_id.in_(sorted(set(wallet_ids))))
+            .order_by(self.model.wallet_id, self.model.stripe)
+            .with_for_update()
+        )
+        stripes: dict[uuid.UUID, dict[int, Decimal]] = {}
+        for wallet_id, stripe, balance in await self.session.execute(query):
+            stripes.setdefault(wallet_id, {})[stripe] = balance
+        return stripes
+
+    async def set_balances(
+        self, wallet_id: uuid.UUID, balances: dict[int, Decimal]
+    ) -> None:
+        """Запись новых балансов полос (по первичному ключу)"""
+        if not balances:
+            return
+        await self.session.execute(
+            update(self.model),
+            [
+                {"wallet_id": wallet_id, "stripe": stripe, "balance": balance}
+                for stripe, balance in balances.items()
+            ],
+        )
+
+    async def create_stripes(
+        self, wallet_id: uuid.UUID, balances: list[Decimal]
+    ) -> None:
+        await self.session.execute(
+            insert(self.model),
+            [
+                {"wallet_id": wallet_id, "stripe": stripe, "balance": balance}
+                for stripe, balance in enumerate(balances)
+            ],
+        )
+
+    async def delete_stripes(self, wallet_id: uuid.UUID) -> None:
+        await self.session.execute(
+            delete(self.model).where(self.model.wallet_id == wallet_id)
+        )
@@ -1,10 +1,172 @@
 import uuid
+from datetime import datetime
 from decimal import Decimal
+from typing import AsyncIterator, Optional, Sequence
 
-from sqlalchemy import select
+from sqlalchemy import (
+    Insert,
+    Row,
+    Select,
+    String,
+    bindparam,
+    case,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+)
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import BindParameter
 
 from app.models.wallet import Transaction
+from app.repository import prepared
+from app.repository.prepared import HotStatement
+
+TRANSACTION_COLUMNS = (
+    Transaction.id,
+    Transaction.wallet_id,
+    Transaction.operation_type,
+    Transaction.amount,
+    Transaction.previous_balance,
+    Transaction.new_balance,
+    Transaction.created_at,
+)
+
+
+def signed_amount():
+    """Сумма транзакции со знаком: пополнение увеличивает баланс, списание уменьшает"""
+    return case(
+        (Transaction.operation_type == "DEPOSIT", Transaction.amount),
+        else_=-Transaction.amount,
+    )
+
+
+def _value(value, type_):
+    """Значение в запросе: параметр подготовленного запроса или константа"""
+    return value if isinstance(value, BindParameter) else literal(value, type_)
+
+
+def insert_operation(
+    source,
+    operation_type: str,
+    amount: Decimal,
+    delta: Decimal,
+    transaction_id: Optional[uuid.UUID] = None,
+) -> Insert:
+    """
+    INSERT ... RETURNING транзакции по результату изменения баланса.
+
+    ``source`` - CTE с колонками id (кошелек) и balance (баланс после
+    операции); если он пуст, транзакция не создается. Значения можно
+    передать параметрами запроса (bindparam)
+    """
+    if transaction_id is None:
+        transaction_id = uuid.uuid4()
+    return (
+        insert(Transaction)
+        .from_select(
+            [
+                "id",
+                "wallet_id",
+                "operation_type",
+                "amount",
+                "previous_balance",
+                "new_balance",
+            ],
+            select(
+                _value(transaction_id, UUID(as_uuid=True)),
+                source.c.id,
+                _value(operation_type, String),
+                _value(amount, Transaction.amount.type),
+                source.c.balance - delta,
+                source.c.balance,
+            ),
+        )
+        .returning(*TRANSACTION_COLUMNS)
+    )
+
+
+def history_page(
+    query: Select,
+    wallet_id,
+    limit,
+    skip=None,
+    after: Optional[tuple] = None,
+) -> Select:
+    """
+    Страница истории транзакций кошелька от новых к старым.
+
+    Если передан ``after`` (created_at, id), страница начинается сразу
+    после этой транзакции (keyset-пагинация по индексу
+    ix_transactions_wallet_id_created_at), иначе используется смещение
+    """
+    query = query.where(Transaction.wallet_id == wallet_id)
+    if after:
+        created_at, transaction_id = after
+        # created_at <= X задает границу поиска по индексу,
+        # id разрешает совпадения времени внутри одной транзакции БД
+        query = query.where(
+            Transaction.created_at <= created_at,
+            or_(
+                Transaction.created_at < created_at,
+                Transaction.id < transaction_id,
+            ),
+        )
+    else:
+        query = query.offset(skip)
+    return query.order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(
+        limit
+    )
+
+
+_HISTORY_PAGE = HotStatement(
+    "history_page",
+    history_page(
+        select(*TRANSACTION_COLUMNS),
+        bindparam("wallet_id", type_=UUID(as_uuid=True)),
+        bindparam("limit"),
+        skip=bindparam("skip"),
+    ),
+)
+_HISTORY_PAGE_AFTER = HotStatement(
+    "history_page_after",
+    history_page(
+        select(*TRANSACTION_COLUMNS),
+        bindparam("wallet_id", type_=UUID(as_uuid=True)),
+        bindparam("limit"),
+        after=(
+            bindparam("after_created_at", type_=Transaction.created_at.type),
+            bindparam("after_id", type_=UUID(as_uuid=True)),
+        ),
+    ),
+)
+_INSERT_COLUMNS = (
+    "id",
+    "wallet_id",
+    "operation_type",
+    "amount",
+    "previous_balance",
+    "new_balance",
+    "created_at",
+)
+# Строки передаются массивами колонок, поэтому текст запроса не зависит
+# от их количества; created_at без значения - время транзакции БД, как
+# у значения по умолчанию. Порядок строк RETURNING у INSERT ... SELECT
+# не гарантирован, строки сопоставляются с входными по id
+_INSERT_MANY = HotStatement(
+    "insert_transactions",
+    f"INSERT INTO transactions ({', '.join(_INSERT_COLUMNS)}) "
+    "SELECT id, wallet_id, operation_type, amount, previous_balance, "
+    "new_balance, coalesce(created_at, now()) "
+    "FROM unnest($1::uuid[], $2::uuid[], $3::varchar[], $4::numeric[], "
+    "$5::numeric[], $6::numeric[], $7::timestamptz[]) "
+    f"AS rows ({', '.join(_INSERT_COLUMNS)}) "
+    "RETURNING id, wallet_id, operation_type, amount, previous_balance, "
+    "new_balance, created_at",
+    *_INSERT_COLUMNS,
+)
 
 
 class TransactionRepository:
@@ -12,6 +174,7 @@ class TransactionRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.model = Transaction
+        self.prepared = prepared.is_enabled()
 
     async def create(
         self,
@@ -32,18 +195,146 @@ class TransactionRepository:
         await self.session.flush()
         return transaction
 
-    async def refresh_transaction(self, transaction: Transaction) -> None:
-        """Обновление объекта транзакции из БД"""
-        await self.session.refresh(transaction)
+    async def get_list_transactions(
+        self,
+        wallet_id: uuid.UUID,
+        skip: int,
+        limit: int,
+        after: Optional[tuple[datetime, uuid.UUID]] = None,
+    ) -> Sequence[Row]:
+        """
+        Получение истории транзакций кошелька.
+
+        Если передан ``after`` (created_at, id), страница начинается сразу
+        после этой транзакции, иначе используется смещение. Выбираются
+        только колонки TRANSACTION_COLUMNS (без объектов ORM)
+        """
+        if self.prepared:
+            if after:
+                return await prepared.fetch(
+                    self.session,
+                    _HISTORY_PAGE_AFTER,
+                    wallet_id=wallet_id,
+                    limit=limit,
+                    after_created_at=after[0],
+                    after_id=after[1],
+                )
+            return await prepared.fetch(
+                self.session, _HISTORY_PAGE, wallet_id=wallet_id, limit=limit, skip=skip
+            )
 
-    async def get_list_transactions(self, wallet_id: uuid.UUID, skip: int, limit: int):
-        """Получение истории транзакций кошелька"""
         result = await self.session.execute(
-            select(Transaction)
-            .where(Transaction.wallet_id == wallet_id)
-            .order_by(Transaction.created_at.desc())
-            .offset(skip)
-            .limit(limit)
+            history_page(select(*TRANSACTION_COLUMNS), wallet_id, limit, skip, after)
+        )
+        return result.all()
+
+    async def create_many(self, rows: list[dict]) -> list[Transaction]:
+        """Создание нескольких транзакций одним многострочным INSERT"""
+        if self.prepared:
+            ids = [row.get("id") or uuid.uuid4() for row in rows]
+            columns = {
+                column: [row.get(column) for row in rows]
+                for column in _INSERT_COLUMNS[1:]
+            }
+            created = {
+                row.id: row
+                for row in await prepared.fetch(
+                    self.session, _INSERT_MANY, id=ids, **columns
+                )
+            }
+            return [created[transaction_id] for transaction_id in ids]
+
+        result = await self.session.scalars(
+            insert(Transaction).returning(Transaction, sort_by_parameter_order=True),
+            rows,
         )
+        return list(result.all())
 
-        return result.scalars().all()
+    async def stream_transactions(
+        self,
+        wallet_id: uuid.UUID,
+        date_from: Optional[datetime],
+        date_to: Optional[datetime],
+        chunk_size: int,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Потоковое чтение истории транзакций через серверный курсор.
+
+        Выбираются только колонки (без ORM-объектов), строки отдаются
+        пачками по ``chunk_size``, поэтому память не зависит от объема истории
+        """
+        query = select(*TRANSACTION_COLUMNS).where(Transaction.wallet_id == wallet_id)
+        if date_from:
+            query = query.where(Transaction.created_at >= date_from)
+        if date_to:
+            query = query.where(Transaction.created_at < date_to)
+        query = query.order_by(Transaction.created_at, Transaction.id)
+
+        result = await self.session.stream(
+            query.execution_options(yield_per=chunk_size)
+        )
+        async for partition in result.partitions():
+            yield partition
+
+    async def stream_deltas(
+        self,
+        wallet_id: uuid.UUID,
+        after: Optional[datetime],
+        until: datetime,
+        chunk_size: int,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Потоковое чтение изменений баланса (created_at, delta) кошелька
+        в интервале (after, until] в порядке времени
+        """
+        query = select(Transaction.created_at, signed_amount().label("delta")).where(
+            Transaction.wallet_id == wallet_id,
+            Transaction.created_at <= until,
+        )
+        if after:
+            query = query.where(Transaction.created_at > after)
+        query = query.order_by(Transaction.created_at)
+
+        result = await self.session.stream(
+            query.execution_options(yield_per=chunk_size)
+        )
+        async for partition in result.partitions():
+            yield partition
+
+    async def count_transactions(self, wallet_id: uuid.UUID) -> int:
+        result = await self.session.execute(
+            select(func.count()).where(Transaction.wallet_id == wallet_id)
+        )
+        return result.scalar_one()
+
+    async def count_range(self, date_from: datetime, date_to: datetime) -> int:
+        result = await self.session.execute(
+            select(func.count()).where(
+                Transaction.created_at >= date_from, Transaction.created_at < date_to
+            )
+        )
+        return result.scalar_one()
+
+    async def stream_range(
+        self, date_from: datetime, date_to: datetime, chunk_size: int
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Потоковое чтение всех транзакций интервала [date_from, date_to)
+        по кошелькам, внутри кошелька - от новых к старым
+        """
+        query = (
+            select(*TRANSACTION_COLUMNS)
+            .where(
+                Transaction.created_at >= date_from, Transaction.created_at < date_to
+            )
+            .order_by(
+                Transaction.wallet_id,
+                Transaction.created_at.desc(),
+                Transaction.id.desc(),
+            )
+        )
+        result = await self.session.stream(
+            query.execution_options(yield_per=chunk_size)
+        )
+        async for partition in result.partitions():
+            yield partition
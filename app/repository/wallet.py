@@ -6,10 +6,92 @@ from loguru import logger
 
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
-from sqlalchemy import func, update
+from sqlalchemy import Numeric, String, bindparam, func, literal, true, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app.models.wallet import Wallet
+from app.models.wallet import Transaction, Wallet, WalletDailyStats, WalletStripe
+from app.repository.stats import STATS_COLUMNS, daily_stats_select, upsert_daily_stats
+from app.repository import prepared
+from app.repository.prepared import HotStatement
+from app.repository.transaction import TRANSACTION_COLUMNS, insert_operation
+
+
+def striped_balance():
+    """Сумма балансов полос кошелька (NULL, если кошелек не в режиме полос)"""
+    return (
+        select(func.sum(WalletStripe.balance))
+        .where(WalletStripe.wallet_id == Wallet.id)
+        .scalar_subquery()
+    )
+
+
+def apply_operation_query(
+    wallet_id,
+    operation_type: str,
+    amount: Decimal,
+    delta: Decimal,
+    transaction_id: Optional[uuid.UUID] = None,
+):
+    """
+    Запрос атомарного применения операции (см. WalletRepository.apply_operation).
+
+    Значения можно передать параметрами запроса (bindparam)
+    """
+    updated = (
+        update(Wallet)
+        .where(
+            Wallet.id == wallet_id,
+            Wallet.stripes == 0,
+            Wallet.balance + delta >= 0,
+        )
+        .values(balance=Wallet.balance + delta, updated_at=func.now())
+        .returning(Wallet.id, Wallet.balance)
+        .cte("updated")
+    )
+    inserted = insert_operation(
+        updated, operation_type, amount, delta, transaction_id
+    ).cte("inserted")
+    # Дневная сводка кошелька обновляется в том же запросе
+    rollup = upsert_daily_stats(
+        pg_insert(WalletDailyStats).from_select(
+            STATS_COLUMNS, daily_stats_select(inserted)
+        )
+    ).cte("rollup")
+    # Все части запроса видят один снимок, поэтому здесь баланс до операции
+    return (
+        select(
+            Wallet.balance.label("current_balance"),
+            Wallet.stripes,
+            inserted,
+        )
+        .select_from(Wallet.__table__.outerjoin(inserted, true()))
+        .where(Wallet.id == wallet_id)
+        .add_cte(rollup)
+    )
+
+
+_FIND_BY_ID = HotStatement(
+    "find_wallet",
+    select(
+        Wallet.id,
+        func.coalesce(striped_balance(), Wallet.balance).label("balance"),
+        Wallet.stripes,
+        Wallet.created_at,
+        Wallet.updated_at,
+    ).where(Wallet.id == bindparam("wallet_id", type_=UUID(as_uuid=True))),
+)
+_APPLY_OPERATION = HotStatement(
+    "apply_operation",
+    apply_operation_query(
+        bindparam("wallet_id", type_=UUID(as_uuid=True)),
+        bindparam("operation_type", type_=String),
+        bindparam("amount", type_=Numeric),
+        bindparam("delta", type_=Numeric),
+        bindparam("transaction_id", type_=UUID(as_uuid=True)),
+    ),
+)
 
 
 class WalletRepository:
@@ -17,6 +99,7 @@ class WalletRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.model = Wallet
+        self.prepared = prepared.is_enabled()
 
     async def add(self, instance):
         try:
@@ -25,32 +108,157 @@ class WalletRepository:
             await self.session.refresh(instance)
             return instance
         except SQLAlchemyError as e:
-            logger.error(f"Ошибка базы данных во время работы: {e}", exc_info=True)
+            logger.opt(exception=True).error(
+                "Ошибка базы данных во время работы: {}", e
+            )
             await self.session.rollback()
             raise
 
     async def find_one_or_none_by_id(self, wallet_id: uuid.UUID):
-        query = select(self.model).filter_by(id=wallet_id)
+        """Кошелек по id; в режиме полос баланс равен сумме балансов полос"""
+        if self.prepared:
+            return await prepared.fetchrow(
+                self.session, _FIND_BY_ID, wallet_id=wallet_id
+            )
+
+        query = select(self.model, striped_balance()).where(self.model.id == wallet_id)
         result = await self.session.execute(query)
-        return result.scalar_one_or_none()
+        row = result.one_or_none()
+        if row is None:
+            return None
+        wallet, balance = row
+        if balance is not None:
+            # Значение не считается изменением и не будет записано в строку
+            set_committed_value(wallet, "balance", balance)
+        return wallet
 
     async def get_with_lock(self, wallet_id: uuid.UUID) -> Optional[Wallet]:
         query = select(self.model).filter_by(id=wallet_id).with_for_update()
         result = await self.session.execute(query)
         return result.scalar_one_or_none()
 
-    async def update_balance(self, wallet_id: uuid.UUID) -> None:
+    async def apply_operation(
+        self,
+        wallet_id: uuid.UUID,
+        operation_type: str,
+        amount: Decimal,
+        delta: Decimal,
+    ):
+        """
+        Атомарное применение операции одним запросом.
+
+        Условный UPDATE ... RETURNING меняет баланс только если он не уйдет
+        в минус, а CTE с INSERT записывает транзакцию по его результату.
+        Возвращает строку с текущим (до операции) балансом кошелька, числом
+        его полос и колонками транзакции; если транзакция не создана, колонки
+        пустые. Кошельки в режиме полос этим запросом не изменяются.
+        Если кошелька нет, возвращает None.
+        """
         try:
-            await self.session.execute(
-                update(self.model)
-                .where(self.model.id == wallet_id)
-                .values(updated_at=func.now()),
-            )
+            if self.prepared:
+                return await prepared.fetchrow(
+                    self.session,
+                    _APPLY_OPERATION,
+                    wallet_id=wallet_id,
+                    operation_type=operation_type,
+                    amount=amount,
+                    delta=delta,
+                    transaction_id=uuid.uuid4(),
+                )
+            query = apply_operation_query(wallet_id, operation_type, amount, delta)
+            result = await self.session.execute(query)
         except SQLAlchemyError as e:
-            logger.error(f"Ошибка базы данных во время работы: {e}", exc_info=True)
-            await self.session.rollback()
+            logger.opt(exception=True).error(
+                "Ошибка базы данных во время работы: {}", e
+            )
             raise
+        return result.one_or_none()
+
+    async def get_many_with_lock(self, wallet_ids: list[uuid.UUID]) -> list[Wallet]:
+        """
+        Получение нескольких кошельков с блокировкой FOR UPDATE.
+
+        Строки блокируются в порядке сортировки по id, поэтому пакеты
+        с пересекающимися кошельками не могут взаимно заблокироваться
+        """
+        query = (
+            select(self.model)
+            .where(self.model.id.in_(sorted(set(wallet_ids))))
+            .order_by(self.model.id)
+            .with_for_update()
+        )
+        result = await self.session.execute(query)
+        return list(result.scalars().all())
 
-    async def refresh_wallet(self, wallet: Wallet) -> None:
-        """Обновление объекта кошелька из БД"""
-        await self.session.refresh(wallet)
+    async def create_empty(self, count: int) -> list[uuid.UUID]:
+        """Создание ``count`` кошельков с нулевым балансом одним INSERT"""
+        query = (
+            pg_insert(self.model)
+            .from_select(
+                ["id"],
+                select(func.gen_random_uuid()).select_from(
+                    func.generate_series(1, count)
+                ),
+            )
+            .returning(self.model.id)
+        )
+        result = await self.session.execute(query)
+        return list(result.scalars().all())
+
+    async def create_many(
+        self, wallet_ids: list[uuid.UUID], balances: list[Decimal]
+    ) -> list[uuid.UUID]:
+        """
+        Создание кошельков с id клиента и начальным балансом одним запросом.
+
+        Строки передаются массивами колонок (unnest). Уже существующие
+        кошельки пропускаются, поэтому повтор импорта безопасен. Начальный
+        баланс записывается транзакцией пополнения и в дневную сводку,
+        чтобы история и баланс на момент времени сходились с балансом.
+        Возвращает id созданных кошельков
+        """
+        source = select(
+            func.unnest(literal(wallet_ids, ARRAY(UUID(as_uuid=True)))),
+            func.unnest(literal(balances, ARRAY(self.model.balance.type))),
+        )
+        # Без значений по умолчанию Python: внутри CTE они не подставляются,
+        # stripes заполняет server_default
+        created = (
+            pg_insert(self.model)
+            .from_select(["id", "balance"], source, include_defaults=False)
+            .on_conflict_do_nothing(index_elements=[self.model.id])
+            .returning(self.model.id, self.model.balance)
+            .cte("created")
+        )
+        deposits = (
+            pg_insert(Transaction)
+            .from_select(
+                [
+                    "id",
+                    "wallet_id",
+                    "operation_type",
+                    "amount",
+                    "previous_balance",
+                    "new_balance",
+                ],
+                select(
+                    func.gen_random_uuid(),
+                    created.c.id,
+                    literal("DEPOSIT", String),
+                    created.c.balance,
+                    literal(0, self.model.balance.type),
+                    created.c.balance,
+                ).where(created.c.balance > 0),
+            )
+            .returning(*TRANSACTION_COLUMNS)
+            .cte("deposits")
+        )
+        rollup = upsert_daily_stats(
+            pg_insert(WalletDailyStats).from_select(
+                STATS_COLUMNS, daily_stats_select(deposits)
+            )
+        ).cte("rollup")
+        result = await self.session.execute(
+            select(created.c.id).add_cte(deposits, rollup)
+        )
+        return list(result.scalars().all())
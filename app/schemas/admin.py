@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+
+
+class StatementStatsItem(BaseModel):
+    """Статистика одного запроса из одного места вызова"""
+
+    statement: str
+    caller: str
+    calls: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    rows: int
+    slow_calls: int
+
+
+class StatementStatsResponse(BaseModel):
+    """Схема ответа со статистикой SQL запросов"""
+
+    enabled: bool
+    slow_query_ms: float
+    dropped: int
+    statements: list[StatementStatsItem]
+
+
+class SqlProfilingOrder:
+    """Сортировка статистики SQL запросов"""
+
+    TOTAL_TIME = "total_time"
+    MEAN_TIME = "mean_time"
+    MAX_TIME = "max_time"
+    CALLS = "calls"
@@ -1,8 +1,15 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from decimal import Decimal
 from datetime import datetime
+from typing import Optional
 import uuid
 
+# Описание баланса, который неизвестен для операций над одной полосой
+STRIPED_BALANCE_NOTE = (
+    "null у операции над одной полосой кошелька в режиме полос: "
+    "точный суммарный баланс при конкурентных операциях неизвестен"
+)
+
 
 class TransactionResponse(BaseModel):
     """Схема ответа для транзакции"""
@@ -11,8 +18,15 @@ class TransactionResponse(BaseModel):
     wallet_id: uuid.UUID
     operation_type: str
     amount: Decimal
-    previous_balance: Decimal
-    new_balance: Decimal
+    previous_balance: Optional[Decimal] = Field(..., description=STRIPED_BALANCE_NOTE)
+    new_balance: Optional[Decimal] = Field(..., description=STRIPED_BALANCE_NOTE)
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class ExportFormat:
+    """Форматы выгрузки истории операций"""
+
+    NDJSON = "ndjson"
+    CSV = "csv"
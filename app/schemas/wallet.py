@@ -1,9 +1,11 @@
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from typing import Optional
 
-from pydantic import BaseModel, Field, ConfigDict, field_validator
+from pydantic import BaseModel, Field, ConfigDict, field_validator, model_validator
+
+from app.schemas.transaction import STRIPED_BALANCE_NOTE
 
 
 class WalletBase(BaseModel):
@@ -23,6 +25,85 @@ class WalletResponse(WalletBase):
     pass
 
 
+class BulkWalletItem(BaseModel):
+    """Кошелек для массового создания: id клиента и начальный баланс"""
+
+    id: uuid.UUID
+    balance: Decimal = Field(
+        Decimal(0),
+        ge=0,
+        max_digits=20,
+        decimal_places=2,
+        description="Начальный баланс",
+    )
+
+
+class BulkWalletCreateRequest(BaseModel):
+    """Схема запроса массового создания кошельков: количество или список кошельков"""
+
+    count: Optional[int] = Field(
+        None, ge=1, le=1_000_000, description="Количество кошельков с нулевым балансом"
+    )
+    wallets: Optional[list[BulkWalletItem]] = Field(
+        None, min_length=1, max_length=100_000, description="Кошельки с id клиента"
+    )
+
+    @model_validator(mode="after")
+    def validate_source(self):
+        if (self.count is None) == (self.wallets is None):
+            raise ValueError("Нужно передать count или wallets")
+        if self.wallets and len({w.id for w in self.wallets}) != len(self.wallets):
+            raise ValueError("id кошельков не должны повторяться")
+        return self
+
+    model_config = ConfigDict(json_schema_extra={"example": {"count": 1000}})
+
+
+class BalanceAtResponse(BaseModel):
+    """Схема ответа для баланса кошелька на момент времени"""
+
+    wallet_id: uuid.UUID
+    balance: Decimal
+    at: datetime
+
+
+class StatsBucket:
+    """Периоды группировки сводки операций"""
+
+    DAY = "day"
+    MONTH = "month"
+
+
+class WalletStatsItem(BaseModel):
+    """Сводка операций кошелька за период"""
+
+    period: date
+    deposit_total: Decimal
+    deposit_count: int
+    withdraw_total: Decimal
+    withdraw_count: int
+    min_balance: Optional[Decimal] = Field(
+        ...,
+        description="null, если за период были только операции над одной "
+        "полосой кошелька (без известного баланса)",
+    )
+    max_balance: Optional[Decimal] = Field(
+        ...,
+        description="null, если за период были только операции над одной "
+        "полосой кошелька (без известного баланса)",
+    )
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class WalletStatsResponse(BaseModel):
+    """Схема ответа для сводки операций кошелька"""
+
+    wallet_id: uuid.UUID
+    bucket: str
+    items: list[WalletStatsItem]
+
+
 class OperationType:
     """Типы операций"""
 
@@ -59,12 +140,62 @@ class OperationResponse(BaseModel):
     success: bool
     message: str
     wallet_id: uuid.UUID
-    new_balance: Decimal
+    new_balance: Optional[Decimal] = Field(..., description=STRIPED_BALANCE_NOTE)
     transaction_id: Optional[uuid.UUID] = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class BatchMode:
+    """Режимы пакетного выполнения операций"""
+
+    ALL_OR_NOTHING = "ALL_OR_NOTHING"
+    BEST_EFFORT = "BEST_EFFORT"
+
+
+class BatchOperationItem(OperationRequest):
+    """Операция над кошельком в составе пакета"""
+
+    wallet_id: uuid.UUID
+
+
+class BatchOperationRequest(BaseModel):
+    """Схема запроса для пакета операций над кошельками"""
+
+    mode: str = Field(
+        BatchMode.ALL_OR_NOTHING,
+        description="Режим: ALL_OR_NOTHING или BEST_EFFORT",
+    )
+    operations: list[BatchOperationItem] = Field(
+        ..., min_length=1, max_length=10000, description="Операции пакета"
+    )
+
+    @field_validator("mode")
+    def validate_mode(cls, v):
+        if v not in [BatchMode.ALL_OR_NOTHING, BatchMode.BEST_EFFORT]:
+            raise ValueError("mode должен быть ALL_OR_NOTHING или BEST_EFFORT")
+        return v
+
+
+class BatchOperationResult(BaseModel):
+    """Результат одной операции пакета"""
+
+    index: int
+    wallet_id: uuid.UUID
+    success: bool
+    new_balance: Optional[Decimal] = None
+    transaction_id: Optional[uuid.UUID] = None
+    error: Optional[str] = None
+
+
+class BatchOperationResponse(BaseModel):
+    """Схема ответа для пакета операций"""
+
+    success: bool
+    applied: int
+    results: list[BatchOperationResult]
+
+
 class ErrorResponse(BaseModel):
     """Схема ответа об ошибке"""
 
@@ -0,0 +1,101 @@
+import os
+from datetime import datetime
+
+from loguru import logger
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.archive.segment import SegmentWriter
+from app.config import settings
+from app.repository.archive import ArchiveRepository
+from app.repository.partition import TransactionPartitionRepository
+from app.repository.snapshot import BalanceSnapshotRepository
+from app.repository.transaction import TransactionRepository
+from app.utils.partition import add_months, partition_name
+
+
+class ArchiveService:
+    """
+    Перенос старых транзакций из БД в сегменты архива на диске.
+
+    Каждая месячная партиция становится одним неизменяемым сегментом,
+    после чего удаляется из БД. История и баланс на момент времени
+    читают сегменты, когда запрос уходит дальше оперативных данных
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.archive_repo: ArchiveRepository = ArchiveRepository(session)
+        self.partition_repo: TransactionPartitionRepository = (
+            TransactionPartitionRepository(session)
+        )
+        self.snapshot_repo: BalanceSnapshotRepository = BalanceSnapshotRepository(
+            session
+        )
+        self.transaction_repo: TransactionRepository = TransactionRepository(session)
+
+    async def archive_before(self, cutoff: datetime) -> list[str]:
+        """Перенос в архив всех месяцев, целиком лежащих раньше ``cutoff``"""
+        async with self.session.begin():
+            partitions = await self.partition_repo.list_partitions()
+        archived = []
+        # От старых к новым: снимки на конец месяца опираются на предыдущие
+        for name, month in sorted(partitions.items(), key=lambda item: item[1]):
+            if add_months(month, 1) <= cutoff:
+                await self.archive_month(month)
+                archived.append(name)
+        return archived
+
+    async def archive_month(self, month: datetime) -> int:
+        """
+        Перенос месячной партиции в сегмент архива.
+
+        Сегмент пишется на диск под блокировкой партиции от записи, затем
+        в отдельной транзакции проверяется, что строк не прибавилось, и
+        партиция удаляется. Если запуск прервался, файл сегмента
+        перезапишется при повторном запуске. Возвращает количество строк
+        """
+        name = partition_name(month)
+        range_end = add_months(month, 1)
+        path = self.archive_repo.segment_path(name)
+        os.makedirs(settings.ARCHIVE_DIR, exist_ok=True)
+
+        async with self.session.begin():
+            await self._lock(name)
+            await self.snapshot_repo.create_boundary_snapshots(month, range_end)
+
+            writer = SegmentWriter(path, settings.ARCHIVE_BLOCK_ROWS)
+            try:
+                async for rows in self.transaction_repo.stream_range(
+                    month, range_end, settings.EXPORT_CHUNK_SIZE
+                ):
+                    for row in rows:
+                        writer.add(row)
+            except Exception:
+                writer.abort()
+                raise
+            if writer.row_count:
+                writer.close()
+            else:
+                writer.abort()
+
+        async with self.session.begin():
+            await self._lock(name)
+            count = await self.transaction_repo.count_range(month, range_end)
+            if count != writer.row_count:
+                raise RuntimeError(
+                    f"В партиции {name} {count} строк, в сегменте {writer.row_count}"
+                )
+            if writer.row_count:
+                await self.archive_repo.add_segment(
+                    name, month, range_end, writer.row_count
+                )
+            await self.partition_repo.drop_partition(name)
+
+        logger.info(f"Партиция {name} перенесена в архив: {writer.row_count} строк")
+        return writer.row_count
+
+    async def _lock(self, name: str) -> None:
+        """Блокировка партиции от записи до конца транзакции"""
+        await self.session.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
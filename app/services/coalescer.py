@@ -0,0 +1,197 @@
+import asyncio
+import uuid
+from decimal import Decimal
+from typing import Optional
+
+from loguru import logger
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.exceptions import InsufficientFundsError, WalletNotFoundError
+from app.models.wallet import Transaction
+from app.repository.stats import WalletStatsRepository
+from app.repository.stripe import WalletStripeRepository
+from app.repository.transaction import TransactionRepository
+from app.repository.wallet import WalletRepository
+from app.utils.wallet import calculate_new_balance, spread_stripe_change
+
+
+class _PendingOperation:
+    """Операция, ожидающая применения в составе пакета"""
+
+    __slots__ = ("operation_type", "amount", "future")
+
+    def __init__(self, operation_type: str, amount: Decimal, future: asyncio.Future):
+        self.operation_type = operation_type
+        self.amount = amount
+        self.future = future
+
+
+class OperationCoalescer:
+    """
+    Группировка конкурентных операций над одним кошельком (group commit).
+
+    Операции копятся в очереди кошелька в течение окна ``window`` секунд
+    или до ``max_batch`` штук, затем применяются по порядку в одной
+    транзакции БД с одной блокировкой строки кошелька и одним
+    многострочным INSERT транзакций. Каждый вызывающий получает свой
+    результат, а недостаток средств отклоняет только вызвавшую его операцию.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        window: float,
+        max_batch: int,
+    ):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[uuid.UUID, list[_PendingOperation]] = {}
+        self._timers: dict[uuid.UUID, asyncio.TimerHandle] = {}
+        self._inflight: dict[uuid.UUID, asyncio.Task] = {}
+
+    async def submit(
+        self, wallet_id: uuid.UUID, operation_type: str, amount: Decimal
+    ) -> Transaction:
+        """Поставить операцию в очередь кошелька и дождаться ее результата"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(wallet_id, [])
+        batch.append(_PendingOperation(operation_type, amount, future))
+
+        if len(batch) >= self.max_batch:
+            self._flush(wallet_id)
+        elif wallet_id not in self._timers:
+            self._timers[wallet_id] = loop.call_later(
+                self.window, self._flush, wallet_id
+            )
+        return await future
+
+    def _flush(self, wallet_id: uuid.UUID) -> None:
+        """Отправить накопленный пакет кошелька на применение"""
+        timer = self._timers.pop(wallet_id, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(wallet_id, None)
+        if not batch:
+            return
+
+        # Пакеты одного кошелька применяются строго друг за другом
+        previous = self._inflight.get(wallet_id)
+        task = asyncio.create_task(self._apply_batch(wallet_id, batch, previous))
+        self._inflight[wallet_id] = task
+
+        def _forget(done: asyncio.Task) -> None:
+            if self._inflight.get(wallet_id) is done:
+                del self._inflight[wallet_id]
+
+        task.add_done_callback(_forget)
+
+    async def _apply_batch(
+        self,
+        wallet_id: uuid.UUID,
+        batch: list[_PendingOperation],
+        previous: Optional[asyncio.Task],
+    ) -> None:
+        if previous:
+            await asyncio.wait([previous])
+
+        # Операции, чьи вызывающие уже отменили ожидание, не применяем
+        batch = [op for op in batch if not op.future.done()]
+        if not batch:
+            return
+
+        outcomes: list[tuple[_PendingOperation, Optional[Exception]]] = []
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    wallet = await WalletRepository(session).get_with_lock(wallet_id)
+                    if not wallet:
+                        raise WalletNotFoundError(wallet_id=wallet_id)
+
+                    stripe_repo = WalletStripeRepository(session)
+                    stripes = (
+                        (await stripe_repo.lock_stripes([wallet_id]))[wallet_id]
+                        if wallet.stripes
+                        else None
+                    )
+                    initial = sum(stripes.values()) if stripes else wallet.balance
+                    balance = initial
+                    rows = []
+                    for op in batch:
+                        try:
+                            new_balance = calculate_new_balance(
+                                wallet_id, balance, op.operation_type, op.amount
+                            )
+                        except (InsufficientFundsError, ValueError) as e:
+                            outcomes.append((op, e))
+                            continue
+                        rows.append(
+                            {
+                                "id": uuid.uuid4(),
+                                "wallet_id": wallet_id,
+                                "operation_type": op.operation_type,
+                                "amount": op.amount,
+                                "previous_balance": balance,
+                                "new_balance": new_balance,
+                            }
+                        )
+                        outcomes.append((op, None))
+                        balance = new_balance
+
+                    transactions = []
+                    if rows:
+                        transactions = await TransactionRepository(session).create_many(
+                            rows
+                        )
+                        await WalletStatsRepository(session).add_transactions(
+                            transactions
+                        )
+                        if stripes:
+                            await stripe_repo.set_balances(
+                                wallet_id,
+                                spread_stripe_change(stripes, balance - initial),
+                            )
+                        else:
+                            wallet.balance = balance
+        except Exception as e:
+            logger.error(
+                f"Не удалось применить пакет операций кошелька {wallet_id}: {e}"
+            )
+            for op in batch:
+                if not op.future.done():
+                    op.future.set_exception(e)
+            return
+
+        logger.debug(
+            f"Кошелек: {wallet_id}, применен пакет из {len(transactions)} "
+            f"операций из {len(batch)}, Текущий баланс: {balance}"
+        )
+        accepted = iter(transactions)
+        for op, error in outcomes:
+            result = next(accepted) if error is None else None
+            if op.future.done():
+                continue
+            if error:
+                op.future.set_exception(error)
+            else:
+                op.future.set_result(result)
+
+
+def get_operation_coalescer() -> Optional[OperationCoalescer]:
+    """Зависимость для получения группировщика операций (если он включен)"""
+    return operation_coalescer
+
+
+operation_coalescer: Optional[OperationCoalescer] = (
+    OperationCoalescer(
+        AsyncSessionLocal,
+        window=settings.COALESCE_WINDOW_MS / 1000,
+        max_batch=settings.COALESCE_MAX_BATCH,
+    )
+    if settings.OPERATION_COALESCING
+    else None
+)
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+from loguru import logger
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repository.partition import TransactionPartitionRepository
+from app.utils.partition import add_months, month_start
+
+# Advisory-блокировка обслуживания партиций: создание и отключение партиций
+# выполняет один процесс за раз (воркеры приложения и команда)
+PARTITION_LOCK = "transactions:partitions"
+
+
+class TransactionPartitionService:
+    """
+    Обслуживание месячных партиций таблицы transactions.
+
+    Партиции создаются заранее на несколько месяцев вперед, старые
+    партиции отключаются и остаются отдельными таблицами, которые можно
+    выгрузить в архив (pg_dump -t) и удалить
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.partition_repo: TransactionPartitionRepository = (
+            TransactionPartitionRepository(session)
+        )
+
+    async def ensure_partitions(self, months_ahead: int) -> list[str]:
+        """Создание партиций от текущего месяца на ``months_ahead`` вперед"""
+        current = month_start(datetime.now(timezone.utc))
+        created = []
+        async with self.session.begin():
+            existing = set((await self.partition_repo.list_partitions()).values())
+            for offset in range(months_ahead + 1):
+                month = add_months(current, offset)
+                if month not in existing:
+                    created.append(await self.partition_repo.create_partition(month))
+        if created:
+            logger.info(f"Созданы партиции транзакций: {', '.join(created)}")
+        return created
+
+    async def detach_partitions(self, before: datetime) -> list[str]:
+        """
+        Отключение партиций месяцев, целиком лежащих раньше ``before``.
+
+        Каждая партиция отключается в своей транзакции, чтобы эксклюзивная
+        блокировка transactions держалась только на время одного DETACH
+        """
+        async with self.session.begin():
+            partitions = await self.partition_repo.list_partitions()
+        detached = []
+        for name, month in partitions.items():
+            if add_months(month, 1) <= before:
+                async with self.session.begin():
+                    await self.partition_repo.detach_partition(name)
+                detached.append(name)
+        if detached:
+            logger.info(f"Отключены партиции транзакций: {', '.join(detached)}")
+        return detached
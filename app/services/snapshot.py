@@ -0,0 +1,153 @@
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+
+from loguru import logger
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.exceptions import WalletNotFoundError
+from app.repository.archive import ArchiveRepository
+from app.repository.snapshot import BalanceSnapshotRepository
+from app.repository.transaction import TransactionRepository
+from app.repository.wallet import WalletRepository
+from app.utils.wallet import calculate_balance_delta
+
+# Advisory-блокировка создания снимков: его выполняет один процесс за раз
+CHECKPOINT_LOCK = "balance_snapshots:checkpoint"
+
+
+class BalanceSnapshotService:
+    """
+    Баланс кошелька на момент времени по контрольным точкам.
+
+    Снимок баланса сохраняется каждые ``every`` транзакций или каждые
+    ``interval`` времени истории кошелька, поэтому запрос баланса на момент
+    времени читает один снимок и суммирует не больше одного интервала
+    транзакций, независимо от длины истории
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.wallet_repo: WalletRepository = WalletRepository(session)
+        self.transaction_repo: TransactionRepository = TransactionRepository(session)
+        self.snapshot_repo: BalanceSnapshotRepository = BalanceSnapshotRepository(
+            session
+        )
+        self.archive_repo: ArchiveRepository = ArchiveRepository(session)
+
+    async def get_balance_at(
+        self, wallet_id: uuid.UUID, at: Optional[datetime] = None
+    ) -> Decimal:
+        """Баланс кошелька на момент ``at`` (без ``at`` - текущий баланс)"""
+        wallet = await self.wallet_repo.find_one_or_none_by_id(wallet_id)
+        if not wallet:
+            raise WalletNotFoundError(wallet_id=wallet_id)
+        if at is None:
+            return wallet.balance
+
+        balance, taken_at = await self.snapshot_repo.get_balance_at(wallet_id, at)
+
+        # Транзакции между снимком и ``at`` могли быть перенесены в архив.
+        # При переносе создаются снимки на конец месяца, поэтому читается
+        # не больше одного месяца истории кошелька
+        segments = await self.archive_repo.list_segments()
+        async for row in self.archive_repo.read_history(
+            wallet_id, segments, newest=at, oldest=taken_at
+        ):
+            if row.created_at > at:
+                continue
+            if taken_at is not None and row.created_at <= taken_at:
+                break
+            balance += calculate_balance_delta(row.operation_type, row.amount)
+        return balance
+
+    async def checkpoint(
+        self,
+        every: int,
+        interval: timedelta,
+        lag: timedelta,
+        page_size: int = 100,
+        chunk_size: int = 1000,
+    ) -> int:
+        """
+        Инкрементальное создание снимков баланса для всех кошельков.
+
+        Каждый кошелек продолжает с последнего сохраненного снимка, поэтому
+        прерванный запуск просто продолжится следующим. Учитываются только
+        транзакции старше ``lag``: created_at - время начала транзакции БД,
+        и более ранняя по времени транзакция может зафиксироваться позже.
+        Возвращает количество созданных снимков
+        """
+        async with self.session.begin():
+            horizon = (await self.session.execute(select(func.now()))).scalar_one()
+        horizon -= lag
+
+        created = 0
+        after = None
+        while True:
+            async with self.session.begin():
+                wallets = await self.snapshot_repo.find_pending_wallets(
+                    horizon, every, interval, after, page_size
+                )
+            if not wallets:
+                break
+            for wallet_id, taken_at, balance in wallets:
+                created += await self._checkpoint_wallet(
+                    wallet_id, taken_at, balance, horizon, every, interval, chunk_size
+                )
+            after = wallets[-1].id
+
+        logger.info(f"Создано снимков баланса: {created}")
+        return created
+
+    async def _checkpoint_wallet(
+        self,
+        wallet_id: uuid.UUID,
+        taken_at: Optional[datetime],
+        balance: Optional[Decimal],
+        horizon: datetime,
+        every: int,
+        interval: timedelta,
+        chunk_size: int,
+    ) -> int:
+        """Снимки одного кошелька по транзакциям после последнего снимка"""
+        balance = balance or Decimal(0)
+        anchor = taken_at
+        pending = 0
+        group_at = None
+        snapshots = []
+
+        def close_group():
+            # Снимок ставится только на границе группы транзакций с одинаковым
+            # created_at, чтобы он учитывал все транзакции этого момента
+            nonlocal anchor, pending
+            if pending >= every or group_at - anchor >= interval:
+                snapshots.append(
+                    {"wallet_id": wallet_id, "taken_at": group_at, "balance": balance}
+                )
+                anchor = group_at
+                pending = 0
+
+        async with self.session.begin():
+            async for partition in self.transaction_repo.stream_deltas(
+                wallet_id, taken_at, horizon, chunk_size
+            ):
+                for created_at, delta in partition:
+                    if group_at is not None and created_at != group_at:
+                        close_group()
+                    if anchor is None:
+                        anchor = created_at
+                    balance += delta
+                    pending += 1
+                    group_at = created_at
+            if group_at is not None:
+                close_group()
+
+            if snapshots:
+                await self.snapshot_repo.create_many(snapshots)
+
+        logger.debug(f"Кошелек: {wallet_id}, создано снимков баланса: {len(snapshots)}")
+        return len(snapshots)
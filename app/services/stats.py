@@ -0,0 +1,74 @@
+import uuid
+from datetime import date
+from typing import Optional, Sequence
+
+from loguru import logger
+
+from sqlalchemy import Row, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache.cache_redis import invalidate_wallet_cache
+from app.exceptions import WalletNotFoundError
+from app.models.wallet import Wallet
+from app.repository.stats import WalletStatsRepository
+from app.repository.stripe import WalletStripeRepository
+from app.repository.wallet import WalletRepository
+
+
+class WalletStatsService:
+    """
+    Сводка операций кошельков по дням.
+
+    Сводная таблица обновляется в той же транзакции БД, что и операция,
+    поэтому статистика читается без агрегации по таблице транзакций
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.wallet_repo: WalletRepository = WalletRepository(session)
+        self.stats_repo: WalletStatsRepository = WalletStatsRepository(session)
+        self.stripe_repo: WalletStripeRepository = WalletStripeRepository(session)
+
+    async def get_wallet_stats(
+        self,
+        wallet_id: uuid.UUID,
+        date_from: Optional[date],
+        date_to: Optional[date],
+        bucket: str,
+    ) -> Sequence[Row]:
+        wallet = await self.wallet_repo.find_one_or_none_by_id(wallet_id)
+        if not wallet:
+            raise WalletNotFoundError(wallet_id=wallet_id)
+        return await self.stats_repo.get_stats(wallet_id, date_from, date_to, bucket)
+
+    async def backfill(self, batch_size: int = 500) -> int:
+        """
+        Пересчет сводки всех кошельков по существующей истории транзакций.
+
+        Кошельки обрабатываются пачками, каждая пачка (и полосы кошельков
+        в режиме полос) блокируется FOR UPDATE на время пересчета, поэтому
+        конкурентные операции не теряются. После фиксации пачки кэш ее
+        кошельков инвалидируется, чтобы /stats не отдавал старую сводку.
+        Повторный запуск безопасен. Возвращает количество кошельков
+        """
+        processed = 0
+        after = None
+        while True:
+            query = select(Wallet.id).order_by(Wallet.id).limit(batch_size)
+            if after is not None:
+                query = query.where(Wallet.id > after)
+            async with self.session.begin():
+                wallet_ids = list((await self.session.scalars(query)).all())
+                if not wallet_ids:
+                    break
+                wallets = await self.wallet_repo.get_many_with_lock(wallet_ids)
+                # Операции над полосами не блокируют строку кошелька
+                striped = [wallet.id for wallet in wallets if wallet.stripes]
+                if striped:
+                    await self.stripe_repo.lock_stripes(striped)
+                await self.stats_repo.rebuild(wallet_ids)
+            await invalidate_wallet_cache(*wallet_ids)
+            processed += len(wallet_ids)
+            after = wallet_ids[-1]
+            logger.info(f"Пересчитана сводка кошельков: {processed}")
+        return processed
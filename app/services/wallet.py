@@ -1,87 +1,577 @@
+import time
 import uuid
+from datetime import datetime
 from decimal import Decimal
+from typing import AsyncIterator, Optional, Sequence, Union
 
 from loguru import logger
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.exceptions import WalletNotFoundError
+from app import metrics
+from app.archive.segment import ArchivedTransaction
+from app.cache.cache_redis import get_idempotency_record, set_idempotency_record
+from app.config import settings
+from app.exceptions import (
+    IdempotencyKeyReusedError,
+    InsufficientFundsError,
+    WalletError,
+    WalletNotFoundError,
+)
+from app.repository.archive import ArchiveRepository
+from app.repository.idempotency import IdempotencyRepository
+from app.repository.stats import WalletStatsRepository
+from app.repository.stripe import WalletStripeRepository
 from app.repository.wallet import WalletRepository
 from app.repository.transaction import TransactionRepository
 from app.models.wallet import Wallet, Transaction
-from app.utils.wallet import calculate_new_balance
+from app.services.coalescer import OperationCoalescer
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.wallet import (
+    calculate_balance_delta,
+    calculate_new_balance,
+    operation_request_hash,
+    split_balance,
+    spread_stripe_change,
+)
+
+# Кошельки в режиме полос, замеченные этим процессом: операции над ними
+# сразу идут по полосам. Устаревшая отметка исправляется при следующей
+# операции, потому что оба пути проверяют режим кошелька в запросе
+_striped_wallets: set[uuid.UUID] = set()
+
+# Сколько раз повторить операцию, если режим кошелька сменился во время нее
+_MODE_SWITCH_ATTEMPTS = 3
+
+
+def _observe_lock_times(started: float, applied: float) -> None:
+    """
+    Метрики блокировки баланса: запрос, изменивший баланс (включая ожидание
+    блокировки строки), и время от него до конца фиксации транзакции
+    """
+    metrics.operation_lock_wait.observe(applied - started)
+    metrics.operation_lock_hold.observe(time.perf_counter() - applied)
 
 
 class WalletService:
 
-    def __init__(self, session: AsyncSession):
+    def __init__(
+        self,
+        session: AsyncSession,
+        coalescer: Optional[OperationCoalescer] = None,
+    ):
         self.session = session
+        self.coalescer = coalescer
         self.wallet_repo: WalletRepository = WalletRepository(session)
         self.transaction_repo: TransactionRepository = TransactionRepository(session)
+        self.idempotency_repo: IdempotencyRepository = IdempotencyRepository(session)
+        self.stats_repo: WalletStatsRepository = WalletStatsRepository(session)
+        self.archive_repo: ArchiveRepository = ArchiveRepository(session)
+        self.stripe_repo: WalletStripeRepository = WalletStripeRepository(session)
 
     async def create_new_wallet(self):
         new_wallet = Wallet()
         return await self.wallet_repo.add(new_wallet)
 
+    async def create_wallets(
+        self,
+        count: Optional[int] = None,
+        wallets: Optional[list[tuple[uuid.UUID, Decimal]]] = None,
+        chunk_size: int = 5000,
+    ) -> AsyncIterator[list[uuid.UUID]]:
+        """
+        Массовое создание кошельков пачками по ``chunk_size``: ``count``
+        кошельков с нулевым балансом или ``wallets`` - пары (id, баланс).
+
+        Каждая пачка - один INSERT в своей транзакции, id созданных
+        кошельков отдаются после ее фиксации. При ошибке уже
+        зафиксированные пачки остаются, повтор с теми же id пропускает
+        существующие кошельки
+        """
+        if count is not None:
+            for start in range(0, count, chunk_size):
+                async with self.session.begin():
+                    created = await self.wallet_repo.create_empty(
+                        min(chunk_size, count - start)
+                    )
+                yield created
+            return
+
+        for start in range(0, len(wallets), chunk_size):
+            chunk = wallets[start : start + chunk_size]
+            async with self.session.begin():
+                created = await self.wallet_repo.create_many(
+                    [wallet_id for wallet_id, _ in chunk],
+                    [balance for _, balance in chunk],
+                )
+            yield created
+
     async def get_wallet_by_id(self, wallet_id: uuid.UUID):
         wallet = await self.wallet_repo.find_one_or_none_by_id(wallet_id)
         return wallet
 
-    async def perform_operation(
-        self, wallet_id: uuid.UUID, operation_type: str, amount: Decimal
-    ) -> tuple[Wallet, Transaction]:
+    async def set_stripes(self, wallet_id: uuid.UUID, stripes: int) -> Wallet:
         """
-        Выполнение операции над кошельком с использованием пессимистической блокировки
-        для предотвращения race conditions
+        Включение режима полос (``stripes`` > 0) или возврат баланса
+        в строку кошелька (``stripes`` = 0).
+
+        Строка кошелька и все его полосы блокируются, баланс делится
+        на полосы поровну или собирается обратно в строку кошелька
         """
+        if stripes < 0:
+            raise ValueError("Количество полос не может быть отрицательным")
         async with self.session.begin():
-            # Получаем кошелек с блокировкой FOR UPDATE
             wallet = await self.wallet_repo.get_with_lock(wallet_id)
-
             if not wallet:
                 raise WalletNotFoundError(wallet_id=wallet_id)
+            current = (await self.stripe_repo.lock_stripes([wallet_id])).get(
+                wallet_id, {}
+            )
+            balance = wallet.balance + sum(current.values())
+
+            await self.stripe_repo.delete_stripes(wallet_id)
+            if stripes:
+                await self.stripe_repo.create_stripes(
+                    wallet_id, split_balance(balance, stripes)
+                )
+                balance = Decimal(0)
+            wallet.balance = balance
+            wallet.stripes = stripes
 
-            # Обновляем баланс в БД
-            logger.debug(f"Обновляем баланс кошелька с ID {wallet_id}")
-            new_balance = calculate_new_balance(
-                wallet_id, wallet.balance, operation_type, amount
+        if stripes:
+            _striped_wallets.add(wallet_id)
+        else:
+            _striped_wallets.discard(wallet_id)
+        logger.info(f"Кошелек: {wallet_id}, количество полос баланса: {stripes}")
+        return wallet
+
+    async def perform_operation(
+        self,
+        wallet_id: uuid.UUID,
+        operation_type: str,
+        amount: Decimal,
+        idempotency_key: Optional[str] = None,
+    ) -> Transaction:
+        """
+        Выполнение операции над кошельком одним запросом к БД.
+
+        Проверка баланса, его изменение и запись транзакции выполняются
+        атомарно (условный UPDATE ... RETURNING + INSERT в CTE), поэтому
+        блокировка строки кошелька держится только на время одного запроса
+        """
+        if idempotency_key:
+            return await self._perform_idempotent_operation(
+                idempotency_key, wallet_id, operation_type, amount
             )
 
-            await self.wallet_repo.update_balance(wallet_id)
+        if self.coalescer:
+            # Операция будет применена в общем пакете операций кошелька
+            return await self.coalescer.submit(wallet_id, operation_type, amount)
+
+        async with self.session.begin():
+            started = time.perf_counter()
+            transaction = await self._apply_operation(wallet_id, operation_type, amount)
+            applied = time.perf_counter()
+        _observe_lock_times(started, applied)
+        return transaction
+
+    async def _apply_operation(
+        self, wallet_id: uuid.UUID, operation_type: str, amount: Decimal
+    ) -> Transaction:
+        """Применение операции в текущей транзакции, при ошибке - исключение"""
+        delta = calculate_balance_delta(operation_type, amount)
+        for _ in range(_MODE_SWITCH_ATTEMPTS):
+            if wallet_id in _striped_wallets:
+                transaction = await self._apply_striped_operation(
+                    wallet_id, operation_type, amount, delta
+                )
+                if transaction:
+                    return transaction
+                # Режим полос выключен - кошелек снова хранит баланс в строке
+                _striped_wallets.discard(wallet_id)
+                continue
 
-            # Создаем запись о транзакции
-            transaction = await self.transaction_repo.create(
+            row = await self.wallet_repo.apply_operation(
                 wallet_id=wallet_id,
                 operation_type=operation_type,
                 amount=amount,
-                previous_balance=wallet.balance,
-                new_balance=new_balance,
+                delta=delta,
             )
 
-            # Обновляем объекты в сессии
-            await self.wallet_repo.refresh_wallet(wallet)
-            await self.transaction_repo.refresh_transaction(transaction)
+            if row is None:
+                raise WalletNotFoundError(wallet_id=wallet_id)
+
+            if row.id is not None:
+                break
+
+            if row.stripes:
+                _striped_wallets.add(wallet_id)
+                continue
 
-            # Обновляем баланс кошелька
+            if row.current_balance + delta < 0:
+                # Условие UPDATE не выполнилось - средств недостаточно
+                raise InsufficientFundsError(
+                    wallet_id=wallet_id,
+                    current_balance=row.current_balance,
+                    requested_amount=amount,
+                )
+            # Строка кошелька изменилась после снимка запроса (например,
+            # включен режим полос) - повторяем с новым снимком
+        else:
+            raise WalletError(
+                f"Режим кошелька {wallet_id} менялся во время операции, "
+                f"операция не применена"
+            )
+
+        logger.debug(
+            "Кошелек: {}, Запрошенная сумма: {}, Предыдущий баланс: {}, "
+            "Текущий баланс: {}",
+            wallet_id,
+            amount,
+            row.previous_balance,
+            row.new_balance,
+        )
+        return Transaction(
+            id=row.id,
+            wallet_id=row.wallet_id,
+            operation_type=row.operation_type,
+            amount=row.amount,
+            previous_balance=row.previous_balance,
+            new_balance=row.new_balance,
+            created_at=row.created_at,
+        )
+
+    async def _apply_striped_operation(
+        self,
+        wallet_id: uuid.UUID,
+        operation_type: str,
+        amount: Decimal,
+        delta: Decimal,
+    ) -> Optional[Transaction]:
+        """
+        Применение операции к кошельку в режиме полос.
+
+        Обычно операция меняет одну полосу одним запросом. Если ни одной
+        свободной полосы не хватает на списание, блокируются все полосы
+        и сумма забирается из нескольких полос. Возвращает None, если
+        у кошелька нет полос
+        """
+        row = await self.stripe_repo.apply_operation(
+            wallet_id, operation_type, amount, delta
+        )
+        if row is not None:
             logger.debug(
-                f"Кошелек: {wallet_id}, Запрошенная сумма: {amount}, "
-                f"Предыдущий баланс: {wallet.balance}, "
-                f"Текущий баланс: {new_balance}"
+                "Кошелек: {}, Запрошенная сумма: {}, Текущий баланс полос: {}",
+                wallet_id,
+                amount,
+                row.new_balance,
             )
-            wallet.balance = new_balance
+            return Transaction(**row._asdict())
 
-        return wallet, transaction
+        stripes = (await self.stripe_repo.lock_stripes([wallet_id])).get(wallet_id)
+        if not stripes:
+            return None
+        balance = sum(stripes.values())
+        new_balance = calculate_new_balance(wallet_id, balance, operation_type, amount)
+        await self.stripe_repo.set_balances(
+            wallet_id, spread_stripe_change(stripes, delta)
+        )
+        [transaction] = await self.transaction_repo.create_many(
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "wallet_id": wallet_id,
+                    "operation_type": operation_type,
+                    "amount": amount,
+                    "previous_balance": balance,
+                    "new_balance": new_balance,
+                }
+            ]
+        )
+        await self.stats_repo.add_transactions([transaction])
+        logger.debug(
+            "Кошелек: {}, Запрошенная сумма: {}, "
+            "списано с нескольких полос, Текущий баланс: {}",
+            wallet_id,
+            amount,
+            new_balance,
+        )
+        return transaction
+
+    async def _perform_idempotent_operation(
+        self,
+        key: str,
+        wallet_id: uuid.UUID,
+        operation_type: str,
+        amount: Decimal,
+    ) -> Transaction:
+        """
+        Выполнение операции с ключом идемпотентности.
+
+        Повтор с тем же ключом возвращает сохраненный результат, не трогая
+        строку кошелька. Ключ захватывается в той же транзакции, что и
+        операция, поэтому конкурентный дубликат ждет завершения первого
+        запроса. Такие операции не группируются
+        """
+        request_hash = operation_request_hash(wallet_id, operation_type, amount)
+
+        record = await get_idempotency_record(key)
+        if record:
+            logger.debug("Повтор операции по ключу {} (Redis)", key)
+            return self._replay(key, record, request_hash, operation_type, amount)
+
+        ttl = settings.IDEMPOTENCY_KEY_TTL
+        async with self.session.begin():
+            claimed = await self.idempotency_repo.claim(
+                key, wallet_id, request_hash, ttl
+            )
+            if claimed:
+                started = time.perf_counter()
+                transaction = await self._apply_operation(
+                    wallet_id, operation_type, amount
+                )
+                applied = time.perf_counter()
+                await self.idempotency_repo.complete(
+                    key, transaction.id, transaction.new_balance
+                )
+            else:
+                stored = await self.idempotency_repo.get(key)
+
+        if not claimed:
+            logger.debug("Повтор операции по ключу {}", key)
+            record = {
+                "wallet_id": stored.wallet_id,
+                "request_hash": stored.request_hash,
+                "transaction_id": stored.transaction_id,
+                "new_balance": stored.new_balance,
+            }
+            return self._replay(key, record, request_hash, operation_type, amount)
+
+        _observe_lock_times(started, applied)
+        await set_idempotency_record(
+            key,
+            {
+                "wallet_id": wallet_id,
+                "request_hash": request_hash,
+                "transaction_id": transaction.id,
+                "new_balance": transaction.new_balance,
+            },
+            ttl,
+        )
+        return transaction
+
+    @staticmethod
+    def _replay(
+        key: str,
+        record: dict,
+        request_hash: str,
+        operation_type: str,
+        amount: Decimal,
+    ) -> Transaction:
+        """Результат ранее выполненной операции по сохраненной записи"""
+        if record["request_hash"] != request_hash:
+            raise IdempotencyKeyReusedError(key=key)
+        return Transaction(
+            id=uuid.UUID(str(record["transaction_id"])),
+            wallet_id=uuid.UUID(str(record["wallet_id"])),
+            operation_type=operation_type,
+            amount=amount,
+            new_balance=(
+                Decimal(str(record["new_balance"]))
+                if record["new_balance"] is not None
+                else None
+            ),
+        )
+
+    async def perform_batch_operations(
+        self,
+        operations: list[tuple[uuid.UUID, str, Decimal]],
+        atomic: bool,
+    ) -> list[Union[Transaction, WalletError, None]]:
+        """
+        Выполнение пакета операций над несколькими кошельками в одной транзакции.
+
+        Кошельки блокируются одним запросом в порядке сортировки id, операции
+        применяются в порядке запроса, транзакции пишутся одним INSERT.
+        Для каждой операции возвращается транзакция или ошибка; если пакет
+        атомарный и хотя бы одна операция не прошла, ничего не применяется,
+        а для успешных операций возвращается None
+        """
+        outcomes: list[Union[dict, WalletError]] = []
+        rows: list[dict] = []
+
+        async with self.session.begin():
+            wallets = {
+                wallet.id: wallet
+                for wallet in await self.wallet_repo.get_many_with_lock(
+                    [wallet_id for wallet_id, _, _ in operations]
+                )
+            }
+            # У кошельков в режиме полос блокируются и все полосы
+            striped = [wallet.id for wallet in wallets.values() if wallet.stripes]
+            stripes = await self.stripe_repo.lock_stripes(striped) if striped else {}
+            balances = {
+                wallet_id: (
+                    sum(stripes[wallet_id].values())
+                    if wallet_id in stripes
+                    else wallet.balance
+                )
+                for wallet_id, wallet in wallets.items()
+            }
+            initial = dict(balances)
+
+            for wallet_id, operation_type, amount in operations:
+                if wallet_id not in balances:
+                    outcomes.append(WalletNotFoundError(wallet_id=wallet_id))
+                    continue
+                try:
+                    new_balance = calculate_new_balance(
+                        wallet_id, balances[wallet_id], operation_type, amount
+                    )
+                except InsufficientFundsError as e:
+                    outcomes.append(e)
+                    continue
+                row = {
+                    "id": uuid.uuid4(),
+                    "wallet_id": wallet_id,
+                    "operation_type": operation_type,
+                    "amount": amount,
+                    "previous_balance": balances[wallet_id],
+                    "new_balance": new_balance,
+                }
+                rows.append(row)
+                outcomes.append(row)
+                balances[wallet_id] = new_balance
+
+            if atomic and len(rows) != len(operations):
+                logger.debug("Пакет операций отменен из-за ошибок в операциях")
+                return [o if isinstance(o, WalletError) else None for o in outcomes]
+
+            transactions = {}
+            if rows:
+                created = await self.transaction_repo.create_many(rows)
+                await self.stats_repo.add_transactions(created)
+                transactions = {transaction.id: transaction for transaction in created}
+                for wallet_id, wallet in wallets.items():
+                    if balances[wallet_id] == initial[wallet_id]:
+                        continue
+                    if wallet_id in stripes:
+                        await self.stripe_repo.set_balances(
+                            wallet_id,
+                            spread_stripe_change(
+                                stripes[wallet_id],
+                                balances[wallet_id] - initial[wallet_id],
+                            ),
+                        )
+                    else:
+                        wallet.balance = balances[wallet_id]
+
+        logger.debug(
+            "Пакет операций выполнен: применено {} из {}", len(rows), len(operations)
+        )
+        return [
+            o if isinstance(o, WalletError) else transactions[o["id"]] for o in outcomes
+        ]
 
     async def get_wallet_transactions(
         self,
         wallet_id: uuid.UUID,
         skip: int,
         limit: int,
-    ):
+        cursor: Optional[str] = None,
+    ) -> tuple[list[Sequence], Optional[str]]:
         """
-        Получить список транзакций
+        Получить страницу транзакций и курсор следующей страницы.
+
+        Транзакции - строки колонок (из БД или архива) в порядке
+        колонок TRANSACTION_COLUMNS
+
+        Если передан курсор, смещение ``skip`` не используется. Когда
+        оперативная история заканчивается, страница дочитывается из архива
         """
+        after = decode_cursor(cursor) if cursor else None
+        # Запрашиваем на одну запись больше, чтобы узнать, есть ли продолжение
         transactions = await self.transaction_repo.get_list_transactions(
-            wallet_id=wallet_id, skip=skip, limit=limit
+            wallet_id=wallet_id, skip=skip, limit=limit + 1, after=after
         )
-        return transactions
+        if len(transactions) <= limit:
+            transactions = list(transactions) + await self._read_archived_history(
+                wallet_id, skip, limit + 1 - len(transactions), after, transactions
+            )
+        next_cursor = None
+        if len(transactions) > limit:
+            transactions = transactions[:limit]
+            next_cursor = encode_cursor(
+                transactions[-1].created_at, transactions[-1].id
+            )
+        return transactions, next_cursor
+
+    async def _read_archived_history(
+        self,
+        wallet_id: uuid.UUID,
+        skip: int,
+        count: int,
+        after: Optional[tuple[datetime, uuid.UUID]],
+        hot: Sequence,
+    ) -> list[ArchivedTransaction]:
+        """Продолжение страницы истории из архива (архив старше данных в БД)"""
+        segments = await self.archive_repo.list_segments()
+        if not segments:
+            return []
+
+        archive_skip = 0
+        if after is None and skip and not hot:
+            # Смещение целиком ушло за оперативные данные
+            hot_count = await self.transaction_repo.count_transactions(wallet_id)
+            archive_skip = max(0, skip - hot_count)
+
+        rows = []
+        async for row in self.archive_repo.read_history(
+            wallet_id, segments, newest=after[0] if after else None
+        ):
+            if after and (row.created_at, row.id) >= after:
+                continue
+            if archive_skip:
+                archive_skip -= 1
+                continue
+            rows.append(row)
+            if len(rows) >= count:
+                break
+        return rows
+
+    async def export_wallet_transactions(
+        self,
+        wallet_id: uuid.UUID,
+        date_from: Optional[datetime],
+        date_to: Optional[datetime],
+        chunk_size: int,
+    ):
+        """
+        Потоковая выгрузка истории транзакций пачками строк:
+        сначала архив (от старых блоков к новым), затем данные из БД.
+        Память не зависит от объема истории: архив читается по блоку
+        """
+        segments = await self.archive_repo.list_segments()
+        chunk = []
+        async for rows in self.archive_repo.read_blocks(
+            wallet_id, segments, newest=date_to, oldest=date_from, oldest_first=True
+        ):
+            chunk.extend(
+                row
+                for row in rows
+                if (date_from is None or row.created_at >= date_from)
+                and (date_to is None or row.created_at < date_to)
+            )
+            while len(chunk) >= chunk_size:
+                yield chunk[:chunk_size]
+                chunk = chunk[chunk_size:]
+        if chunk:
+            yield chunk
+
+        async for partition in self.transaction_repo.stream_transactions(
+            wallet_id=wallet_id,
+            date_from=date_from,
+            date_to=date_to,
+            chunk_size=chunk_size,
+        ):
+            yield partition
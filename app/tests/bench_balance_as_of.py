@@ -0,0 +1,94 @@
+"""
+Бенчмарк баланса на момент времени: полный пересчет истории против снимков.
+
+Для кошельков с историей разной длины измеряет время запроса баланса
+на случайные моменты времени до и после создания снимков баланса.
+
+    python -m app.tests.bench_balance_as_of --sizes 1000 10000 100000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.models.wallet import Transaction, Wallet
+from app.repository.snapshot import BalanceSnapshotRepository
+from app.services.snapshot import BalanceSnapshotService
+
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+async def _create_history(session_factory, size: int) -> uuid.UUID:
+    """Кошелек с историей из ``size`` пополнений, по одному в секунду"""
+    wallet_id = uuid.uuid4()
+    async with session_factory() as session:
+        async with session.begin():
+            session.add(Wallet(id=wallet_id, balance=Decimal(size)))
+        for offset in range(0, size, 10000):
+            rows = [
+                {
+                    "wallet_id": wallet_id,
+                    "operation_type": "DEPOSIT",
+                    "amount": Decimal(1),
+                    "previous_balance": Decimal(i),
+                    "new_balance": Decimal(i + 1),
+                    "created_at": START + timedelta(seconds=i),
+                }
+                for i in range(offset, min(offset + 10000, size))
+            ]
+            async with session.begin():
+                await session.execute(insert(Transaction), rows)
+    return wallet_id
+
+
+async def _measure(session_factory, wallet_id, size: int, lookups: int) -> float:
+    """Медианное время запроса баланса на случайный момент, мс"""
+    latencies = []
+    async with session_factory() as session:
+        repo = BalanceSnapshotRepository(session)
+        for _ in range(lookups):
+            i = random.randrange(size)
+            started = time.perf_counter()
+            balance = (
+                await repo.get_balance_at(wallet_id, START + timedelta(seconds=i))
+            ).balance
+            latencies.append(time.perf_counter() - started)
+            assert balance == i + 1, f"Баланс {balance}, ожидался {i + 1}"
+    return statistics.median(latencies) * 1000
+
+
+async def main(sizes: list[int], every: int, lookups: int):
+    engine = create_async_engine(settings.TEST_DB_URL)
+    session_factory = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    print(f"{'history':>10}{'full scan, ms':>16}{'snapshots, ms':>16}")
+    for size in sizes:
+        wallet_id = await _create_history(session_factory, size)
+        before = await _measure(session_factory, wallet_id, size, lookups)
+        async with session_factory() as session:
+            await BalanceSnapshotService(session).checkpoint(
+                every=every, interval=timedelta(days=365), lag=timedelta(0)
+            )
+        after = await _measure(session_factory, wallet_id, size, lookups)
+        print(f"{size:>10}{before:>16.2f}{after:>16.2f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--every", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.every, args.lookups))
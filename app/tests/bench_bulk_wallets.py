@@ -0,0 +1,92 @@
+"""
+Бенчмарк массового создания кошельков: кошельков в секунду на один процесс.
+
+Сравнивает создание ``--single`` кошельков по одному через POST /wallets/
+с ``--concurrency`` параллельными запросами и создание ``--count``
+кошельков одним запросом POST /wallets/bulk: по количеству и списком
+с id клиента и начальным балансом. Приложение вызывается внутри процесса
+с сессиями на БД ``--db-url`` (по умолчанию TEST_DB_URL); созданные
+кошельки остаются в БД.
+
+    python -m app.tests.bench_bulk_wallets --count 100000
+    python -m app.tests.bench_bulk_wallets --count 100000 --chunk-size 1000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.tests.loadtest import in_process_client
+
+
+async def _single(client, total: int, concurrency: int) -> int:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def create():
+        async with semaphore:
+            response = await client.post("/api/v1/wallets/")
+            return response.status_code == 201
+
+    return sum(await asyncio.gather(*[create() for _ in range(total)]))
+
+
+async def _bulk(client, body: dict) -> int:
+    created = 0
+    async with client.stream("POST", "/api/v1/wallets/bulk", json=body) as response:
+        assert response.status_code == 201, response.status_code
+        async for line in response.aiter_lines():
+            created += '"id"' in line
+    return created
+
+
+async def main(args):
+    settings.BULK_WALLETS_CHUNK_SIZE = args.chunk_size
+    engine = create_async_engine(
+        args.db_url, pool_size=args.concurrency, max_overflow=0
+    )
+    wallets = [
+        {"id": str(uuid.uuid4()), "balance": str(random.randint(0, 10000))}
+        for _ in range(args.count)
+    ]
+    cases = {
+        f"POST /wallets/ x{args.single}": lambda client: _single(
+            client, args.single, args.concurrency
+        ),
+        f"bulk count={args.count}": lambda client: _bulk(client, {"count": args.count}),
+        f"bulk wallets x{args.count}": lambda client: _bulk(
+            client, {"wallets": wallets}
+        ),
+    }
+
+    print(f"{'case':<28}{'created':>10}{'seconds':>10}{'wallets/s':>12}")
+    async with in_process_client(engine, args.concurrency) as client:
+        for name, case in cases.items():
+            started = time.perf_counter()
+            created = await case(client)
+            elapsed = time.perf_counter() - started
+            print(f"{name:<28}{created:>10}{elapsed:>10.2f}{created / elapsed:>12.0f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--db-url", default=settings.TEST_DB_URL)
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--single", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--chunk-size", type=int, default=settings.BULK_WALLETS_CHUNK_SIZE
+    )
+    args = parser.parse_args()
+
+    # Вывод loguru в консоль не должен попадать в замеры
+    logger.remove(0)
+    asyncio.run(main(args))
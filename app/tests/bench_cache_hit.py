@@ -0,0 +1,111 @@
+"""
+Микробенчмарк обработки попадания в кэш.
+
+Сравнивает прежний путь (json.loads записи, валидация по response_model
+и сериализация в FastAPI) с возвратом готового JSON из кэша.
+
+    python -m app.tests.bench_cache_hit --repeat 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from pydantic import TypeAdapter
+
+from app.cache.cache_redis import to_response, dump_entry, load_entry
+from app.main import app
+from app.schemas.transaction import TransactionResponse
+from app.schemas.wallet import WalletResponse
+
+
+def _sample_wallet() -> WalletResponse:
+    now = datetime.now(timezone.utc)
+    return WalletResponse(
+        id=uuid.uuid4(), balance=Decimal("1234.50"), created_at=now, updated_at=now
+    )
+
+
+def _sample_transactions(count: int) -> list[TransactionResponse]:
+    wallet_id = uuid.uuid4()
+    return [
+        TransactionResponse(
+            id=uuid.uuid4(),
+            wallet_id=wallet_id,
+            operation_type="DEPOSIT",
+            amount=Decimal("10.00"),
+            previous_balance=Decimal(i * 10),
+            new_balance=Decimal(i * 10 + 10),
+            created_at=datetime.now(timezone.utc),
+        )
+        for i in range(count)
+    ]
+
+
+def _response_field(path: str):
+    for route in app.routes:
+        if getattr(route, "path", None) == path:
+            return route.response_field
+    raise LookupError(path)
+
+
+async def _measure(handler, raw: str, repeat: int) -> float:
+    """Среднее время обработки одного попадания в микросекундах"""
+    for _ in range(repeat // 10):
+        await handler(raw)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await handler(raw)
+    return (time.perf_counter() - started) / repeat * 1_000_000
+
+
+async def main(repeat: int, page_size: int):
+    cases = [
+        ("balance", "/api/v1/wallets/{wallet_id}", WalletResponse, _sample_wallet()),
+        (
+            f"history x{page_size}",
+            "/api/v1/wallets/{wallet_id}/wallet_transactions",
+            list[TransactionResponse],
+            _sample_transactions(page_size),
+        ),
+    ]
+    print(f"{'endpoint':<16}{'before, us':>12}{'after, us':>12}{'saving':>10}")
+    for name, path, model, value in cases:
+        adapter = TypeAdapter(model)
+        field = _response_field(path)
+        old_raw = json.dumps(
+            {"body": adapter.dump_python(value, mode="json"), "headers": {}}
+        )
+        new_raw = dump_entry({"body": adapter.dump_json(value).decode(), "headers": {}})
+
+        async def before(raw):
+            content = await serialize_response(
+                field=field, response_content=json.loads(raw)["body"]
+            )
+            return JSONResponse(content)
+
+        async def after(raw):
+            return to_response(load_entry(raw))
+
+        assert (await before(old_raw)).body == (await after(new_raw)).body
+
+        before_us = await _measure(before, old_raw, repeat)
+        after_us = await _measure(after, new_raw, repeat)
+        print(
+            f"{name:<16}{before_us:>12.1f}{after_us:>12.1f}"
+            f"{1 - after_us / before_us:>10.0%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeat, args.page_size))
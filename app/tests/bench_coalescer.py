@@ -0,0 +1,86 @@
+"""
+Бенчмарк группировки операций: пропускная способность и задержка.
+
+Запускает конкурентные пополнения одного "горячего" кошелька в тестовой БД
+в обычном режиме и в режиме группировки с разными окнами.
+
+    python -m app.tests.bench_coalescer --ops 2000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from decimal import Decimal
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.models.wallet import Wallet
+from app.services.coalescer import OperationCoalescer
+from app.services.wallet import WalletService
+
+
+async def _run(session_factory, coalescer, ops: int, concurrency: int):
+    async with session_factory() as session:
+        wallet = await WalletService(session).create_new_wallet()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one_operation():
+        async with semaphore:
+            started = time.perf_counter()
+            async with session_factory() as session:
+                await WalletService(session, coalescer=coalescer).perform_operation(
+                    wallet.id, "DEPOSIT", Decimal("1.00")
+                )
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one_operation() for _ in range(ops)])
+    elapsed = time.perf_counter() - started
+
+    async with session_factory() as session:
+        balance = (await session.get(Wallet, wallet.id)).balance
+    assert balance == Decimal(ops), f"Итоговый баланс {balance}, ожидался {ops}"
+
+    latencies.sort()
+    return {
+        "ops_per_sec": ops / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main(ops: int, concurrency: int, windows: list[float], max_batch: int):
+    engine = create_async_engine(settings.TEST_DB_URL, pool_size=20, max_overflow=40)
+    session_factory = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    modes = [("direct", None)] + [
+        (
+            f"coalesced {window_ms}ms/{max_batch}",
+            OperationCoalescer(session_factory, window_ms / 1000, max_batch),
+        )
+        for window_ms in windows
+    ]
+    print(f"{'mode':<24}{'ops/s':>10}{'p50, ms':>10}{'p99, ms':>10}")
+    for name, coalescer in modes:
+        result = await _run(session_factory, coalescer, ops, concurrency)
+        print(
+            f"{name:<24}{result['ops_per_sec']:>10.0f}"
+            f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--windows", type=float, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--max-batch", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.ops, args.concurrency, args.windows, args.max_batch))
@@ -0,0 +1,365 @@
+"""
+Микробенчмарки компонентов пути запроса.
+
+Каждый случай выполняется ``--rounds`` раундов по ``number`` вызовов после
+разогрева; в результате - медиана и межквартильный размах (IQR) времени
+одного вызова по раундам. Случаи: calculate_new_balance, валидация
+OperationRequest, сборка WalletResponse/TransactionResponse из объектов
+ORM, JSON страницы истории через pydantic и format_history_json,
+накладные расходы декораторов cached и invalidate_cache (Redis заменен
+на fakeredis) и полный круг запроса через ASGI для каждого эндпоинта
+кошелька (БД ``--db-url``, по умолчанию TEST_DB_URL).
+
+Результат сравнивается с сохраненным в bench_hot_path_baseline.json, случаи
+медленнее более чем на ``--max-regression`` отмечаются, команда
+завершается с кодом 1. ``--save-baseline`` перезаписывает базовый файл.
+
+    python -m app.tests.bench_hot_path
+    python -m app.tests.bench_hot_path --skip-asgi --json hot_path.json
+    python -m app.tests.bench_hot_path --save-baseline
+
+Стандартный вывод loguru в консоль отключается, журнал в файл приложения
+остается, как в работающем сервисе.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Awaitable, Callable, Optional
+
+from fakeredis import FakeAsyncRedis
+from loguru import logger
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.archive.segment import ArchivedTransaction
+from app.cache import cache_redis
+from app.config import settings
+from app.models.wallet import Transaction, Wallet
+from app.schemas.transaction import TransactionResponse
+from app.schemas.wallet import OperationRequest, OperationType, WalletResponse
+from app.tests.loadtest import in_process_client, seed_history, seed_wallets
+from app.utils.export import EXPORT_COLUMNS, format_history_json
+from app.utils.wallet import calculate_new_balance
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "bench_hot_path_baseline.json"
+)
+API = "/api/v1/wallets"
+
+
+def summarize(samples: list[float], number: int) -> dict:
+    """Медиана и IQR времени одного вызова по раундам, микросекунды"""
+    per_call = sorted(sample / number * 1_000_000 for sample in samples)
+    q1, median, q3 = statistics.quantiles(per_call, n=4, method="inclusive")
+    return {
+        "median_us": round(median, 3),
+        "iqr_us": round(q3 - q1, 3),
+        "min_us": round(per_call[0], 3),
+        "rounds": len(samples),
+        "number": number,
+    }
+
+
+def measure(func: Callable[[], object], number: int, rounds: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        for _ in range(number):
+            func()
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples, number)
+
+
+async def measure_async(
+    func: Callable[[], Awaitable], number: int, rounds: int, warmup: int
+) -> dict:
+    for _ in range(warmup):
+        for _ in range(number):
+            await func()
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(number):
+            await func()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples, number)
+
+
+def _orm_wallet() -> Wallet:
+    now = datetime.now(timezone.utc)
+    return Wallet(
+        id=uuid.uuid4(), balance=Decimal("1234.50"), created_at=now, updated_at=now
+    )
+
+
+def _orm_transactions(count: int) -> list[Transaction]:
+    wallet_id = uuid.uuid4()
+    now = datetime.now(timezone.utc)
+    return [
+        Transaction(
+            id=uuid.uuid4(),
+            wallet_id=wallet_id,
+            operation_type=OperationType.DEPOSIT,
+            amount=Decimal("10.00"),
+            previous_balance=Decimal(i * 10),
+            new_balance=Decimal(i * 10 + 10),
+            created_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def component_cases(page_size: int) -> dict[str, Callable[[], object]]:
+    """Синхронные случаи: расчет баланса, валидация и сборка схем ответа"""
+    wallet_id = uuid.uuid4()
+    balance, amount = Decimal("1000.00"), Decimal("10.50")
+    request_body = {"operation_type": "DEPOSIT", "amount": 1000.00}
+    request_json = json.dumps(request_body)
+    wallet = _orm_wallet()
+    transactions = _orm_transactions(page_size)
+    history_adapter = TypeAdapter(list[TransactionResponse])
+    history_rows = [
+        ArchivedTransaction(*(getattr(t, column) for column in EXPORT_COLUMNS))
+        for t in transactions
+    ]
+
+    def history_pydantic():
+        # Прежний путь эндпоинта истории: схема на каждую строку, затем
+        # валидация и сериализация ответа в FastAPI
+        page = [TransactionResponse(**row._asdict()) for row in history_rows]
+        return json.dumps(
+            history_adapter.dump_python(
+                history_adapter.validate_python(page, from_attributes=True),
+                mode="json",
+            ),
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode()
+
+    return {
+        "calculate_new_balance.deposit": lambda: calculate_new_balance(
+            wallet_id, balance, OperationType.DEPOSIT, amount
+        ),
+        "calculate_new_balance.withdraw": lambda: calculate_new_balance(
+            wallet_id, balance, OperationType.WITHDRAW, amount
+        ),
+        "OperationRequest.validate_python": lambda: OperationRequest.model_validate(
+            request_body
+        ),
+        "OperationRequest.validate_json": lambda: OperationRequest.model_validate_json(
+            request_json
+        ),
+        "WalletResponse.from_orm": lambda: WalletResponse.model_validate(wallet),
+        f"TransactionResponse.from_orm x{page_size}": (
+            lambda: history_adapter.validate_python(transactions, from_attributes=True)
+        ),
+        f"history page JSON, pydantic x{page_size}": history_pydantic,
+        f"history page JSON, format_history_json x{page_size}": (
+            lambda: format_history_json(history_rows)
+        ),
+    }
+
+
+def decorator_cases() -> dict[str, Callable[[], Awaitable]]:
+    """Накладные расходы декораторов кэша относительно вызова без них"""
+    wallet_id = uuid.uuid4()
+    wallet = WalletResponse.model_validate(_orm_wallet())
+
+    async def endpoint(wallet_id: uuid.UUID):
+        return wallet
+
+    cached_endpoint = cache_redis.cached(ttl=60, response_model=WalletResponse)(
+        endpoint
+    )
+    invalidating_endpoint = cache_redis.invalidate_cache()(endpoint)
+
+    return {
+        "endpoint.undecorated": lambda: endpoint(wallet_id=wallet_id),
+        "cached.hit": lambda: cached_endpoint(wallet_id=wallet_id),
+        "invalidate_cache": lambda: invalidating_endpoint(wallet_id=wallet_id),
+    }
+
+
+async def asgi_cases(
+    client, wallet_id: uuid.UUID, batch_wallets: list[uuid.UUID]
+) -> dict[str, Callable[[], Awaitable]]:
+    """Полный круг запроса через ASGI для каждого эндпоинта кошелька"""
+    at = (datetime.now(timezone.utc) - timedelta(minutes=5)).isoformat()
+    batch = {
+        "mode": "ALL_OR_NOTHING",
+        "operations": [
+            {"wallet_id": str(w), "operation_type": "DEPOSIT", "amount": 1.00}
+            for w in batch_wallets
+        ],
+    }
+
+    async def request(method: str, path: str, **kwargs):
+        response = await client.request(method, path, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path}: {response.status_code}")
+        await response.aread()
+
+    return {
+        "POST /wallets/": lambda: request("POST", f"{API}/"),
+        "GET /wallets/{id}": lambda: request("GET", f"{API}/{wallet_id}"),
+        "GET /wallets/{id}/wallet_transactions": lambda: request(
+            "GET", f"{API}/{wallet_id}/wallet_transactions", params={"limit": 20}
+        ),
+        "GET /wallets/{id}/transactions/export": lambda: request(
+            "GET", f"{API}/{wallet_id}/transactions/export", params={"format": "ndjson"}
+        ),
+        "GET /wallets/{id}/balance": lambda: request(
+            "GET", f"{API}/{wallet_id}/balance", params={"at": at}
+        ),
+        "GET /wallets/{id}/stats": lambda: request("GET", f"{API}/{wallet_id}/stats"),
+        "POST /wallets/{id}/operation": lambda: request(
+            "POST",
+            f"{API}/{wallet_id}/operation",
+            json={"operation_type": "DEPOSIT", "amount": 1.00},
+        ),
+        f"POST /wallets/operations/batch x{len(batch_wallets)}": lambda: request(
+            "POST", f"{API}/operations/batch", json=batch
+        ),
+    }
+
+
+def compare_with_baseline(
+    results: dict, baseline: dict, max_regression: float
+) -> list[str]:
+    """
+    Случаи, медиана которых выросла больше чем на ``max_regression``
+    относительно базовой и больше суммы IQR обоих замеров: разброс
+    коротких случаев на загруженной машине не считается регрессией
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        delta = result["median_us"] - old["median_us"]
+        noise = old["iqr_us"] + result["iqr_us"]
+        if delta > max(old["median_us"] * max_regression, noise):
+            regressions.append(f"{name} {delta / old['median_us']:+.1%}")
+    return regressions
+
+
+def _print_results(title: str, results: dict, baseline: dict) -> None:
+    print(f"\n{title}")
+    print(f"{'case':<48}{'median, us':>12}{'IQR, us':>10}{'baseline':>12}")
+    for name, result in results.items():
+        old = baseline.get(name)
+        change = (
+            f"{result['median_us'] / old['median_us'] - 1:+.1%}"
+            if old and old["median_us"]
+            else "-"
+        )
+        print(
+            f"{name:<48}{result['median_us']:>12.2f}{result['iqr_us']:>10.2f}"
+            f"{change:>12}"
+        )
+
+
+async def main(args) -> int:
+    logger.remove(0)
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+
+    results = {}
+    section = {
+        name: measure(func, args.number, args.rounds, args.warmup)
+        for name, func in component_cases(args.page_size).items()
+    }
+    _print_results("components", section, baseline)
+    results.update(section)
+
+    cache_redis.redis_client = FakeAsyncRedis(decode_responses=True)
+    try:
+        section = {}
+        for name, func in decorator_cases().items():
+            section[name] = await measure_async(
+                func, args.number // 10, args.rounds, args.warmup
+            )
+        _print_results("cache decorators (fakeredis)", section, baseline)
+        results.update(section)
+    finally:
+        cache_redis.redis_client = None
+
+    if not args.skip_asgi:
+        engine = create_async_engine(args.db_url)
+        try:
+            [wallet_id] = await seed_wallets(engine, "bench:hot-path:", 1, 0)
+            await seed_history(engine, wallet_id, args.history_depth)
+            batch_wallets = await seed_wallets(engine, "bench:hot-path:batch:", 10, 0)
+            async with in_process_client(engine, 1) as client:
+                section = {}
+                for name, func in (
+                    await asgi_cases(client, wallet_id, batch_wallets)
+                ).items():
+                    section[name] = await measure_async(
+                        func, args.asgi_number, args.rounds, 1
+                    )
+        finally:
+            await engine.dispose()
+        _print_results("ASGI round trips (no cache)", section, baseline)
+        results.update(section)
+
+    document = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(document, file, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(document, file, indent=2, ensure_ascii=False)
+            file.write("\n")
+        print(f"\nбазовый результат сохранен: {args.baseline}")
+        return 0
+
+    regressions = compare_with_baseline(results, baseline, args.max_regression)
+    if regressions:
+        print("\nрегрессия: " + ", ".join(regressions))
+        return 1
+    return 0
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--warmup", type=int, default=2, help="раундов разогрева")
+    parser.add_argument("--number", type=int, default=2000, help="вызовов в раунде")
+    parser.add_argument(
+        "--asgi-number", type=int, default=20, help="запросов в раунде через ASGI"
+    )
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--history-depth", type=int, default=1000)
+    parser.add_argument("--skip-asgi", action="store_true", help="без БД")
+    parser.add_argument("--db-url", default=settings.TEST_DB_URL)
+    parser.add_argument("--json", help="файл для результата в JSON")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--max-regression", type=float, default=0.20)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,141 @@
+"""
+Бенчмарк горячих запросов репозиториев: ORM и подготовленные запросы asyncpg.
+
+Для каждого значения REPOSITORY_BACKEND замеряется время одного вызова
+методов репозиториев на БД ``--db-url`` (по умолчанию TEST_DB_URL):
+поиск кошелька, изменение баланса с записью транзакции, вставка
+``--batch`` транзакций и страница истории из ``--page-size`` строк.
+Вызовы выполняются как в приложении: чтения - в сессии AUTOCOMMIT, как
+у SessionRouter, изменения - каждое в своей транзакции, которая
+откатывается; после каждого вызова сессия очищается.
+
+    python -m app.tests.bench_repository
+    python -m app.tests.bench_repository --rounds 30 --json repository.json
+"""
+
+import argparse
+import asyncio
+import json
+import uuid
+from decimal import Decimal
+from typing import Awaitable, Callable
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.config import settings
+from app.repository.transaction import TransactionRepository
+from app.repository.wallet import WalletRepository
+from app.tests.bench_hot_path import measure_async
+from app.tests.loadtest import seed_history, seed_wallets
+
+BACKENDS = ("orm", "asyncpg")
+
+
+def repository_cases(
+    session: AsyncSession,
+    read_session: AsyncSession,
+    wallet_id: uuid.UUID,
+    history_wallet_id: uuid.UUID,
+    batch: int,
+    page_size: int,
+) -> dict[str, Callable[[], Awaitable]]:
+    """Вызовы репозиториев; бэкенд выбирается при создании репозитория"""
+    wallets = WalletRepository(session)
+    transactions = TransactionRepository(session)
+    amount = Decimal("1.00")
+
+    async def find_by_id():
+        await WalletRepository(read_session).find_one_or_none_by_id(wallet_id)
+        read_session.expunge_all()
+
+    async def apply_operation():
+        transaction = await session.begin()
+        await wallets.apply_operation(wallet_id, "DEPOSIT", amount, amount)
+        await transaction.rollback()
+        session.expunge_all()
+
+    async def create_many():
+        transaction = await session.begin()
+        await transactions.create_many(
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "wallet_id": wallet_id,
+                    "operation_type": "DEPOSIT",
+                    "amount": amount,
+                    "previous_balance": Decimal(i),
+                    "new_balance": Decimal(i) + amount,
+                }
+                for i in range(batch)
+            ]
+        )
+        await transaction.rollback()
+        session.expunge_all()
+
+    async def history_page():
+        await TransactionRepository(read_session).get_list_transactions(
+            history_wallet_id, skip=0, limit=page_size
+        )
+        read_session.expunge_all()
+
+    return {
+        "find_one_or_none_by_id": find_by_id,
+        "apply_operation": apply_operation,
+        f"create_many x{batch}": create_many,
+        f"history page x{page_size}": history_page,
+    }
+
+
+async def main(args) -> dict:
+    engine = create_async_engine(args.db_url, pool_size=2, max_overflow=0)
+    read_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+    wallet_id, history_wallet_id = await seed_wallets(engine, "bench-repo-", 2, 0)
+    await seed_history(engine, history_wallet_id, args.page_size)
+
+    results: dict[str, dict[str, dict]] = {}
+    for backend in BACKENDS:
+        settings.REPOSITORY_BACKEND = backend
+        async with AsyncSession(
+            engine, expire_on_commit=False
+        ) as session, AsyncSession(read_engine) as read_session:
+            cases = repository_cases(
+                session,
+                read_session,
+                wallet_id,
+                history_wallet_id,
+                args.batch,
+                args.page_size,
+            )
+            for name, func in cases.items():
+                results.setdefault(name, {})[backend] = await measure_async(
+                    func, args.number, args.rounds, args.warmup
+                )
+    await engine.dispose()
+
+    print(f"{'case':<28}{'orm, us':>12}{'asyncpg, us':>14}{'speedup':>10}")
+    for name, by_backend in results.items():
+        orm, fast = by_backend["orm"]["median_us"], by_backend["asyncpg"]["median_us"]
+        print(f"{name:<28}{orm:>12.1f}{fast:>14.1f}{orm / fast:>9.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--db-url", default=settings.TEST_DB_URL)
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--number", type=int, default=50, help="вызовов в раунде")
+    parser.add_argument("--warmup", type=int, default=2, help="раундов разогрева")
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--json", help="файл для результата в JSON")
+    args = parser.parse_args()
+
+    # Вывод loguru в консоль не должен попадать в замеры
+    logger.remove(0)
+    results = asyncio.run(main(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
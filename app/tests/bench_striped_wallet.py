@@ -0,0 +1,120 @@
+"""
+Бенчмарк режима полос баланса: конкурентные операции над одним кошельком.
+
+Запускает конкурентные пополнения (и часть списаний) одного "горячего"
+кошелька в тестовой БД с балансом в одной строке и в режиме полос
+с разным количеством полос. ``--hold-ms`` задерживает фиксацию каждой
+транзакции (как сетевая задержка до приложения или синхронная реплика),
+пока блокировка строки баланса удерживается.
+
+    python -m app.tests.bench_striped_wallet --ops 2000 --concurrency 50 --hold-ms 5
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.exceptions import InsufficientFundsError
+from app.services.wallet import WalletService
+
+
+async def _run(
+    session_factory, stripes: int, ops: int, concurrency: int, share: float, hold: float
+):
+    async with session_factory() as session:
+        wallet = await WalletService(session).create_new_wallet()
+    async with session_factory() as session:
+        await WalletService(session).perform_operation(
+            wallet.id, "DEPOSIT", Decimal(ops)
+        )
+    if stripes:
+        async with session_factory() as session:
+            await WalletService(session).set_stripes(wallet.id, stripes)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    expected = Decimal(ops)
+
+    async def one_operation(operation_type: str):
+        nonlocal expected
+        async with semaphore:
+            started = time.perf_counter()
+            async with session_factory() as session:
+                try:
+                    async with session.begin():
+                        await WalletService(session)._apply_operation(
+                            wallet.id, operation_type, Decimal("1.00")
+                        )
+                        if hold:
+                            await session.execute(select(func.pg_sleep(hold)))
+                except InsufficientFundsError:
+                    return
+            latencies.append(time.perf_counter() - started)
+            expected += 1 if operation_type == "DEPOSIT" else -1
+
+    operations = [
+        "WITHDRAW" if random.random() < share else "DEPOSIT" for _ in range(ops)
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*[one_operation(o) for o in operations])
+    elapsed = time.perf_counter() - started
+
+    async with session_factory() as session:
+        balance = (await WalletService(session).get_wallet_by_id(wallet.id)).balance
+    assert balance == expected, f"Итоговый баланс {balance}, ожидался {expected}"
+
+    latencies.sort()
+    return {
+        "ops_per_sec": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main(
+    ops: int, concurrency: int, stripes: list[int], share: float, hold_ms: float
+):
+    engine = create_async_engine(
+        settings.TEST_DB_URL, pool_size=concurrency, max_overflow=0
+    )
+    session_factory = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    print(f"{'mode':<16}{'ops/s':>10}{'p50, ms':>10}{'p99, ms':>10}")
+    for count in [0] + stripes:
+        name = f"striped x{count}" if count else "single row"
+        result = await _run(
+            session_factory, count, ops, concurrency, share, hold_ms / 1000
+        )
+        print(
+            f"{name:<16}{result['ops_per_sec']:>10.0f}"
+            f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--stripes", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument(
+        "--withdraw-share", type=float, default=0.1, help="доля списаний"
+    )
+    parser.add_argument(
+        "--hold-ms", type=float, default=5, help="задержка перед фиксацией, мс"
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.ops, args.concurrency, args.stripes, args.withdraw_share, args.hold_ms
+        )
+    )
@@ -5,7 +5,13 @@ from typing import AsyncGenerator
 from sqlalchemy import NullPool
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
-from app.database import Base, get_async_db_session
+from app.database import (
+    Base,
+    SessionRouter,
+    get_async_db_session,
+    get_session_factory,
+    get_session_router,
+)
 from app.main import app
 from app.config import settings
 
@@ -20,6 +26,9 @@ TestingSessionLocal = async_sessionmaker(
     test_engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Маршрутизатор сессий чтения без реплики: все чтения идут в тестовую БД
+test_session_router = SessionRouter(test_engine)
+
 
 async def override_get_db() -> AsyncSession:
     """Переопределенная зависимость для тестовой БД"""
@@ -27,7 +36,19 @@ async def override_get_db() -> AsyncSession:
         yield session
 
 
+def override_get_session_factory() -> async_sessionmaker:
+    """Переопределенная зависимость фабрики сессий для тестовой БД"""
+    return TestingSessionLocal
+
+
+def override_get_session_router() -> SessionRouter:
+    """Переопределенная зависимость маршрутизатора сессий чтения"""
+    return test_session_router
+
+
 app.dependency_overrides[get_async_db_session] = override_get_db
+app.dependency_overrides[get_session_factory] = override_get_session_factory
+app.dependency_overrides[get_session_router] = override_get_session_router
 
 
 @pytest.fixture(scope="session")
@@ -52,3 +73,16 @@ async def db_session() -> AsyncGenerator[AsyncSession, None]:
     """Фикстура для тестовой сессии БД"""
     async with TestingSessionLocal() as session:
         yield session
+
+
+@pytest.fixture
+def fake_redis():
+    """Фикстура локальной замены Redis для тестов кэша"""
+    from fakeredis import FakeAsyncRedis
+
+    from app.cache import cache_redis
+
+    client = FakeAsyncRedis(decode_responses=True)
+    cache_redis.redis_client = client
+    yield client
+    cache_redis.redis_client = None
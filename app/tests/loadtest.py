@@ -0,0 +1,535 @@
+"""
+Нагрузочное тестирование API кошельков.
+
+Пул асинхронных клиентов выполняет запросы сценария в течение заданного
+времени (или заданное количество запросов) внутри процесса через ASGI
+или по адресу работающего приложения (``--url``). Кошельки сценария
+создаются в БД ``--db-url`` с детерминированными id, при каждом запуске
+их баланс сбрасывается, поэтому повторные запуски сравнимы. Запускайте
+на отдельной БД: баланс сбрасывается без записи транзакций.
+
+    python -m app.tests.loadtest hot-wallet --duration 10 --concurrency 50
+    python -m app.tests.loadtest uniform --url http://localhost:8000 --json uniform.json
+    python -m app.tests.loadtest read-heavy --fake-redis --baseline read-heavy.json
+
+Сценарии: hot-wallet, uniform, read-heavy, mixed, history. Результат -
+пропускная способность, p50/p95/p99/max задержки и разбивка ошибок;
+``--json`` сохраняет его, ``--baseline`` сравнивает с сохраненным
+и завершается с кодом 1 при регрессии больше ``--max-regression``.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from app.cache import cache_redis
+from app.config import settings
+
+API = "/api/v1/wallets"
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    json: Optional[dict] = None
+    params: Optional[dict] = None
+    # Куда сохранить курсор следующей страницы из ответа (история)
+    cursor_slot: Optional[str] = None
+
+
+@dataclass
+class LoadConfig:
+    scenario: str
+    duration: float = 10.0
+    requests: Optional[int] = None
+    concurrency: int = 50
+    warmup: float = 1.0
+    seed: int = 1
+    wallets: Optional[int] = None
+    depth: int = 20000
+
+
+def wallet_ids(prefix: str, count: int) -> list[uuid.UUID]:
+    """Те же id, что создает ``md5(prefix || i)::uuid`` в БД"""
+    return [
+        uuid.UUID(hashlib.md5(f"{prefix}{i}".encode()).hexdigest())
+        for i in range(count)
+    ]
+
+
+async def seed_wallets(
+    engine: AsyncEngine, prefix: str, count: int, balance: float
+) -> list[uuid.UUID]:
+    """Создание кошельков сценария или сброс их баланса одним запросом"""
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO wallets (id, balance) "
+                "SELECT md5(:prefix || i)::uuid, :balance "
+                "FROM generate_series(0, :count - 1) AS i "
+                "ON CONFLICT (id) DO UPDATE "
+                "SET balance = excluded.balance, updated_at = now()"
+            ),
+            {"prefix": prefix, "count": count, "balance": balance},
+        )
+    ids = wallet_ids(prefix, count)
+    # Сброшенный баланс не должен читаться из кэша
+    await cache_redis.invalidate_wallet_cache(*ids)
+    return ids
+
+
+async def seed_history(engine: AsyncEngine, wallet_id: uuid.UUID, depth: int) -> None:
+    """История из ``depth`` пополнений по 1.00, если ее еще нет"""
+    async with engine.begin() as conn:
+        existing = await conn.scalar(
+            text("SELECT count(*) FROM transactions WHERE wallet_id = :wallet_id"),
+            {"wallet_id": wallet_id},
+        )
+        if existing == depth:
+            return
+        await conn.execute(
+            text("DELETE FROM transactions WHERE wallet_id = :wallet_id"),
+            {"wallet_id": wallet_id},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO transactions (id, wallet_id, operation_type, amount, "
+                "previous_balance, new_balance, created_at) "
+                "SELECT gen_random_uuid(), :wallet_id, 'DEPOSIT', 1, i - 1, i, "
+                "now() - (:depth - i) * interval '1 second' "
+                "FROM generate_series(1, :depth) AS i"
+            ),
+            {"wallet_id": wallet_id, "depth": depth},
+        )
+        await conn.execute(
+            text("UPDATE wallets SET balance = :depth WHERE id = :wallet_id"),
+            {"wallet_id": wallet_id, "depth": depth},
+        )
+
+
+class Scenario:
+    """Сценарий нагрузки: подготовка данных и выбор следующего запроса"""
+
+    name = ""
+    description = ""
+    default_wallets = 1
+
+    def __init__(self, config: LoadConfig):
+        self.config = config
+        self.wallets: list[uuid.UUID] = []
+
+    @property
+    def wallet_count(self) -> int:
+        return self.config.wallets or self.default_wallets
+
+    async def setup(self, engine: AsyncEngine) -> None:
+        self.wallets = await seed_wallets(
+            engine, f"loadtest:{self.name}:", self.wallet_count, 1_000_000
+        )
+
+    def next_request(self, rng: random.Random, state: dict) -> Request:
+        raise NotImplementedError
+
+    @staticmethod
+    def operation(wallet_id: uuid.UUID, operation_type: str, amount: float):
+        return Request(
+            "POST",
+            f"{API}/{wallet_id}/operation",
+            json={"operation_type": operation_type, "amount": amount},
+        )
+
+
+class HotWalletScenario(Scenario):
+    name = "hot-wallet"
+    description = "конкурентные операции над одним кошельком"
+
+    def next_request(self, rng, state):
+        operation_type = "WITHDRAW" if rng.random() < 0.1 else "DEPOSIT"
+        return self.operation(self.wallets[0], operation_type, 1.00)
+
+
+class UniformScenario(Scenario):
+    name = "uniform"
+    description = "равномерные чтения и операции по многим кошелькам"
+    default_wallets = 100_000
+
+    async def setup(self, engine):
+        self.wallets = await seed_wallets(
+            engine, f"loadtest:{self.name}:", self.wallet_count, 1000
+        )
+
+    def next_request(self, rng, state):
+        wallet_id = rng.choice(self.wallets)
+        dice = rng.random()
+        if dice < 0.5:
+            return Request("GET", f"{API}/{wallet_id}")
+        operation_type = "DEPOSIT" if dice < 0.85 else "WITHDRAW"
+        return self.operation(wallet_id, operation_type, rng.randint(1, 10))
+
+
+class ReadHeavyScenario(Scenario):
+    name = "read-heavy"
+    description = "чтения баланса и истории с кэшем, популярные кошельки чаще"
+    default_wallets = 1000
+
+    def next_request(self, rng, state):
+        # Распределение Парето: небольшая доля кошельков получает большую часть чтений
+        wallet_id = self.wallets[int(rng.paretovariate(1.2)) % len(self.wallets)]
+        dice = rng.random()
+        if dice < 0.80:
+            return Request("GET", f"{API}/{wallet_id}")
+        if dice < 0.95:
+            return Request(
+                "GET", f"{API}/{wallet_id}/wallet_transactions", params={"limit": 20}
+            )
+        return self.operation(wallet_id, "DEPOSIT", 1.00)
+
+
+class MixedScenario(Scenario):
+    name = "mixed"
+    description = (
+        "пополнения и списания, часть списаний отклоняется из-за нехватки средств"
+    )
+    default_wallets = 200
+
+    async def setup(self, engine):
+        self.wallets = await seed_wallets(
+            engine, f"loadtest:{self.name}:", self.wallet_count, 50
+        )
+
+    def next_request(self, rng, state):
+        operation_type = "DEPOSIT" if rng.random() < 0.5 else "WITHDRAW"
+        return self.operation(
+            rng.choice(self.wallets), operation_type, rng.randint(1, 100)
+        )
+
+
+class HistoryScenario(Scenario):
+    name = "history"
+    description = "листание истории глубоких кошельков по курсору"
+    default_wallets = 1
+
+    # Сколько страниц пролистать, прежде чем начать с первой
+    pages = 50
+
+    async def setup(self, engine):
+        self.wallets = wallet_ids(f"loadtest:{self.name}:", self.wallet_count)
+        await seed_wallets(engine, f"loadtest:{self.name}:", self.wallet_count, 0)
+        for wallet_id in self.wallets:
+            await seed_history(engine, wallet_id, self.config.depth)
+
+    def next_request(self, rng, state):
+        if state.get("page", 0) >= self.pages or (
+            state.get("page") and not state.get("cursor")
+        ):
+            state.clear()
+        if not state:
+            state["wallet_id"] = rng.choice(self.wallets)
+            state["page"] = 0
+        state["page"] += 1
+        params = {"limit": 100}
+        if state.get("cursor"):
+            params["cursor"] = state["cursor"]
+        return Request(
+            "GET",
+            f"{API}/{state['wallet_id']}/wallet_transactions",
+            params=params,
+            cursor_slot="cursor",
+        )
+
+
+SCENARIOS: dict[str, type[Scenario]] = {
+    scenario.name: scenario
+    for scenario in (
+        HotWalletScenario,
+        UniformScenario,
+        ReadHeavyScenario,
+        MixedScenario,
+        HistoryScenario,
+    )
+}
+
+
+def percentile(sorted_values: list[float], share: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(share * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def classify(response: httpx.Response) -> str:
+    """Категория ответа для разбивки ошибок"""
+    if response.status_code == 400 and "Недостаточно средств" in response.text:
+        return "400 insufficient_funds"
+    return str(response.status_code)
+
+
+@dataclass
+class _Samples:
+    latencies: list[float] = field(default_factory=list)
+    outcomes: dict[str, int] = field(default_factory=dict)
+
+    def add(self, latency: float, outcome: str) -> None:
+        self.latencies.append(latency)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+
+async def run_load(client: httpx.AsyncClient, scenario: Scenario) -> dict:
+    """Выполнение сценария пулом из ``concurrency`` клиентов"""
+    config = scenario.config
+    samples = _Samples()
+    remaining = [config.requests] if config.requests else None
+    started = time.perf_counter()
+    measure_from = started + (0 if config.requests else config.warmup)
+    deadline = measure_from + config.duration
+
+    async def worker(index: int) -> None:
+        rng = random.Random(config.seed * 1_000_003 + index)
+        state: dict = {}
+        while True:
+            if remaining is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            elif time.perf_counter() >= deadline:
+                return
+            request = scenario.next_request(rng, state)
+            sent = time.perf_counter()
+            try:
+                response = await client.request(
+                    request.method,
+                    request.path,
+                    json=request.json,
+                    params=request.params,
+                )
+                outcome = classify(response)
+                if request.cursor_slot:
+                    state[request.cursor_slot] = response.headers.get("X-Next-Cursor")
+            except httpx.HTTPError as e:
+                outcome = type(e).__name__
+            if sent >= measure_from:
+                samples.add(time.perf_counter() - sent, outcome)
+
+    await asyncio.gather(*[worker(index) for index in range(config.concurrency)])
+    elapsed = time.perf_counter() - max(started, measure_from)
+
+    latencies = sorted(samples.latencies)
+    ok = sum(count for name, count in samples.outcomes.items() if name[0] == "2")
+    return {
+        "scenario": scenario.name,
+        "config": {
+            "concurrency": config.concurrency,
+            "duration": config.duration,
+            "requests": config.requests,
+            "seed": config.seed,
+            "wallets": scenario.wallet_count,
+        },
+        "requests": len(latencies),
+        "ok": ok,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": (
+                round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0
+            ),
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "errors": {
+            name: count
+            for name, count in sorted(samples.outcomes.items())
+            if name[0] != "2"
+        },
+    }
+
+
+def compare_with_baseline(
+    result: dict, baseline: dict, max_regression: float
+) -> tuple[list[str], list[str]]:
+    """
+    Сравнение с сохраненным результатом: строки отчета и список регрессий
+    (падение пропускной способности или рост p50/p95/p99 больше порога)
+    """
+    lines, regressions = [], []
+
+    def change(new: float, old: float) -> float:
+        return (new - old) / old if old else 0.0
+
+    throughput = change(result["throughput_rps"], baseline["throughput_rps"])
+    lines.append(
+        f"throughput: {baseline['throughput_rps']} -> {result['throughput_rps']} "
+        f"rps ({throughput:+.1%})"
+    )
+    if throughput < -max_regression:
+        regressions.append(f"throughput {throughput:+.1%}")
+    for name in ("p50", "p95", "p99", "max"):
+        old, new = baseline["latency_ms"][name], result["latency_ms"][name]
+        delta = change(new, old)
+        lines.append(f"{name}: {old} -> {new} ms ({delta:+.1%})")
+        if name != "max" and delta > max_regression:
+            regressions.append(f"{name} {delta:+.1%}")
+    return lines, regressions
+
+
+def format_report(result: dict) -> str:
+    latency = result["latency_ms"]
+    lines = [
+        f"scenario: {result['scenario']} "
+        f"(concurrency {result['config']['concurrency']}, "
+        f"wallets {result['config']['wallets']})",
+        f"requests: {result['requests']} ({result['ok']} ok) "
+        f"in {result['elapsed_s']} s, {result['throughput_rps']} rps",
+        f"latency, ms: mean {latency['mean']}  p50 {latency['p50']}  "
+        f"p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}",
+    ]
+    if result["errors"]:
+        lines.append(
+            "errors: "
+            + ", ".join(f"{name}: {count}" for name, count in result["errors"].items())
+        )
+    return "\n".join(lines)
+
+
+@asynccontextmanager
+async def in_process_client(
+    engine: AsyncEngine, concurrency: int
+) -> AsyncIterator[httpx.AsyncClient]:
+    """Клиент, вызывающий приложение внутри процесса с сессиями на ``engine``"""
+    from app.database import (
+        SessionRouter,
+        get_async_db_session,
+        get_session_factory,
+        get_session_router,
+    )
+    from app.main import app
+
+    session_factory = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    router = SessionRouter(engine)
+
+    async def get_session():
+        async with session_factory() as session:
+            yield session
+
+    overrides = dict(app.dependency_overrides)
+    app.dependency_overrides[get_async_db_session] = get_session
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    app.dependency_overrides[get_session_router] = lambda: router
+    try:
+        async with httpx.AsyncClient(
+            app=app, base_url="http://loadtest", timeout=60
+        ) as client:
+            yield client
+    finally:
+        app.dependency_overrides = overrides
+
+
+async def main(args) -> int:
+    config = LoadConfig(
+        scenario=args.scenario,
+        duration=args.duration,
+        requests=args.requests,
+        concurrency=args.concurrency,
+        warmup=args.warmup,
+        seed=args.seed,
+        wallets=args.wallets,
+        depth=args.depth,
+    )
+    scenario = SCENARIOS[config.scenario](config)
+    engine = create_async_engine(
+        args.db_url, pool_size=config.concurrency, max_overflow=0
+    )
+
+    if args.fake_redis:
+        from fakeredis import FakeAsyncRedis
+
+        cache_redis.redis_client = FakeAsyncRedis(decode_responses=True)
+    else:
+        await cache_redis.init_redis()
+
+    try:
+        await scenario.setup(engine)
+        if args.url:
+            limits = httpx.Limits(max_connections=config.concurrency)
+            client_context = httpx.AsyncClient(
+                base_url=args.url, limits=limits, timeout=60
+            )
+        else:
+            client_context = in_process_client(engine, config.concurrency)
+        async with client_context as client:
+            result = await run_load(client, scenario)
+    finally:
+        await cache_redis.close_redis()
+        await engine.dispose()
+
+    print(format_report(result))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(result, file, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        lines, regressions = compare_with_baseline(
+            result, baseline, args.max_regression
+        )
+        print("\n".join(["baseline:"] + lines))
+        if regressions:
+            print("регрессия: " + ", ".join(regressions))
+            return 1
+    return 0
+
+
+def parse_args(argv: Optional[list[str]] = None) -> Any:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument(
+        "--url", help="адрес приложения, по умолчанию - внутри процесса"
+    )
+    parser.add_argument(
+        "--db-url", default=settings.TEST_DB_URL, help="БД для подготовки данных"
+    )
+    parser.add_argument("--duration", type=float, default=10, help="секунды")
+    parser.add_argument("--requests", type=int, help="вместо --duration")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=float, default=1, help="секунды")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--wallets", type=int, help="количество кошельков сценария")
+    parser.add_argument(
+        "--depth", type=int, default=20000, help="операций в истории (history)"
+    )
+    parser.add_argument(
+        "--fake-redis", action="store_true", help="кэш в памяти вместо Redis"
+    )
+    parser.add_argument("--json", help="файл для результата в JSON")
+    parser.add_argument("--baseline", help="JSON результата для сравнения")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,259 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, text
+
+from app.archive import segment
+from app.archive.segment import (
+    ArchivedTransaction,
+    SegmentReader,
+    SegmentWriter,
+    segment_cache,
+    to_micros,
+)
+from app.config import settings
+from app.main import app
+from app.models.wallet import ArchiveSegment, Transaction
+from app.repository.archive import ArchiveRepository
+from app.repository.partition import TransactionPartitionRepository
+from app.services.archive import ArchiveService
+from app.tests.conftest import TestingSessionLocal
+from app.utils.partition import partition_name
+
+JANUARY = datetime(1999, 1, 1, tzinfo=timezone.utc)
+FEBRUARY = datetime(1999, 2, 1, tzinfo=timezone.utc)
+MARCH = datetime(1999, 3, 1, tzinfo=timezone.utc)
+
+
+def _rows(wallet_id: uuid.UUID, count: int, start: datetime):
+    """Строки кошелька от новых к старым, как их пишет архиватор"""
+    return [
+        ArchivedTransaction(
+            uuid.uuid4(),
+            wallet_id,
+            "DEPOSIT" if i % 2 else "WITHDRAW",
+            Decimal("1.25"),
+            Decimal(i),
+            Decimal(i + 1),
+            start + timedelta(hours=i),
+        )
+        for i in reversed(range(count))
+    ]
+
+
+async def _history(client: AsyncClient, wallet_id: str, **params) -> list:
+    response = await client.get(
+        f"/api/v1/wallets/{wallet_id}/wallet_transactions", params=params
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+async def _pages(client: AsyncClient, wallet_id: str, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get(
+            f"/api/v1/wallets/{wallet_id}/wallet_transactions", params=params
+        )
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+async def _drop_test_partitions():
+    """Удаление партиций и сегментов 1999 года, созданных тестом"""
+    async with TestingSessionLocal() as session:
+        async with session.begin():
+            for month in (JANUARY, FEBRUARY):
+                await session.execute(
+                    text(f"DROP TABLE IF EXISTS {partition_name(month)}")
+                )
+            await session.execute(
+                delete(ArchiveSegment).where(ArchiveSegment.range_start < MARCH)
+            )
+
+
+class TestSegment:
+    """Тесты формата сегмента архива"""
+
+    def test_roundtrip_reads_only_needed_blocks(self, tmp_path, monkeypatch):
+        """Тест записи сегмента и чтения только нужных блоков кошелька"""
+        wallets = sorted([uuid.uuid4() for _ in range(3)], key=lambda w: w.bytes)
+        rows = {wallet: _rows(wallet, 10, JANUARY) for wallet in wallets}
+        path = str(tmp_path / "segment.seg")
+        writer = SegmentWriter(path, block_rows=4)
+        for wallet in wallets:
+            for row in rows[wallet]:
+                writer.add(row)
+        writer.close()
+
+        decompressed = []
+        original = segment.zlib.decompress
+
+        def counting_decompress(data):
+            decompressed.append(len(data))
+            return original(data)
+
+        monkeypatch.setattr(segment.zlib, "decompress", counting_decompress)
+        reader = SegmentReader(path)
+        try:
+            assert list(reader.scan(wallets[1])) == rows[wallets[1]]
+            assert len(decompressed) == 3
+
+            decompressed.clear()
+            newest = to_micros(JANUARY + timedelta(hours=1))
+            assert list(reader.scan(wallets[2], newest=newest))[-2:] == (
+                rows[wallets[2]][-2:]
+            )
+            # Из трех блоков кошелька нужен только самый старый
+            assert len(decompressed) == 1
+
+            assert list(reader.scan(uuid.uuid4())) == []
+        finally:
+            reader.close()
+
+
+@pytest.mark.asyncio
+class TestArchiveReadThrough:
+    """Тесты чтения истории через архив"""
+
+    async def test_read_blocks_lazily(self, db_session, tmp_path, monkeypatch):
+        """Тест чтения архива по одному блоку от старых транзакций к новым"""
+        monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+        wallet_id = uuid.uuid4()
+        rows = _rows(wallet_id, 10, JANUARY)
+        # Операция над одной полосой кошелька без баланса
+        rows[3] = rows[3]._replace(previous_balance=None, new_balance=None)
+        repo = ArchiveRepository(db_session)
+        writer = SegmentWriter(repo.segment_path("lazy"), block_rows=4)
+        for row in rows:
+            writer.add(row)
+        writer.close()
+
+        decompressed = []
+        original = segment.zlib.decompress
+
+        def counting_decompress(data):
+            decompressed.append(len(data))
+            return original(data)
+
+        monkeypatch.setattr(segment.zlib, "decompress", counting_decompress)
+        segments = [ArchiveSegment(name="lazy", range_start=JANUARY, range_end=MARCH)]
+        try:
+            blocks = repo.read_blocks(wallet_id, segments, oldest_first=True)
+            first = await blocks.__anext__()
+            assert len(decompressed) == 1
+            remaining = [block async for block in blocks]
+            assert [len(block) for block in [first] + remaining] == [2, 4, 4]
+            assert sum([first] + remaining, []) == rows[::-1]
+        finally:
+            segment_cache.clear()
+
+    async def test_history_reads_through_archive(
+        self, db_session, tmp_path, monkeypatch
+    ):
+        """Тест, что история, выгрузка и баланс не меняются после переноса в архив"""
+        monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+        monkeypatch.setattr(settings, "ARCHIVE_BLOCK_ROWS", 3)
+        # Выгрузка архива пачками меньше блока
+        monkeypatch.setattr(settings, "EXPORT_CHUNK_SIZE", 2)
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = (await client.post("/api/v1/wallets/")).json()["id"]
+            await _drop_test_partitions()
+            async with TestingSessionLocal() as session:
+                repo = TransactionPartitionRepository(session)
+                async with session.begin():
+                    for month in (JANUARY, FEBRUARY):
+                        await repo.create_partition(month)
+                async with session.begin():
+                    balance = Decimal(0)
+                    for created_at in [
+                        JANUARY + timedelta(days=i) for i in range(5)
+                    ] + [FEBRUARY + timedelta(days=i) for i in range(4)]:
+                        session.add(
+                            Transaction(
+                                wallet_id=uuid.UUID(wallet_id),
+                                operation_type="DEPOSIT",
+                                amount=Decimal(10),
+                                previous_balance=balance,
+                                new_balance=balance + 10,
+                                created_at=created_at,
+                            )
+                        )
+                        balance += 10
+            await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 5},
+            )
+            balance_times = [
+                JANUARY + timedelta(days=2, hours=1),
+                FEBRUARY + timedelta(days=1),
+                datetime(2000, 1, 1, tzinfo=timezone.utc),
+                # Время без часового пояса - UTC
+                datetime(1999, 2, 2, 12),
+            ]
+
+            async def snapshot_state():
+                export = await client.get(
+                    f"/api/v1/wallets/{wallet_id}/transactions/export",
+                    params={"date_from": (JANUARY + timedelta(days=3)).isoformat()},
+                )
+                export_naive = await client.get(
+                    f"/api/v1/wallets/{wallet_id}/transactions/export",
+                    params={
+                        "date_from": "1999-01-04T00:00:00",
+                        "date_to": "1999-02-03T00:00:00",
+                    },
+                )
+                balances = [
+                    (
+                        await client.get(
+                            f"/api/v1/wallets/{wallet_id}/balance",
+                            params={"at": at.isoformat()},
+                        )
+                    ).json()["balance"]
+                    for at in balance_times
+                ]
+                return {
+                    "all": await _history(client, wallet_id),
+                    "offset": await _history(client, wallet_id, skip=4, limit=3),
+                    "pages": await _pages(client, wallet_id, limit=4),
+                    "export": export.text,
+                    "export_naive": export_naive.text,
+                    "balances": balances,
+                }
+
+            before = await snapshot_state()
+            assert len(before["all"]) == 10
+            assert [float(b) for b in before["balances"]] == [30.0, 70.0, 90.0, 70.0]
+            assert len(before["export_naive"].splitlines()) == 4
+
+            try:
+                async with TestingSessionLocal() as session:
+                    service = ArchiveService(session)
+                    assert await service.archive_month(JANUARY) == 5
+                    assert await service.archive_month(FEBRUARY) == 4
+
+                assert sorted(p.name for p in tmp_path.iterdir()) == [
+                    "transactions_y1999m01.seg",
+                    "transactions_y1999m02.seg",
+                ]
+                assert await snapshot_state() == before
+            finally:
+                segment_cache.clear()
+                async with TestingSessionLocal() as session:
+                    async with session.begin():
+                        await session.execute(
+                            delete(ArchiveSegment).where(
+                                ArchiveSegment.range_start
+                                < datetime(2000, 1, 1, tzinfo=timezone.utc)
+                            )
+                        )
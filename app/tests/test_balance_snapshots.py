@@ -0,0 +1,202 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.database import advisory_lock
+from app.main import app
+from app.models.wallet import BalanceSnapshot
+from app.repository.transaction import TransactionRepository
+from app.services.snapshot import CHECKPOINT_LOCK, BalanceSnapshotService
+from app.tests.conftest import TestingSessionLocal, test_engine
+
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+async def _add_history(wallet_id, items):
+    """Запись истории кошелька: items - (created_at, operation_type, amount)"""
+    rows = []
+    balance = Decimal(0)
+    for created_at, operation_type, amount in items:
+        delta = amount if operation_type == "DEPOSIT" else -amount
+        rows.append(
+            {
+                "id": uuid.uuid4(),
+                "wallet_id": wallet_id,
+                "operation_type": operation_type,
+                "amount": amount,
+                "previous_balance": balance,
+                "new_balance": balance + delta,
+                "created_at": created_at,
+            }
+        )
+        balance += delta
+    async with TestingSessionLocal() as session:
+        async with session.begin():
+            await TransactionRepository(session).create_many(rows)
+
+
+async def _checkpoint(every=10, interval=timedelta(days=365)):
+    async with TestingSessionLocal() as session:
+        return await BalanceSnapshotService(session).checkpoint(
+            every=every, interval=interval, lag=timedelta(0)
+        )
+
+
+async def _snapshots(wallet_id):
+    async with TestingSessionLocal() as session:
+        result = await session.execute(
+            select(BalanceSnapshot.taken_at, BalanceSnapshot.balance)
+            .where(BalanceSnapshot.wallet_id == wallet_id)
+            .order_by(BalanceSnapshot.taken_at)
+        )
+        return [tuple(row) for row in result.all()]
+
+
+async def _balance_at(client, wallet_id, at: datetime) -> Decimal:
+    response = await client.get(
+        f"/api/v1/wallets/{wallet_id}/balance", params={"at": at.isoformat()}
+    )
+    assert response.status_code == 200
+    return Decimal(response.json()["balance"])
+
+
+@pytest.mark.asyncio
+class TestBalanceSnapshots:
+    """Тесты баланса на момент времени и снимков баланса"""
+
+    async def test_balance_at_with_snapshots(self, db_session):
+        """Тест баланса на момент времени до и после создания снимков"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = uuid.UUID((await client.post("/api/v1/wallets/")).json()["id"])
+            items = [
+                (START + timedelta(minutes=i), "DEPOSIT", Decimal(10))
+                for i in range(25)
+            ]
+            items[7] = (items[7][0], "WITHDRAW", Decimal(5))
+            await _add_history(wallet_id, items)
+
+            expected = {}
+            balance = Decimal(0)
+            for created_at, operation_type, amount in items:
+                balance += amount if operation_type == "DEPOSIT" else -amount
+                expected[created_at + timedelta(seconds=30)] = balance
+            expected[START - timedelta(days=1)] = Decimal(0)
+
+            for at, balance in expected.items():
+                assert await _balance_at(client, wallet_id, at) == balance
+
+            await _checkpoint()
+            snapshots = await _snapshots(wallet_id)
+            assert [taken_at for taken_at, _ in snapshots] == [
+                items[9][0],
+                items[19][0],
+            ]
+
+            for at, balance in expected.items():
+                assert await _balance_at(client, wallet_id, at) == balance
+
+    async def test_checkpoint_is_incremental(self, db_session):
+        """Тест продолжения снимков с последней контрольной точки"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = uuid.UUID((await client.post("/api/v1/wallets/")).json()["id"])
+            await _add_history(
+                wallet_id,
+                [
+                    (START + timedelta(minutes=i), "DEPOSIT", Decimal(1))
+                    for i in range(15)
+                ],
+            )
+            await _checkpoint()
+            assert await _snapshots(wallet_id) == [
+                (START + timedelta(minutes=9), Decimal(10))
+            ]
+
+            await _add_history(
+                wallet_id,
+                [
+                    (START + timedelta(minutes=i), "DEPOSIT", Decimal(1))
+                    for i in range(15, 30)
+                ],
+            )
+            await _checkpoint()
+            await _checkpoint()
+            assert await _snapshots(wallet_id) == [
+                (START + timedelta(minutes=9), Decimal(10)),
+                (START + timedelta(minutes=19), Decimal(20)),
+                (START + timedelta(minutes=29), Decimal(30)),
+            ]
+
+    async def test_checkpoint_by_interval(self, db_session):
+        """Тест снимков по интервалу времени и по группе одновременных транзакций"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = uuid.UUID((await client.post("/api/v1/wallets/")).json()["id"])
+            same_moment = START + timedelta(hours=1)
+            await _add_history(
+                wallet_id,
+                [
+                    (START, "DEPOSIT", Decimal(100)),
+                    (same_moment, "WITHDRAW", Decimal(10)),
+                    (same_moment, "WITHDRAW", Decimal(20)),
+                    (same_moment, "WITHDRAW", Decimal(30)),
+                    (START + timedelta(hours=4), "DEPOSIT", Decimal(5)),
+                ],
+            )
+            await _checkpoint(every=2, interval=timedelta(hours=3))
+
+            # Группа транзакций одного момента не разделяется снимком
+            assert await _snapshots(wallet_id) == [
+                (same_moment, Decimal(40)),
+                (START + timedelta(hours=4), Decimal(45)),
+            ]
+            assert await _balance_at(client, wallet_id, same_moment) == Decimal(40)
+
+    async def test_checkpoint_lock(self, db_session):
+        """Тест: создание снимков выполняет только процесс, взявший блокировку"""
+        async with advisory_lock(test_engine, CHECKPOINT_LOCK) as acquired:
+            assert acquired is True
+            async with advisory_lock(test_engine, CHECKPOINT_LOCK) as other:
+                assert other is False
+        async with advisory_lock(test_engine, CHECKPOINT_LOCK) as acquired:
+            assert acquired is True
+
+    async def test_balance_at_naive_time(self, db_session):
+        """Тест баланса на момент времени без часового пояса (UTC)"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = uuid.UUID((await client.post("/api/v1/wallets/")).json()["id"])
+            await _add_history(
+                wallet_id,
+                [
+                    (START, "DEPOSIT", Decimal(10)),
+                    (START + timedelta(hours=2), "DEPOSIT", Decimal(5)),
+                ],
+            )
+
+            response = await client.get(
+                f"/api/v1/wallets/{wallet_id}/balance",
+                params={"at": "2020-01-01T01:00:00"},
+            )
+            assert response.status_code == 200
+            assert Decimal(response.json()["balance"]) == Decimal(10)
+            assert response.json()["at"] == "2020-01-01T01:00:00Z"
+
+    async def test_balance_at_nonexistent_wallet(self, db_session):
+        """Тест баланса на момент времени НЕ существующего кошелька"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.get(f"/api/v1/wallets/{uuid.uuid4()}/balance")
+            assert response.status_code == 404
+
+    async def test_balance_without_at(self, db_session):
+        """Тест текущего баланса без параметра at"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = (await client.post("/api/v1/wallets/")).json()["id"]
+            await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 70.00},
+            )
+            response = await client.get(f"/api/v1/wallets/{wallet_id}/balance")
+            assert response.status_code == 200
+            assert float(response.json()["balance"]) == 70.00
@@ -0,0 +1,123 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+
+from app.main import app
+
+
+async def _create_wallet(client: AsyncClient, balance: float = 0) -> str:
+    response = await client.post("/api/v1/wallets/")
+    wallet_id = response.json()["id"]
+    if balance:
+        await client.post(
+            f"/api/v1/wallets/{wallet_id}/operation",
+            json={"operation_type": "DEPOSIT", "amount": balance},
+        )
+    return wallet_id
+
+
+@pytest.mark.asyncio
+class TestBatchOperationsAPI:
+    """Тесты пакетных операций над кошельками"""
+
+    async def test_batch_best_effort(self, db_session):
+        """Тест пакета, в котором применяются только успешные операции"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            first = await _create_wallet(client, 100.00)
+            second = await _create_wallet(client)
+
+            response = await client.post(
+                "/api/v1/wallets/operations/batch",
+                json={
+                    "mode": "BEST_EFFORT",
+                    "operations": [
+                        {
+                            "wallet_id": second,
+                            "operation_type": "DEPOSIT",
+                            "amount": 50,
+                        },
+                        {
+                            "wallet_id": first,
+                            "operation_type": "WITHDRAW",
+                            "amount": 70,
+                        },
+                        {
+                            "wallet_id": first,
+                            "operation_type": "WITHDRAW",
+                            "amount": 70,
+                        },
+                        {
+                            "wallet_id": second,
+                            "operation_type": "WITHDRAW",
+                            "amount": 20,
+                        },
+                    ],
+                },
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert data["success"] is False
+            assert data["applied"] == 3
+            assert [r["success"] for r in data["results"]] == [True, True, False, True]
+            assert "Недостаточно средств" in data["results"][2]["error"]
+            assert data["results"][3]["new_balance"] == "30.00"
+
+            first_wallet = await client.get(f"/api/v1/wallets/{first}")
+            assert first_wallet.json()["balance"] == "30.00"
+            history = await client.get(f"/api/v1/wallets/{second}/wallet_transactions")
+            assert len(history.json()) == 2
+
+    async def test_batch_all_or_nothing(self, db_session):
+        """Тест атомарного пакета, который не применяется при ошибке"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = await _create_wallet(client, 100.00)
+
+            response = await client.post(
+                "/api/v1/wallets/operations/batch",
+                json={
+                    "operations": [
+                        {
+                            "wallet_id": wallet_id,
+                            "operation_type": "DEPOSIT",
+                            "amount": 10,
+                        },
+                        {
+                            "wallet_id": str(uuid.uuid4()),
+                            "operation_type": "DEPOSIT",
+                            "amount": 10,
+                        },
+                    ],
+                },
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert data["success"] is False
+            assert data["applied"] == 0
+            assert "не найден" in data["results"][1]["error"]
+
+            get_response = await client.get(f"/api/v1/wallets/{wallet_id}")
+            assert get_response.json()["balance"] == "100.00"
+
+    async def test_batch_invalid_mode(self, db_session):
+        """Тест неверного режима пакета"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.post(
+                "/api/v1/wallets/operations/batch",
+                json={
+                    "mode": "INVALID",
+                    "operations": [
+                        {
+                            "wallet_id": str(uuid.uuid4()),
+                            "operation_type": "DEPOSIT",
+                            "amount": 10,
+                        }
+                    ],
+                },
+            )
+
+            assert response.status_code == 422
+            errors = response.json()["detail"]
+            assert [error["loc"] for error in errors] == [["body", "mode"]]
@@ -0,0 +1,91 @@
+import json
+import uuid
+
+import pytest
+from httpx import AsyncClient
+
+from app.config import settings
+from app.main import app
+
+
+def _created_ids(response) -> list[str]:
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return [line["id"] for line in lines if "id" in line]
+
+
+@pytest.mark.asyncio
+class TestBulkWallets:
+    """Тесты массового создания кошельков"""
+
+    async def test_bulk_create_count(self, db_session, monkeypatch):
+        """Тест создания кошельков по количеству несколькими пачками"""
+        monkeypatch.setattr(settings, "BULK_WALLETS_CHUNK_SIZE", 4)
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.post("/api/v1/wallets/bulk", json={"count": 10})
+
+            assert response.status_code == 201
+            assert response.headers["content-type"] == "application/x-ndjson"
+            ids = _created_ids(response)
+            assert len(ids) == len(set(ids)) == 10
+
+            wallet = await client.get(f"/api/v1/wallets/{ids[-1]}")
+            assert wallet.status_code == 200
+            assert float(wallet.json()["balance"]) == 0
+
+    async def test_bulk_create_with_ids(self, db_session, monkeypatch):
+        """Тест создания кошельков с id клиента, начальным балансом и повтором импорта"""
+        monkeypatch.setattr(settings, "BULK_WALLETS_CHUNK_SIZE", 2)
+        wallets = [
+            {"id": str(uuid.uuid4()), "balance": 100.50},
+            {"id": str(uuid.uuid4()), "balance": 0},
+            {"id": str(uuid.uuid4())},
+        ]
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.post(
+                "/api/v1/wallets/bulk", json={"wallets": wallets}
+            )
+            assert response.status_code == 201
+            assert sorted(_created_ids(response)) == sorted(w["id"] for w in wallets)
+
+            wallet_id = wallets[0]["id"]
+            wallet = await client.get(f"/api/v1/wallets/{wallet_id}")
+            assert float(wallet.json()["balance"]) == 100.50
+            # Начальный баланс записан пополнением в истории и в сводке
+            history = (
+                await client.get(f"/api/v1/wallets/{wallet_id}/wallet_transactions")
+            ).json()
+            assert len(history) == 1
+            assert history[0]["operation_type"] == "DEPOSIT"
+            assert float(history[0]["new_balance"]) == 100.50
+            stats = (await client.get(f"/api/v1/wallets/{wallet_id}/stats")).json()
+            assert float(stats["items"][0]["deposit_total"]) == 100.50
+            empty_history = await client.get(
+                f"/api/v1/wallets/{wallets[1]['id']}/wallet_transactions"
+            )
+            assert empty_history.json() == []
+
+            # Повтор пропускает уже созданные кошельки и не меняет баланс
+            new_wallet = {"id": str(uuid.uuid4()), "balance": 5}
+            response = await client.post(
+                "/api/v1/wallets/bulk",
+                json={"wallets": [{"id": wallet_id, "balance": 1}, new_wallet]},
+            )
+            assert response.status_code == 201
+            assert _created_ids(response) == [new_wallet["id"]]
+            wallet = await client.get(f"/api/v1/wallets/{wallet_id}")
+            assert float(wallet.json()["balance"]) == 100.50
+
+    async def test_bulk_invalid_requests(self, db_session):
+        """Тест неверных запросов массового создания"""
+        wallet_id = str(uuid.uuid4())
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            for body in [
+                {},
+                {"count": 5, "wallets": [{"id": wallet_id}]},
+                {"count": 0},
+                {"wallets": []},
+                {"wallets": [{"id": wallet_id, "balance": -1}]},
+                {"wallets": [{"id": wallet_id}, {"id": wallet_id}]},
+            ]:
+                response = await client.post("/api/v1/wallets/bulk", json=body)
+                assert response.status_code == 422, body
@@ -0,0 +1,281 @@
+import json
+import uuid
+
+import pytest
+from httpx import AsyncClient
+
+from app.cache.cache_redis import cached, generation_key, invalidate_wallet_cache
+from app.main import app
+
+
+def _body(response) -> dict:
+    """Тело готового ответа, который возвращает кэширующий декоратор"""
+    return json.loads(response.body)
+
+
+@pytest.mark.asyncio
+class TestWalletCache:
+    """Тесты кэширования эндпоинтов кошелька"""
+
+    async def test_cache_hit_and_miss(self, fake_redis):
+        """Тест промаха, попадания и инвалидации кэша"""
+        calls = []
+
+        @cached(ttl=60)
+        async def load(wallet_id: uuid.UUID, limit: int = 10):
+            calls.append(limit)
+            return {"limit": limit, "calls": len(calls)}
+
+        wallet_id = uuid.uuid4()
+        assert _body(await load(wallet_id=wallet_id, limit=10)) == {
+            "limit": 10,
+            "calls": 1,
+        }
+        # Повторный запрос с теми же параметрами берется из кэша
+        assert _body(await load(wallet_id=wallet_id, limit=10)) == {
+            "limit": 10,
+            "calls": 1,
+        }
+        # Другие параметры - другой ключ кэша
+        assert _body(await load(wallet_id=wallet_id, limit=20)) == {
+            "limit": 20,
+            "calls": 2,
+        }
+
+        await invalidate_wallet_cache(wallet_id)
+        assert await fake_redis.get(generation_key(wallet_id)) == "1"
+        assert _body(await load(wallet_id=wallet_id, limit=10)) == {
+            "limit": 10,
+            "calls": 3,
+        }
+
+    async def test_operation_invalidates_balance(self, db_session, fake_redis):
+        """Тест, что операция над кошельком инвалидирует кэш баланса"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+
+            first = await client.get(f"/api/v1/wallets/{wallet_id}")
+            cached_response = await client.get(f"/api/v1/wallets/{wallet_id}")
+            assert cached_response.json() == first.json()
+            assert await fake_redis.keys(f"cache:get_wallet_balance:{wallet_id}:*")
+
+            await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 250.00},
+            )
+
+            response = await client.get(f"/api/v1/wallets/{wallet_id}")
+            assert response.json()["balance"] == "250.00"
+
+    async def test_endpoints_use_separate_keys(self, db_session, fake_redis):
+        """Тест, что баланс и история кэшируются под разными ключами"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+            for amount in [100.00, 200.00, 300.00]:
+                await client.post(
+                    f"/api/v1/wallets/{wallet_id}/operation",
+                    json={"operation_type": "DEPOSIT", "amount": amount},
+                )
+
+            balance = await client.get(f"/api/v1/wallets/{wallet_id}")
+            history = await client.get(
+                f"/api/v1/wallets/{wallet_id}/wallet_transactions",
+                params={"limit": 2},
+            )
+            cached_history = await client.get(
+                f"/api/v1/wallets/{wallet_id}/wallet_transactions",
+                params={"limit": 2},
+            )
+
+            assert balance.json()["balance"] == "600.00"
+            assert len(history.json()) == 2
+            assert cached_history.json() == history.json()
+            # Курсор следующей страницы сохраняется вместе с ответом
+            assert (
+                cached_history.headers["X-Next-Cursor"]
+                == history.headers["X-Next-Cursor"]
+            )
+
+    async def test_local_cache_in_front_of_redis(self, fake_redis):
+        """Тест L1 кэша и его инвалидации через pub/sub"""
+        import asyncio
+
+        from app.cache import cache_redis
+
+        calls = []
+
+        @cached(ttl=60)
+        async def load(wallet_id: uuid.UUID):
+            calls.append(wallet_id)
+            return {"calls": len(calls)}
+
+        await cache_redis.enable_local_cache(max_size=100, ttl=60)
+        try:
+            wallet_id = uuid.uuid4()
+            assert _body(await load(wallet_id=wallet_id)) == {"calls": 1}
+
+            # Ответ берется из L1 даже без записи в Redis
+            await fake_redis.flushall()
+            l1_hits = cache_redis.cache_stats["l1_hits"]
+            assert _body(await load(wallet_id=wallet_id)) == {"calls": 1}
+            assert cache_redis.cache_stats["l1_hits"] == l1_hits + 1
+
+            # Инвалидация от другого воркера приходит через pub/sub
+            await fake_redis.publish(cache_redis.INVALIDATION_CHANNEL, str(wallet_id))
+            await asyncio.sleep(0.05)
+            assert _body(await load(wallet_id=wallet_id)) == {"calls": 2}
+            assert cache_redis.get_cache_stats()["l1_size"] == 1
+        finally:
+            await cache_redis.disable_local_cache()
+
+    async def test_local_cache_lru_eviction(self):
+        """Тест вытеснения LRU и TTL в L1 кэше"""
+        import time
+
+        from app.cache.local_cache import LocalCache
+
+        cache = LocalCache(max_size=2, ttl=60)
+        wallet_id = uuid.uuid4()
+        version = cache.version(wallet_id)
+        cache.set("a", wallet_id, 1, version)
+        cache.set("b", wallet_id, 2, version)
+        assert cache.get("a") == 1
+        cache.set("c", wallet_id, 3, version)
+        # Вытесняется давно не использованный ключ "b"
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+
+        # Значение, прочитанное до инвалидации, в кэш не попадает
+        cache.invalidate(wallet_id)
+        assert len(cache) == 0
+        cache.set("a", wallet_id, 1, version)
+        assert cache.get("a") is None
+
+        cache.ttl = 0
+        cache.set("d", wallet_id, 4, cache.version(wallet_id))
+        time.sleep(0.001)
+        assert cache.get("d") is None
+
+    async def test_concurrent_misses_load_once(self, db_session, fake_redis):
+        """Тест, что N конкурентных промахов выполняют один запрос к БД"""
+        import asyncio
+
+        from app.services.wallet import WalletService
+
+        loads = []
+        original = WalletService.get_wallet_by_id
+
+        async def counting_get_wallet_by_id(self, wallet_id):
+            loads.append(wallet_id)
+            await asyncio.sleep(0.05)  # медленный запрос к БД
+            return await original(self, wallet_id)
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+
+            WalletService.get_wallet_by_id = counting_get_wallet_by_id
+            try:
+                responses = await asyncio.gather(
+                    *[client.get(f"/api/v1/wallets/{wallet_id}") for _ in range(20)]
+                )
+            finally:
+                WalletService.get_wallet_by_id = original
+
+            assert all(r.status_code == 200 for r in responses)
+            assert all(r.json() == responses[0].json() for r in responses)
+            assert len(loads) == 1
+
+    async def test_wait_for_other_worker(self, fake_redis):
+        """Тест ожидания значения, которое вычисляет другой воркер"""
+        import asyncio
+
+        from app.cache.cache_redis import build_cache_key, dump_entry
+
+        calls = []
+
+        @cached(ttl=60)
+        async def load(wallet_id: uuid.UUID):
+            calls.append(wallet_id)
+            return {"worker": "this"}
+
+        wallet_id = uuid.uuid4()
+        cache_key = build_cache_key("load", wallet_id, 0, {})
+        # Другой воркер держит блокировку и через 50 мс записывает значение
+        await fake_redis.set(f"{cache_key}:lock", "other", px=5000)
+
+        async def other_worker():
+            await asyncio.sleep(0.05)
+            entry = {"body": '{"worker":"other"}', "headers": {}}
+            await fake_redis.setex(cache_key, 60, dump_entry(entry))
+
+        result, _ = await asyncio.gather(load(wallet_id=wallet_id), other_worker())
+        assert _body(result) == {"worker": "other"}
+        assert calls == []
+
+    async def test_release_only_own_lock(self, fake_redis):
+        """Тест снятия блокировки кэша только ее владельцем"""
+        from app.cache.cache_redis import _release_lock
+
+        # Блокировка истекла и досталась другому воркеру
+        await fake_redis.set("key:lock", "other", px=5000)
+        await _release_lock("key:lock", "mine")
+        assert await fake_redis.get("key:lock") == "other"
+
+        await _release_lock("key:lock", "other")
+        assert await fake_redis.get("key:lock") is None
+
+    async def test_early_refresh(self, fake_redis, monkeypatch):
+        """Тест досрочного обновления ключа, который скоро истечет"""
+        from app.cache import cache_redis
+
+        monkeypatch.setattr(cache_redis.random, "random", lambda: 1 - 1e-12)
+        calls = []
+
+        @cached(ttl=60, early_refresh_beta=1e12)
+        async def load(wallet_id: uuid.UUID):
+            calls.append(wallet_id)
+            return {"calls": len(calls)}
+
+        wallet_id = uuid.uuid4()
+        assert _body(await load(wallet_id=wallet_id)) == {"calls": 1}
+        # Огромный beta заставляет обновлять значение при каждом чтении
+        assert _body(await load(wallet_id=wallet_id)) == {"calls": 2}
+
+        @cached(ttl=60, early_refresh_beta=0, namespace="load")
+        async def load_without_refresh(wallet_id: uuid.UUID):
+            calls.append(wallet_id)
+            return {"calls": len(calls)}
+
+        assert _body(await load_without_refresh(wallet_id=wallet_id)) == {"calls": 2}
+
+    async def test_cached_response_wire_format(self, db_session, fake_redis):
+        """Тест, что ответ из кэша побайтно совпадает с ответом без кэша"""
+        from app.cache import cache_redis
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+            for amount in [1234.50, 0.01]:
+                await client.post(
+                    f"/api/v1/wallets/{wallet_id}/operation",
+                    json={"operation_type": "DEPOSIT", "amount": amount},
+                )
+
+            for url, params in [
+                (f"/api/v1/wallets/{wallet_id}", {}),
+                (f"/api/v1/wallets/{wallet_id}/wallet_transactions", {"limit": 1}),
+            ]:
+                cache_redis.redis_client = None
+                plain = await client.get(url, params=params)
+                cache_redis.redis_client = fake_redis
+                miss = await client.get(url, params=params)
+                hit = await client.get(url, params=params)
+
+                assert plain.content == miss.content == hit.content
+                assert hit.headers["content-type"] == "application/json"
+                assert plain.headers.get("X-Next-Cursor") == hit.headers.get(
+                    "X-Next-Cursor"
+                )
@@ -0,0 +1,72 @@
+import asyncio
+import uuid
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+
+from app.exceptions import InsufficientFundsError, WalletNotFoundError
+from app.main import app
+from app.services.coalescer import OperationCoalescer, get_operation_coalescer
+from app.tests.conftest import TestingSessionLocal
+
+
+@pytest.mark.asyncio
+class TestOperationCoalescer:
+    """Тесты группировки операций над кошельком"""
+
+    async def test_concurrent_deposits_coalesced(self, db_session):
+        """Тест конкурентных пополнений в режиме группировки"""
+        coalescer = OperationCoalescer(TestingSessionLocal, window=0.01, max_batch=4)
+        app.dependency_overrides[get_operation_coalescer] = lambda: coalescer
+        try:
+            async with AsyncClient(app=app, base_url="http://test") as client:
+                create_response = await client.post("/api/v1/wallets/")
+                wallet_id = create_response.json()["id"]
+
+                responses = await asyncio.gather(
+                    *[
+                        client.post(
+                            f"/api/v1/wallets/{wallet_id}/operation",
+                            json={"operation_type": "DEPOSIT", "amount": 10.00},
+                        )
+                        for _ in range(10)
+                    ]
+                )
+                assert all(r.status_code == 200 for r in responses)
+                # У каждого вызывающего своя транзакция
+                assert len({r.json()["transaction_id"] for r in responses}) == 10
+
+                get_response = await client.get(f"/api/v1/wallets/{wallet_id}")
+                assert get_response.json()["balance"] == "100.00"
+        finally:
+            del app.dependency_overrides[get_operation_coalescer]
+
+    async def test_insufficient_funds_rejects_only_one_operation(self, db_session):
+        """Тест, что недостаток средств отклоняет только одну операцию пакета"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = uuid.UUID(create_response.json()["id"])
+            await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 100.00},
+            )
+
+        coalescer = OperationCoalescer(TestingSessionLocal, window=0.05, max_batch=10)
+        results = await asyncio.gather(
+            coalescer.submit(wallet_id, "WITHDRAW", Decimal("80")),
+            coalescer.submit(wallet_id, "WITHDRAW", Decimal("50")),
+            coalescer.submit(wallet_id, "DEPOSIT", Decimal("10")),
+            return_exceptions=True,
+        )
+
+        assert results[0].new_balance == Decimal("20.00")
+        assert isinstance(results[1], InsufficientFundsError)
+        assert results[2].previous_balance == Decimal("20.00")
+        assert results[2].new_balance == Decimal("30.00")
+
+    async def test_nonexistent_wallet(self, db_session):
+        """Тест группировки операций над несуществующим кошельком"""
+        coalescer = OperationCoalescer(TestingSessionLocal, window=0.01, max_batch=10)
+        with pytest.raises(WalletNotFoundError):
+            await coalescer.submit(uuid.uuid4(), "DEPOSIT", Decimal("10"))
@@ -0,0 +1,113 @@
+import asyncio
+import uuid
+
+import pytest
+from httpx import AsyncClient
+
+from app.main import app
+
+
+async def _operation(client: AsyncClient, wallet_id: str, key: str, amount: float):
+    return await client.post(
+        f"/api/v1/wallets/{wallet_id}/operation",
+        json={"operation_type": "DEPOSIT", "amount": amount},
+        headers={"Idempotency-Key": key},
+    )
+
+
+@pytest.mark.asyncio
+class TestIdempotencyAPI:
+    """Тесты операций с ключом идемпотентности"""
+
+    async def test_repeat_returns_same_result(self, db_session):
+        """Тест повтора операции с тем же ключом"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = (await client.post("/api/v1/wallets/")).json()["id"]
+            key = str(uuid.uuid4())
+
+            first = await _operation(client, wallet_id, key, 100.00)
+            second = await _operation(client, wallet_id, key, 100.00)
+
+            assert first.status_code == 200
+            assert second.status_code == 200
+            assert second.json() == first.json()
+
+            balance = await client.get(f"/api/v1/wallets/{wallet_id}")
+            assert float(balance.json()["balance"]) == 100.00
+
+            history = await client.get(
+                f"/api/v1/wallets/{wallet_id}/wallet_transactions"
+            )
+            assert len(history.json()) == 1
+
+    async def test_concurrent_duplicates_applied_once(self, db_session):
+        """Тест конкурентных запросов с одним ключом"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = (await client.post("/api/v1/wallets/")).json()["id"]
+            key = str(uuid.uuid4())
+
+            responses = await asyncio.gather(
+                *[_operation(client, wallet_id, key, 10.00) for _ in range(5)]
+            )
+
+            assert all(response.status_code == 200 for response in responses)
+            transaction_ids = {
+                response.json()["transaction_id"] for response in responses
+            }
+            assert len(transaction_ids) == 1
+
+            balance = await client.get(f"/api/v1/wallets/{wallet_id}")
+            assert float(balance.json()["balance"]) == 10.00
+
+    async def test_key_reused_for_other_request(self, db_session):
+        """Тест повторного использования ключа для другой операции"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = (await client.post("/api/v1/wallets/")).json()["id"]
+            key = str(uuid.uuid4())
+
+            await _operation(client, wallet_id, key, 100.00)
+            response = await _operation(client, wallet_id, key, 50.00)
+
+            assert response.status_code == 422
+            assert "уже использован" in response.json()["detail"]
+
+    async def test_failed_operation_releases_key(self, db_session):
+        """Тест повтора операции, отклоненной из-за недостатка средств"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = (await client.post("/api/v1/wallets/")).json()["id"]
+            key = str(uuid.uuid4())
+            withdraw = {"operation_type": "WITHDRAW", "amount": 30.00}
+
+            response = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json=withdraw,
+                headers={"Idempotency-Key": key},
+            )
+            assert response.status_code == 400
+
+            await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 50.00},
+            )
+            response = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json=withdraw,
+                headers={"Idempotency-Key": key},
+            )
+            assert response.status_code == 200
+            assert float(response.json()["new_balance"]) == 20.00
+
+    async def test_repeat_served_from_redis(self, db_session, fake_redis):
+        """Тест повтора операции по записи в Redis"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = (await client.post("/api/v1/wallets/")).json()["id"]
+            key = str(uuid.uuid4())
+
+            first = await _operation(client, wallet_id, key, 100.00)
+            assert await fake_redis.exists(f"idempotency:{key}")
+
+            second = await _operation(client, wallet_id, key, 100.00)
+            assert second.json() == first.json()
+
+            response = await _operation(client, wallet_id, key, 5.00)
+            assert response.status_code == 422
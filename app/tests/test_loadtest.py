@@ -0,0 +1,94 @@
+import random
+
+import pytest
+from sqlalchemy import text
+
+from app.tests.conftest import test_engine
+from app.tests.loadtest import (
+    SCENARIOS,
+    LoadConfig,
+    compare_with_baseline,
+    in_process_client,
+    percentile,
+    run_load,
+    wallet_ids,
+)
+
+
+@pytest.mark.asyncio
+class TestLoadScenarios:
+    """Тесты сценариев нагрузочного тестирования внутри процесса"""
+
+    async def test_mixed_scenario(self, db_session):
+        """Тест сценария с отказами из-за нехватки средств"""
+        config = LoadConfig(scenario="mixed", requests=60, concurrency=4, wallets=3)
+        scenario = SCENARIOS["mixed"](config)
+        await scenario.setup(test_engine)
+
+        async with test_engine.connect() as conn:
+            balances = (
+                await conn.execute(
+                    text("SELECT balance FROM wallets WHERE id = ANY(:ids)"),
+                    {"ids": wallet_ids("loadtest:mixed:", 3)},
+                )
+            ).scalars()
+            assert sorted(balances) == [50, 50, 50]
+
+        async with in_process_client(test_engine, config.concurrency) as client:
+            result = await run_load(client, scenario)
+
+        assert result["requests"] == 60
+        assert result["ok"] + sum(result["errors"].values()) == 60
+        assert set(result["errors"]) <= {"400 insufficient_funds"}
+        latency = result["latency_ms"]
+        assert 0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+
+    async def test_history_scenario(self, db_session):
+        """Тест листания глубокой истории по курсору"""
+        config = LoadConfig(
+            scenario="history", requests=8, concurrency=1, wallets=1, depth=250
+        )
+        scenario = SCENARIOS["history"](config)
+        await scenario.setup(test_engine)
+
+        async with in_process_client(test_engine, config.concurrency) as client:
+            state: dict = {}
+            pages = []
+            for _ in range(4):
+                request = scenario.next_request(random.Random(0), state)
+                response = await client.get(request.path, params=request.params)
+                pages.append(len(response.json()))
+                state["cursor"] = response.headers.get("X-Next-Cursor")
+
+            result = await run_load(client, scenario)
+
+        # 250 операций: три страницы, затем листание начинается заново
+        assert pages == [100, 100, 50, 100]
+        assert result["ok"] == 8
+
+
+class TestReport:
+    """Тесты расчета перцентилей и сравнения с базовым результатом"""
+
+    def test_percentile(self):
+        values = [float(v) for v in range(1, 101)]
+        assert percentile(values, 0.50) == 50
+        assert percentile(values, 0.99) == 99
+        assert percentile([7.0], 0.95) == 7
+        assert percentile([], 0.5) == 0
+
+    def test_compare_with_baseline(self):
+        baseline = {
+            "throughput_rps": 1000.0,
+            "latency_ms": {"p50": 10.0, "p95": 20.0, "p99": 30.0, "max": 50.0},
+        }
+        result = {
+            "throughput_rps": 950.0,
+            "latency_ms": {"p50": 10.5, "p95": 21.0, "p99": 40.0, "max": 90.0},
+        }
+        lines, regressions = compare_with_baseline(result, baseline, 0.10)
+        assert regressions == ["p99 +33.3%"]
+        assert lines[0] == "throughput: 1000.0 -> 950.0 rps (-5.0%)"
+
+        _, regressions = compare_with_baseline(result, baseline, 0.40)
+        assert regressions == []
@@ -0,0 +1,125 @@
+import json
+import threading
+from contextlib import contextmanager
+
+import pytest
+from httpx import AsyncClient
+from loguru import logger
+
+from app import metrics
+from app.log import QueueSink, RouteSampler, parse_size
+from app.main import app
+
+OPERATION_ROUTE = "/api/v1/wallets/{wallet_id}/operation"
+
+
+@contextmanager
+def _json_sink(maxsize: int = 1000, write=None, sampler=None):
+    """Обработчик loguru с очередью, строки JSON собираются в список"""
+    lines = []
+    sink = QueueSink(
+        write or (lambda chunk: lines.extend(chunk.splitlines())), maxsize, True
+    )
+    handler_id = logger.add(sink, format="{message}", level="DEBUG", filter=sampler)
+    try:
+        yield sink, lines
+    finally:
+        logger.remove(handler_id)
+
+
+@pytest.mark.asyncio
+class TestQueueSink:
+    """Тесты записи журнала через очередь"""
+
+    async def test_json_records(self):
+        """Тест записи в JSON в потоке записи, включая исключение"""
+        with _json_sink() as (sink, lines):
+            logger.bind(wallet_id="w1").info("Баланс {}", 100)
+            try:
+                raise ValueError("ошибка")
+            except ValueError:
+                logger.opt(exception=True).error("Сбой {}", "операции")
+            await logger.complete()
+
+        info, error = [json.loads(line) for line in lines]
+        assert info["message"] == "Баланс 100"
+        assert info["level"] == "INFO"
+        assert info["wallet_id"] == "w1"
+        assert info["function"] == "test_json_records"
+        assert error["level"] == "ERROR"
+        assert "ValueError: ошибка" in error["exception"]
+
+    async def test_full_queue_drops_records(self):
+        """Тест отбрасывания записей при заполненной очереди"""
+        written, entered, release = [], threading.Event(), threading.Event()
+
+        def slow_write(line):
+            entered.set()
+            release.wait(5)
+            written.append(line)
+
+        dropped = metrics.log_records_dropped.value("queue_full")
+        with _json_sink(maxsize=2, write=slow_write) as (sink, _):
+            logger.info("Первая запись")
+            # Поток записи занят первой записью, в очередь помещаются две
+            assert entered.wait(5)
+            for i in range(10):
+                logger.info("Запись {}", i)
+            release.set()
+            await logger.complete()
+
+        assert metrics.log_records_dropped.value("queue_full") - dropped == 8
+        records = [json.loads(line) for chunk in written for line in chunk.splitlines()]
+        assert [r["message"] for r in records] == [
+            "Первая запись",
+            "Запись 0",
+            "Запись 1",
+        ]
+
+
+@pytest.mark.asyncio
+class TestRouteSampling:
+    """Тесты выборочного сохранения записей по маршрутам"""
+
+    async def test_sampling_keeps_warnings(self, db_session):
+        """Тест: записи операций отбрасываются, предупреждения сохраняются"""
+        sampler = RouteSampler(default_rate=1.0, rates={OPERATION_ROUTE: 0.0})
+        sampled = metrics.log_records_dropped.value("sampled")
+
+        with _json_sink(sampler=sampler) as (sink, lines):
+            async with AsyncClient(app=app, base_url="http://test") as client:
+                create_response = await client.post("/api/v1/wallets/")
+                wallet_id = create_response.json()["id"]
+                await client.post(
+                    f"/api/v1/wallets/{wallet_id}/operation",
+                    json={"operation_type": "DEPOSIT", "amount": 100.00},
+                )
+                await client.post(
+                    f"/api/v1/wallets/{wallet_id}/operation",
+                    json={"operation_type": "WITHDRAW", "amount": 500.00},
+                )
+            await logger.complete()
+
+        records = [json.loads(line) for line in lines]
+        operation_records = [r for r in records if r.get("route") == OPERATION_ROUTE]
+        assert operation_records
+        assert {r["level"] for r in operation_records} == {"WARNING"}
+        assert any(
+            "Недостаточно средств" in r["message"] and wallet_id in r["message"]
+            for r in operation_records
+        )
+        assert any(
+            r.get("route") == "/api/v1/wallets/" and r["level"] == "INFO"
+            for r in records
+        )
+        assert metrics.log_records_dropped.value("sampled") > sampled
+
+
+class TestLogSettings:
+    """Тесты разбора настроек журнала"""
+
+    def test_parse_size(self):
+        assert parse_size("10 MB") == 10 * 1024 * 1024
+        assert parse_size("512kb") == 512 * 1024
+        assert parse_size("1.5 GB") == int(1.5 * 1024**3)
+        assert parse_size("1 week") is None
@@ -0,0 +1,105 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+
+from app import metrics
+from app.main import app
+
+OPERATION_ROUTE = "/api/v1/wallets/{wallet_id}/operation"
+
+
+@pytest.mark.asyncio
+class TestMetrics:
+    """Тесты эндпоинта /metrics"""
+
+    async def test_request_and_wallet_metrics(self, db_session):
+        """Тест метрик запросов, блокировки баланса и ошибок кошелька"""
+        operations = metrics.request_duration.count("POST", OPERATION_ROUTE, "200")
+        rejected = metrics.request_duration.count("POST", OPERATION_ROUTE, "400")
+        lock_waits = metrics.operation_lock_wait.count()
+        insufficient = metrics.insufficient_funds.value()
+        not_found = metrics.wallet_not_found.value()
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+            await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 100.00},
+            )
+            await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "WITHDRAW", "amount": 500.00},
+            )
+            await client.get(f"/api/v1/wallets/{uuid.uuid4()}")
+
+            response = await client.get("/metrics")
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/plain")
+            text = response.text
+
+        assert metrics.request_duration.count("POST", OPERATION_ROUTE, "200") == (
+            operations + 1
+        )
+        assert metrics.request_duration.count("POST", OPERATION_ROUTE, "400") == (
+            rejected + 1
+        )
+        assert metrics.operation_lock_wait.count() == lock_waits + 1
+        assert metrics.operation_lock_hold.count() == lock_waits + 1
+        assert metrics.insufficient_funds.value() == insufficient + 1
+        assert metrics.wallet_not_found.value() == not_found + 1
+
+        assert "# TYPE http_request_duration_seconds histogram" in text
+        assert (
+            'http_request_duration_seconds_count{method="POST",'
+            f'route="{OPERATION_ROUTE}",status="200"}} {operations + 1}'
+        ) in text
+        assert f"wallet_insufficient_funds_total {insufficient + 1:.0f}" in text
+        assert "# TYPE db_pool_connections_in_use gauge" in text
+
+    async def test_cache_counters(self, db_session, fake_redis):
+        """Тест счетчиков попаданий и промахов кэша по эндпоинтам"""
+        hits = metrics.cache_hits.value("get_wallet_balance")
+        misses = metrics.cache_misses.value("get_wallet_balance")
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+            await client.get(f"/api/v1/wallets/{wallet_id}")
+            await client.get(f"/api/v1/wallets/{wallet_id}")
+            await client.get(f"/api/v1/wallets/{wallet_id}")
+            text = (await client.get("/metrics")).text
+
+        assert metrics.cache_misses.value("get_wallet_balance") == misses + 1
+        assert metrics.cache_hits.value("get_wallet_balance") == hits + 2
+        assert (
+            f'cache_redis_hits_total{{endpoint="get_wallet_balance"}} {hits + 2:.0f}'
+            in text
+        )
+
+
+class TestExposition:
+    """Тесты текстового формата метрик"""
+
+    def test_histogram_format(self):
+        histogram = metrics.Histogram(
+            "test_seconds",
+            'Тест "кавычек"',
+            ("route",),
+            buckets=(0.1, 1.0),
+            registry=None,
+        )
+        histogram.observe(0.05, '/"a"')
+        histogram.observe(0.1, '/"a"')
+        histogram.observe(3, '/"a"')
+
+        assert histogram.render().splitlines() == [
+            '# HELP test_seconds Тест "кавычек"',
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{route="/\\"a\\"",le="0.1"} 2',
+            'test_seconds_bucket{route="/\\"a\\"",le="1"} 2',
+            'test_seconds_bucket{route="/\\"a\\"",le="+Inf"} 3',
+            'test_seconds_sum{route="/\\"a\\""} 3.15',
+            'test_seconds_count{route="/\\"a\\""} 3',
+        ]
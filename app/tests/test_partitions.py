@@ -0,0 +1,129 @@
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.config import settings
+from app.database import advisory_lock
+from app.models.wallet import Transaction
+from app.repository.partition import TransactionPartitionRepository
+from app.services.partition import PARTITION_LOCK, TransactionPartitionService
+from app.tests.conftest import TestingSessionLocal, test_engine
+from app.utils.partition import add_months, month_start, partition_name
+
+FAR_MONTH = datetime(2100, 3, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+class TestTransactionPartitions:
+    """Тесты месячных партиций таблицы транзакций"""
+
+    async def test_ensure_partitions(self, db_session):
+        """Тест создания партиций заранее и повторного запуска"""
+        async with TestingSessionLocal() as session:
+            service = TransactionPartitionService(session)
+            await service.ensure_partitions(months_ahead=5)
+            assert await service.ensure_partitions(months_ahead=5) == []
+
+            async with session.begin():
+                partitions = await service.partition_repo.list_partitions()
+
+        current = month_start(datetime.now(timezone.utc))
+        for offset in range(6):
+            month = add_months(current, offset)
+            assert partitions[partition_name(month)] == month
+
+    async def test_partition_lock(self, db_session):
+        """Тест блокировки обслуживания партиций: один процесс, снятие при ошибке"""
+        with pytest.raises(RuntimeError):
+            async with advisory_lock(test_engine, PARTITION_LOCK) as acquired:
+                assert acquired is True
+                async with advisory_lock(test_engine, PARTITION_LOCK) as other:
+                    assert other is False
+                raise RuntimeError("ошибка обслуживания")
+        async with advisory_lock(test_engine, PARTITION_LOCK) as acquired:
+            assert acquired is True
+
+    async def test_partition_takes_rows_from_default(self, db_session):
+        """Тест переноса строк из партиции по умолчанию и отключения партиции"""
+        transaction_id = uuid.uuid4()
+        name = partition_name(FAR_MONTH)
+        async with TestingSessionLocal() as session:
+            async with session.begin():
+                session.add(
+                    Transaction(
+                        id=transaction_id,
+                        wallet_id=uuid.uuid4(),
+                        operation_type="DEPOSIT",
+                        amount=Decimal(1),
+                        previous_balance=Decimal(0),
+                        new_balance=Decimal(1),
+                        created_at=datetime(2100, 3, 15, tzinfo=timezone.utc),
+                    )
+                )
+
+            repo = TransactionPartitionRepository(session)
+            query = text(
+                "SELECT tableoid::regclass::text FROM transactions WHERE id = :id"
+            )
+            try:
+                async with session.begin():
+                    await repo.create_partition(FAR_MONTH)
+                    location = await session.scalar(query, {"id": transaction_id})
+                    assert location == name
+
+                async with session.begin():
+                    await repo.detach_partition(name)
+                    assert await session.scalar(query, {"id": transaction_id}) is None
+            finally:
+                async with session.begin():
+                    await session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    await session.execute(
+                        text("DELETE FROM transactions WHERE id = :id"),
+                        {"id": transaction_id},
+                    )
+
+    async def test_detach_waits_for_lock_with_timeout(self, db_session, monkeypatch):
+        """Тест, что отключение партиции не ждет блокировку дольше таймаута"""
+        monkeypatch.setattr(settings, "PARTITION_LOCK_TIMEOUT_MS", 100)
+        name = partition_name(FAR_MONTH)
+        async with TestingSessionLocal() as session:
+            repo = TransactionPartitionRepository(session)
+            async with session.begin():
+                await repo.create_partition(FAR_MONTH)
+            try:
+                # Долгая транзакция читает transactions и держит блокировку
+                async with TestingSessionLocal() as reader:
+                    async with reader.begin():
+                        await reader.execute(text("SELECT 1 FROM transactions LIMIT 1"))
+                        with pytest.raises(DBAPIError, match="lock timeout"):
+                            async with session.begin():
+                                await repo.detach_partition(name)
+
+                async with session.begin():
+                    assert name in await repo.list_partitions()
+            finally:
+                async with session.begin():
+                    await session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+
+    async def test_date_filter_prunes_partitions(self, db_session):
+        """Тест, что запрос с фильтром по дате читает только нужные партиции"""
+        async with TestingSessionLocal() as session:
+            await TransactionPartitionService(session).ensure_partitions(0)
+            month = month_start(datetime.now(timezone.utc))
+            plan = await session.execute(
+                text(
+                    "EXPLAIN SELECT * FROM transactions "
+                    f"WHERE wallet_id = '{uuid.uuid4()}' "
+                    f"AND created_at >= '{month.isoformat()}' "
+                    f"AND created_at < '{add_months(month, 1).isoformat()}'"
+                )
+            )
+            plan = "\n".join(plan.scalars())
+
+        assert partition_name(month) in plan
+        assert partition_name(add_months(month, 1)) not in plan
+        assert "transactions_default" not in plan
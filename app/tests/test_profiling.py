@@ -0,0 +1,153 @@
+from contextlib import contextmanager
+
+import pytest
+from httpx import AsyncClient
+from loguru import logger
+
+from app.config import settings
+from app.main import app
+from app.profiling import normalize_statement, redact_parameters, sql_profiler
+from app.tests.conftest import test_engine
+
+
+@contextmanager
+def _profiling(slow_query_threshold: float):
+    """Профилирование тестовой БД с заданным порогом медленного запроса"""
+    threshold = sql_profiler.slow_query_threshold
+    sql_profiler.slow_query_threshold = slow_query_threshold
+    sql_profiler.reset()
+    sql_profiler.enable(test_engine)
+    try:
+        yield
+    finally:
+        sql_profiler.disable()
+        sql_profiler.reset()
+        sql_profiler.slow_query_threshold = threshold
+
+
+@pytest.mark.asyncio
+class TestSqlProfiling:
+    """Тесты профилирования SQL запросов"""
+
+    async def test_statements_by_caller(self, db_session, monkeypatch):
+        """Тест статистики запросов по методам репозиториев"""
+        monkeypatch.setattr(settings, "ADMIN_ENDPOINTS_ENABLED", True)
+        async with AsyncClient(
+            app=app,
+            base_url="http://test",
+            headers={"X-Admin-Token": settings.SECRET_KEY},
+        ) as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+
+            with _profiling(slow_query_threshold=60):
+                for amount in [100.00, 50.00]:
+                    await client.post(
+                        f"/api/v1/wallets/{wallet_id}/operation",
+                        json={"operation_type": "DEPOSIT", "amount": amount},
+                    )
+                await client.get(f"/api/v1/wallets/{wallet_id}")
+
+                response = await client.get(
+                    "/admin/sql/statements", params={"order_by": "calls"}
+                )
+                assert response.status_code == 200
+                body = response.json()
+                assert body["enabled"] is True
+                statements = {s["caller"]: s for s in body["statements"]}
+
+                operation = statements[
+                    "app.repository.wallet.WalletRepository.apply_operation"
+                ]
+                assert operation["calls"] == 2
+                assert operation["rows"] == 2
+                assert operation["total_ms"] >= operation["max_ms"] > 0
+                assert wallet_id not in operation["statement"]
+                assert "WITH updated AS (UPDATE wallets" in operation["statement"]
+                assert (
+                    statements[
+                        "app.repository.wallet.WalletRepository.find_one_or_none_by_id"
+                    ]["calls"]
+                    == 1
+                )
+
+                response = await client.delete("/admin/sql/statements")
+                assert response.status_code == 204
+                response = await client.get("/admin/sql/statements")
+                assert response.json()["statements"] == []
+
+            response = await client.post(
+                "/admin/sql/profiling", params={"enabled": False}
+            )
+            assert response.json()["enabled"] is False
+
+    async def test_admin_access(self, monkeypatch):
+        """Тест доступа к /admin: выключены по умолчанию, включенные требуют токен"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            monkeypatch.setattr(settings, "ADMIN_ENDPOINTS_ENABLED", False)
+            response = await client.post(
+                "/admin/sql/profiling",
+                params={"enabled": True},
+                headers={"X-Admin-Token": settings.SECRET_KEY},
+            )
+            assert response.status_code == 404
+
+            monkeypatch.setattr(settings, "ADMIN_ENDPOINTS_ENABLED", True)
+            for headers in [{}, {"X-Admin-Token": "wrong"}]:
+                response = await client.delete("/admin/sql/statements", headers=headers)
+                assert response.status_code == 403, headers
+            assert sql_profiler.enabled is False
+
+            response = await client.get(
+                "/admin/sql/statements",
+                headers={"X-Admin-Token": settings.SECRET_KEY},
+            )
+            assert response.status_code == 200
+
+    async def test_slow_query_log(self, db_session):
+        """Тест журнала медленных запросов без значений параметров"""
+        messages = []
+        sink = logger.add(lambda message: messages.append(str(message)))
+        try:
+            async with AsyncClient(app=app, base_url="http://test") as client:
+                create_response = await client.post("/api/v1/wallets/")
+                wallet_id = create_response.json()["id"]
+                with _profiling(slow_query_threshold=0):
+                    await client.post(
+                        f"/api/v1/wallets/{wallet_id}/operation",
+                        json={"operation_type": "DEPOSIT", "amount": 123.45},
+                    )
+        finally:
+            logger.remove(sink)
+
+        [slow] = [
+            m for m in messages if "Медленный запрос" in m and "apply_operation" in m
+        ]
+        assert "параметры: (" in slow and "UUID" in slow and "Decimal" in slow
+        assert wallet_id not in slow
+        assert "123.45" not in slow
+
+
+class TestStatementNormalization:
+    """Тесты нормализации текста запросов"""
+
+    def test_normalize_statement(self):
+        assert normalize_statement(
+            "SELECT wallets.id FROM wallets\n WHERE wallets.id IN ($1::UUID, $2::UUID)"
+            " AND wallets.balance > $3::NUMERIC(18, 2) AND name = 'x''y' LIMIT 10"
+        ) == (
+            "SELECT wallets.id FROM wallets WHERE wallets.id IN (...)"
+            " AND wallets.balance > ? AND name = ? LIMIT ?"
+        )
+        assert normalize_statement(
+            "INSERT INTO t (a, b) VALUES ($1, $2), ($3, $4), ($5, $6)"
+        ) == normalize_statement("INSERT INTO t (a, b) VALUES ($1, $2)")
+        assert (
+            normalize_statement("SELECT 1 FROM transactions_y2024m01")
+            == "SELECT ? FROM transactions_y2024m01"
+        )
+
+    def test_redact_parameters(self):
+        assert redact_parameters(("secret", 10)) == "(str, int)"
+        assert redact_parameters([("a", 1), ("b", 2)]) == "(str, int) x 2"
+        assert redact_parameters({"token": "secret"}) == "{token: str}"
@@ -0,0 +1,161 @@
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import NullPool, event
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.database import SessionRouter, get_session_router
+from app.main import app
+from app.tests.conftest import override_get_session_router, test_engine
+from app.utils.lsn import format_lsn, parse_lsn
+
+
+class _Replica:
+    """
+    Реплика для тестов: отдельный движок на ту же тестовую БД, позиция
+    воспроизведения журнала задается тестом
+    """
+
+    def __init__(self):
+        self.engine = create_async_engine(settings.TEST_DB_URL, poolclass=NullPool)
+        self.replayed = "0/0"
+        self.checkouts = {"primary": 0, "replica": 0}
+
+    def count(self, name: str):
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self.checkouts[name] += 1
+
+        return on_checkout
+
+    def reset(self):
+        self.checkouts = {"primary": 0, "replica": 0}
+
+
+@asynccontextmanager
+async def _with_replica():
+    replica = _Replica()
+    router = SessionRouter(test_engine, replica.engine, refresh_interval=0)
+
+    async def replay_lsn():
+        return replica.replayed
+
+    router._replay_lsn = replay_lsn
+    on_primary, on_replica = replica.count("primary"), replica.count("replica")
+    event.listen(test_engine.sync_engine, "checkout", on_primary)
+    event.listen(replica.engine.sync_engine, "checkout", on_replica)
+    app.dependency_overrides[get_session_router] = lambda: router
+    try:
+        yield replica
+    finally:
+        app.dependency_overrides[get_session_router] = override_get_session_router
+        event.remove(test_engine.sync_engine, "checkout", on_primary)
+        event.remove(replica.engine.sync_engine, "checkout", on_replica)
+        await replica.engine.dispose()
+
+
+@pytest.mark.asyncio
+class TestReadReplica:
+    """Тесты маршрутизации чтений между основной БД и репликой"""
+
+    async def test_read_your_writes(self, db_session):
+        """Тест, что чтение с токеном операции идет в основную БД, пока реплика отстает"""
+        async with _with_replica() as replica, AsyncClient(
+            app=app, base_url="http://test"
+        ) as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+            response = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 100.00},
+            )
+            token = response.headers["X-Consistency-Token"]
+            assert parse_lsn(token) >= parse_lsn(
+                create_response.headers["X-Consistency-Token"]
+            )
+
+            # Без токена чтение идет в реплику
+            replica.reset()
+            await client.get(f"/api/v1/wallets/{wallet_id}")
+            assert replica.checkouts == {"primary": 0, "replica": 1}
+
+            # Реплика не дошла до токена: чтение из основной БД
+            replica.reset()
+            response = await client.get(
+                f"/api/v1/wallets/{wallet_id}",
+                headers={"X-Consistency-Token": token},
+            )
+            assert response.json()["balance"] == "100.00"
+            assert replica.checkouts == {"primary": 1, "replica": 0}
+
+            # Реплика воспроизвела журнал до токена: чтение из реплики
+            replica.replayed = token
+            replica.reset()
+            response = await client.get(
+                f"/api/v1/wallets/{wallet_id}/wallet_transactions",
+                headers={"X-Consistency-Token": token},
+            )
+            assert len(response.json()) == 1
+            assert replica.checkouts == {"primary": 0, "replica": 1}
+
+            # Неверный токен: чтение из основной БД
+            replica.reset()
+            await client.get(
+                f"/api/v1/wallets/{wallet_id}",
+                headers={"X-Consistency-Token": "not-a-token"},
+            )
+            assert replica.checkouts == {"primary": 1, "replica": 0}
+
+    async def test_cache_filled_from_primary(self, db_session, fake_redis):
+        """Тест, что значение для кэша читается из основной БД"""
+        async with _with_replica() as replica, AsyncClient(
+            app=app, base_url="http://test"
+        ) as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+
+            replica.reset()
+            await client.get(f"/api/v1/wallets/{wallet_id}")
+            assert replica.checkouts == {"primary": 1, "replica": 0}
+
+            # Баланс на момент времени не кэшируется и читается из реплики
+            replica.reset()
+            await client.get(f"/api/v1/wallets/{wallet_id}/balance")
+            assert replica.checkouts == {"primary": 0, "replica": 1}
+
+    async def test_bulk_consistency_token(self, db_session, monkeypatch):
+        """Тест токена согласованности последней строкой массового создания"""
+        monkeypatch.setattr(settings, "BULK_WALLETS_CHUNK_SIZE", 2)
+        async with _with_replica() as replica, AsyncClient(
+            app=app, base_url="http://test"
+        ) as client:
+            create_response = await client.post("/api/v1/wallets/")
+            response = await client.post("/api/v1/wallets/bulk", json={"count": 3})
+            *created, last = [json.loads(line) for line in response.text.splitlines()]
+            assert len(created) == 3
+            token = last["consistency_token"]
+            assert parse_lsn(token) > parse_lsn(
+                create_response.headers["X-Consistency-Token"]
+            )
+
+            replica.reset()
+            response = await client.get(
+                f"/api/v1/wallets/{created[-1]['id']}",
+                headers={"X-Consistency-Token": token},
+            )
+            assert response.status_code == 200
+            assert replica.checkouts == {"primary": 1, "replica": 0}
+
+
+class TestLsn:
+    """Тесты разбора позиции WAL"""
+
+    def test_parse_lsn(self):
+        assert parse_lsn("16/B374D848") == 0x16B374D848
+        assert format_lsn(parse_lsn("16/B374D848")) == "16/B374D848"
+        assert parse_lsn("0/0") == 0
+        assert parse_lsn("1/0") > parse_lsn("0/FFFFFFFF")
+        for value in [None, "", "16B374D848", "x/1", "100000000/0"]:
+            assert parse_lsn(value) is None
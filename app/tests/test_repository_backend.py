@@ -0,0 +1,170 @@
+import uuid
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import Row, event
+
+from app.config import settings
+from app.main import app
+from app.models.wallet import Wallet
+from app.repository.transaction import TransactionRepository
+from app.repository.wallet import WalletRepository
+from app.tests.conftest import TestingSessionLocal, test_engine, test_session_router
+from app.tests import (
+    test_batch_operations,
+    test_coalescer,
+    test_idempotency,
+    test_profiling,
+    test_striped_wallets,
+    test_wallets,
+)
+
+
+@pytest.fixture(autouse=True)
+def asyncpg_backend(monkeypatch):
+    """Горячие запросы репозиториев выполняются подготовленными запросами asyncpg"""
+    monkeypatch.setattr(settings, "REPOSITORY_BACKEND", "asyncpg")
+
+
+# Тесты API повторяются с подготовленными запросами asyncpg
+
+
+class TestWalletAPIAsyncpg(test_wallets.TestWalletAPI):
+    pass
+
+
+class TestBatchOperationsAPIAsyncpg(test_batch_operations.TestBatchOperationsAPI):
+    pass
+
+
+class TestIdempotencyAPIAsyncpg(test_idempotency.TestIdempotencyAPI):
+    pass
+
+
+class TestOperationCoalescerAsyncpg(test_coalescer.TestOperationCoalescer):
+    pass
+
+
+class TestStripedWalletsAsyncpg(test_striped_wallets.TestStripedWallets):
+    pass
+
+
+class TestSqlProfilingAsyncpg(test_profiling.TestSqlProfiling):
+    pass
+
+
+@pytest.mark.asyncio
+class TestPreparedRepositories:
+    """Тесты репозиториев с подготовленными запросами asyncpg"""
+
+    async def test_rows_instead_of_orm_objects(self, db_session):
+        """Тест: репозитории возвращают строки, а не объекты ORM"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = uuid.UUID((await client.post("/api/v1/wallets/")).json()["id"])
+
+        async with TestingSessionLocal() as session:
+            async with session.begin():
+                wallet = await WalletRepository(session).find_one_or_none_by_id(
+                    wallet_id
+                )
+                assert isinstance(wallet, Row)
+                assert not isinstance(wallet, Wallet)
+                assert wallet.id == wallet_id
+                assert wallet.balance == Decimal(0)
+                assert (
+                    await WalletRepository(session).find_one_or_none_by_id(uuid.uuid4())
+                    is None
+                )
+
+                row = await WalletRepository(session).apply_operation(
+                    wallet_id, "DEPOSIT", Decimal(30), Decimal(30)
+                )
+                assert isinstance(row, Row)
+                assert (row.current_balance, row.new_balance) == (0, 30)
+                # ORM-объекты в сессию не попадают
+                assert not session.identity_map
+
+    async def test_statement_in_session_transaction(self, db_session):
+        """Тест: первый в транзакции подготовленный запрос откатывается с ней"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = uuid.UUID((await client.post("/api/v1/wallets/")).json()["id"])
+
+        async with TestingSessionLocal() as session:
+            transaction = await session.begin()
+            row = await WalletRepository(session).apply_operation(
+                wallet_id, "DEPOSIT", Decimal(30), Decimal(30)
+            )
+            assert row.new_balance == 30
+            await transaction.rollback()
+
+        async with TestingSessionLocal() as session:
+            wallet = await WalletRepository(session).find_one_or_none_by_id(wallet_id)
+            assert wallet.balance == Decimal(0)
+
+    async def test_one_statement_per_call(self, db_session):
+        """Тест: чтение в сессии AUTOCOMMIT и изменение баланса - по одному запросу"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = uuid.UUID((await client.post("/api/v1/wallets/")).json()["id"])
+
+        statements = []
+
+        def on_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", on_execute)
+        try:
+            async with await test_session_router.session() as session:
+                wallet = await WalletRepository(session).find_one_or_none_by_id(
+                    wallet_id
+                )
+            assert wallet.balance == Decimal(0)
+            assert len(statements) == 1
+            assert "FROM wallets" in statements[0]
+
+            statements.clear()
+            async with TestingSessionLocal() as session:
+                async with session.begin():
+                    row = await WalletRepository(session).apply_operation(
+                        wallet_id, "DEPOSIT", Decimal(30), Decimal(30)
+                    )
+            assert row.new_balance == 30
+            assert len(statements) == 1
+            assert "UPDATE wallets" in statements[0]
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", on_execute)
+
+    async def test_create_many_keeps_order(self, db_session):
+        """Тест: строки вставленных транзакций возвращаются в порядке входных"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = uuid.UUID((await client.post("/api/v1/wallets/")).json()["id"])
+
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "wallet_id": wallet_id,
+                "operation_type": "DEPOSIT",
+                "amount": Decimal(i + 1),
+                "previous_balance": Decimal(0),
+                "new_balance": Decimal(i + 1),
+            }
+            for i in range(50)
+        ]
+        async with TestingSessionLocal() as session:
+            async with session.begin():
+                repository = TransactionRepository(session)
+                created = await repository.create_many(rows)
+                assert [t.id for t in created] == [row["id"] for row in rows]
+                assert [t.amount for t in created] == [row["amount"] for row in rows]
+                assert all(t.created_at is not None for t in created)
+
+                page = await repository.get_list_transactions(
+                    wallet_id, skip=10, limit=5
+                )
+                assert all(isinstance(t, Row) for t in page)
+                assert len(page) == 5
+                after = await repository.get_list_transactions(
+                    wallet_id, skip=0, limit=5, after=(page[-1].created_at, page[-1].id)
+                )
+                assert len(after) == 5
+                assert {t.id for t in after}.isdisjoint(t.id for t in page)
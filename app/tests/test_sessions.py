@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+
+from app.main import app
+from app.tests.conftest import test_engine
+
+
+@contextmanager
+def _track_connections():
+    """Счетчик выдач соединений и журнал запросов, отправленных в БД"""
+    checkouts: list[int] = []
+    queries: list[str] = []
+
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.driver_connection.add_query_logger(
+            lambda record: queries.append(record.query)
+        )
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checkouts.append(1)
+
+    event.listen(test_engine.sync_engine, "connect", on_connect)
+    event.listen(test_engine.sync_engine, "checkout", on_checkout)
+    try:
+        yield checkouts, queries
+    finally:
+        event.remove(test_engine.sync_engine, "connect", on_connect)
+        event.remove(test_engine.sync_engine, "checkout", on_checkout)
+
+
+@pytest.mark.asyncio
+class TestSessions:
+    """Тесты получения сессий БД в обработчиках"""
+
+    async def test_cache_hit_skips_pool(self, db_session, fake_redis):
+        """Тест, что ответ из кэша не берет соединение из пула"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+            first = await client.get(f"/api/v1/wallets/{wallet_id}")
+
+            with _track_connections() as (checkouts, _):
+                response = await client.get(f"/api/v1/wallets/{wallet_id}")
+                history = await client.get(
+                    f"/api/v1/wallets/{wallet_id}/wallet_transactions"
+                )
+                cached_history = await client.get(
+                    f"/api/v1/wallets/{wallet_id}/wallet_transactions"
+                )
+            assert response.json() == first.json()
+            assert cached_history.json() == history.json()
+            # Соединение берется только для промаха кэша истории
+            assert len(checkouts) == 1
+
+    async def test_read_without_transaction(self, db_session):
+        """Тест, что чтение выполняется без BEGIN/COMMIT, а запись - в транзакции"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+
+            with _track_connections() as (_, queries):
+                response = await client.get(f"/api/v1/wallets/{wallet_id}")
+                assert response.status_code == 200
+                assert not [q for q in queries if q.startswith(("BEGIN", "COMMIT"))]
+
+                response = await client.post(
+                    f"/api/v1/wallets/{wallet_id}/operation",
+                    json={"operation_type": "DEPOSIT", "amount": 10.00},
+                )
+                assert response.status_code == 200
+                assert [q.split()[0] for q in queries] == ["BEGIN", "COMMIT;"]
@@ -0,0 +1,217 @@
+import asyncio
+import uuid
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.main import app
+from app.models.wallet import WalletStripe
+from app.services.wallet import WalletService
+from app.tests.conftest import TestingSessionLocal
+from app.utils.wallet import spread_stripe_change
+
+
+async def _create_striped_wallet(
+    client: AsyncClient, balance: float, stripes: int
+) -> str:
+    response = await client.post("/api/v1/wallets/")
+    wallet_id = response.json()["id"]
+    await client.post(
+        f"/api/v1/wallets/{wallet_id}/operation",
+        json={"operation_type": "DEPOSIT", "amount": balance},
+    )
+    async with TestingSessionLocal() as session:
+        await WalletService(session).set_stripes(uuid.UUID(wallet_id), stripes)
+    return wallet_id
+
+
+async def _stripe_balances(wallet_id: str) -> dict[int, Decimal]:
+    async with TestingSessionLocal() as session:
+        result = await session.execute(
+            select(WalletStripe.stripe, WalletStripe.balance).where(
+                WalletStripe.wallet_id == uuid.UUID(wallet_id)
+            )
+        )
+        return dict(result.all())
+
+
+@pytest.mark.asyncio
+class TestStripedWallets:
+    """Тесты режима полос баланса"""
+
+    async def test_concurrent_operations(self, db_session):
+        """Тест конкурентных пополнений и списаний кошелька в режиме полос"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = await _create_striped_wallet(client, 100.00, stripes=4)
+            assert await _stripe_balances(wallet_id) == {
+                0: Decimal("25.00"),
+                1: Decimal("25.00"),
+                2: Decimal("25.00"),
+                3: Decimal("25.00"),
+            }
+
+            responses = await asyncio.gather(
+                *[
+                    client.post(
+                        f"/api/v1/wallets/{wallet_id}/operation",
+                        json={"operation_type": operation_type, "amount": amount},
+                    )
+                    for operation_type, amount in [("DEPOSIT", 5.00)] * 20
+                    + [("WITHDRAW", 3.00)] * 10
+                ]
+            )
+            assert all(r.status_code == 200 for r in responses)
+
+            get_response = await client.get(f"/api/v1/wallets/{wallet_id}")
+            assert get_response.json()["balance"] == "170.00"
+            stripes = await _stripe_balances(wallet_id)
+            assert sum(stripes.values()) == Decimal("170.00")
+            assert all(balance >= 0 for balance in stripes.values())
+
+            history = await client.get(
+                f"/api/v1/wallets/{wallet_id}/wallet_transactions"
+            )
+            assert len(history.json()) == 31
+
+            # Сводка по полосам складывается в одну строку за день
+            stats = await client.get(f"/api/v1/wallets/{wallet_id}/stats")
+            [item] = stats.json()["items"]
+            assert item["deposit_count"] == 21
+            assert float(item["deposit_total"]) == 200.00
+            assert item["withdraw_count"] == 10
+            assert float(item["withdraw_total"]) == 30.00
+
+    async def test_single_stripe_balance_unknown(self, db_session):
+        """Тест, что операция над одной полосой не записывает выдуманный баланс"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = await _create_striped_wallet(client, 100.00, stripes=4)
+
+            response = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 500.00},
+            )
+            assert response.status_code == 200
+            assert response.json()["new_balance"] is None
+
+            # Списание из нескольких полос блокирует все полосы: баланс точный
+            response = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "WITHDRAW", "amount": 550.00},
+            )
+            assert response.json()["new_balance"] == "50.00"
+
+            history = (
+                await client.get(f"/api/v1/wallets/{wallet_id}/wallet_transactions")
+            ).json()
+            assert [
+                (item["previous_balance"], item["new_balance"]) for item in history
+            ] == [("600.00", "50.00"), (None, None), ("0.00", "100.00")]
+            export = await client.get(
+                f"/api/v1/wallets/{wallet_id}/transactions/export",
+                params={"format": "csv"},
+            )
+            assert ",DEPOSIT,500.00,,," in export.text
+
+            # Минимум и максимум сводки - только по операциям с известным балансом
+            [item] = (await client.get(f"/api/v1/wallets/{wallet_id}/stats")).json()[
+                "items"
+            ]
+            assert item["min_balance"] == "0.00"
+            assert item["max_balance"] == "600.00"
+
+    async def test_withdraw_drains_several_stripes(self, db_session):
+        """Тест списания, для которого не хватает одной полосы"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = await _create_striped_wallet(client, 100.00, stripes=4)
+
+            response = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "WITHDRAW", "amount": 60.00},
+            )
+            assert response.status_code == 200
+            assert response.json()["new_balance"] == "40.00"
+            stripes = await _stripe_balances(wallet_id)
+            assert sorted(stripes.values()) == [
+                Decimal("0.00"),
+                Decimal("0.00"),
+                Decimal("15.00"),
+                Decimal("25.00"),
+            ]
+
+            response = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "WITHDRAW", "amount": 50.00},
+            )
+            assert response.status_code == 400
+            assert "Текущий баланс: 40.00" in response.json()["detail"]
+
+    async def test_disable_stripes(self, db_session):
+        """Тест возврата баланса из полос в строку кошелька"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = await _create_striped_wallet(client, 100.00, stripes=3)
+            await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 20.00},
+            )
+
+            async with TestingSessionLocal() as session:
+                wallet = await WalletService(session).set_stripes(
+                    uuid.UUID(wallet_id), 0
+                )
+            assert wallet.balance == Decimal("120.00")
+            assert await _stripe_balances(wallet_id) == {}
+
+            response = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "WITHDRAW", "amount": 30.00},
+            )
+            assert response.json()["new_balance"] == "90.00"
+
+    async def test_batch_operations(self, db_session):
+        """Тест пакета операций над кошельком в режиме полос"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = await _create_striped_wallet(client, 90.00, stripes=3)
+
+            response = await client.post(
+                "/api/v1/wallets/operations/batch",
+                json={
+                    "mode": "ALL_OR_NOTHING",
+                    "operations": [
+                        {
+                            "wallet_id": wallet_id,
+                            "operation_type": "WITHDRAW",
+                            "amount": 70,
+                        },
+                        {
+                            "wallet_id": wallet_id,
+                            "operation_type": "DEPOSIT",
+                            "amount": 10,
+                        },
+                    ],
+                },
+            )
+            assert response.status_code == 200
+            assert [r["new_balance"] for r in response.json()["results"]] == [
+                "20.00",
+                "30.00",
+            ]
+            stripes = await _stripe_balances(wallet_id)
+            assert sum(stripes.values()) == Decimal("30.00")
+            assert all(balance >= 0 for balance in stripes.values())
+
+
+class TestStripeSpreading:
+    """Тесты распределения изменения баланса по полосам"""
+
+    def test_spread_stripe_change(self):
+        balances = {0: Decimal("10"), 1: Decimal("30"), 2: Decimal("30")}
+
+        assert spread_stripe_change(balances, Decimal("5")) == {0: Decimal("15")}
+        assert spread_stripe_change(balances, Decimal("-45")) == {
+            1: Decimal("0"),
+            2: Decimal("15"),
+        }
+        with pytest.raises(ValueError):
+            spread_stripe_change(balances, Decimal("-71"))
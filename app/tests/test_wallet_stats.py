@@ -0,0 +1,135 @@
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+
+from app.main import app
+from app.models.wallet import Transaction
+from app.services.stats import WalletStatsService
+from app.tests.conftest import TestingSessionLocal
+
+
+async def _operation(client: AsyncClient, wallet_id: str, operation_type, amount):
+    return await client.post(
+        f"/api/v1/wallets/{wallet_id}/operation",
+        json={"operation_type": operation_type, "amount": amount},
+    )
+
+
+@pytest.mark.asyncio
+class TestWalletStatsAPI:
+    """Тесты сводки операций кошелька"""
+
+    async def test_stats_updated_by_operations(self, db_session):
+        """Тест обновления дневной сводки операциями над кошельком"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = (await client.post("/api/v1/wallets/")).json()["id"]
+            await _operation(client, wallet_id, "DEPOSIT", 100.00)
+            await _operation(client, wallet_id, "WITHDRAW", 30.00)
+            await _operation(client, wallet_id, "WITHDRAW", 500.00)
+            await client.post(
+                "/api/v1/wallets/operations/batch",
+                json={
+                    "operations": [
+                        {
+                            "wallet_id": wallet_id,
+                            "operation_type": "DEPOSIT",
+                            "amount": 50,
+                        }
+                    ]
+                },
+            )
+
+            response = await client.get(f"/api/v1/wallets/{wallet_id}/stats")
+
+            assert response.status_code == 200
+            data = response.json()
+            assert data["bucket"] == "day"
+            assert len(data["items"]) == 1
+            item = data["items"][0]
+            assert item["period"] == datetime.now(timezone.utc).date().isoformat()
+            assert float(item["deposit_total"]) == 150.00
+            assert item["deposit_count"] == 2
+            assert float(item["withdraw_total"]) == 30.00
+            # Отклоненное списание в сводку не попадает
+            assert item["withdraw_count"] == 1
+            assert float(item["min_balance"]) == 0.00
+            assert float(item["max_balance"]) == 120.00
+
+    async def test_stats_backfill_and_buckets(self, db_session, fake_redis):
+        """Тест пересчета сводки по истории и группировки по месяцам"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            wallet_id = (await client.post("/api/v1/wallets/")).json()["id"]
+            history = [
+                (datetime(2020, 1, 10, 12, tzinfo=timezone.utc), "DEPOSIT", 100),
+                (datetime(2020, 1, 10, 13, tzinfo=timezone.utc), "WITHDRAW", 40),
+                (datetime(2020, 1, 20, 9, tzinfo=timezone.utc), "DEPOSIT", 10),
+                (datetime(2020, 2, 1, 0, tzinfo=timezone.utc), "WITHDRAW", 70),
+            ]
+            balance = Decimal(0)
+            async with TestingSessionLocal() as session:
+                async with session.begin():
+                    for created_at, operation_type, amount in history:
+                        delta = amount if operation_type == "DEPOSIT" else -amount
+                        session.add(
+                            Transaction(
+                                wallet_id=uuid.UUID(wallet_id),
+                                operation_type=operation_type,
+                                amount=Decimal(amount),
+                                previous_balance=balance,
+                                new_balance=balance + delta,
+                                created_at=created_at,
+                            )
+                        )
+                        balance += delta
+
+            url = f"/api/v1/wallets/{wallet_id}/stats"
+            assert (await client.get(url)).json()["items"] == []
+
+            async with TestingSessionLocal() as session:
+                await WalletStatsService(session).backfill()
+            async with TestingSessionLocal() as session:
+                # Повторный пересчет не удваивает сводку
+                await WalletStatsService(session).backfill()
+
+            days = (await client.get(url)).json()["items"]
+            assert [item["period"] for item in days] == [
+                "2020-01-10",
+                "2020-01-20",
+                "2020-02-01",
+            ]
+            assert days[0]["deposit_count"] == 1
+            assert float(days[0]["withdraw_total"]) == 40.00
+            assert float(days[0]["max_balance"]) == 100.00
+
+            months = (await client.get(url, params={"bucket": "month"})).json()
+            assert [
+                (
+                    item["period"],
+                    float(item["deposit_total"]),
+                    float(item["withdraw_total"]),
+                )
+                for item in months["items"]
+            ] == [("2020-01-01", 110.00, 40.00), ("2020-02-01", 0.00, 70.00)]
+
+            ranged = await client.get(
+                url, params={"from": "2020-01-15", "to": "2020-02-01"}
+            )
+            assert [item["period"] for item in ranged.json()["items"]] == [
+                "2020-01-20",
+                "2020-02-01",
+            ]
+
+    async def test_stats_invalid_requests(self, db_session):
+        """Тест сводки НЕ существующего кошелька и неверного периода"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.get(f"/api/v1/wallets/{uuid.uuid4()}/stats")
+            assert response.status_code == 404
+
+            wallet_id = (await client.post("/api/v1/wallets/")).json()["id"]
+            response = await client.get(
+                f"/api/v1/wallets/{wallet_id}/stats", params={"bucket": "week"}
+            )
+            assert response.status_code == 422
@@ -1,8 +1,15 @@
 import pytest
 from httpx import AsyncClient
 import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 
+from pydantic import TypeAdapter
+
+from app.archive.segment import ArchivedTransaction
 from app.main import app
+from app.schemas.transaction import TransactionResponse
+from app.utils.export import format_history_json
 
 
 @pytest.mark.asyncio
@@ -240,3 +247,184 @@ class TestWalletAPI:
                 data[0]["wallet_id"] == data_transaction_2["wallet_id"],
                 data[0]["wallet_id"] == data_transaction_3["wallet_id"],
             ]
+
+    async def test_operation_nonexistent_wallet(self, db_session):
+        """Тест операции над несуществующим кошельком"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.post(
+                f"/api/v1/wallets/{uuid.uuid4()}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 100.00},
+            )
+
+            assert response.status_code == 404
+
+    async def test_operation_transaction_balances(self, db_session):
+        """Тест записи предыдущего и нового баланса в транзакции"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+
+            await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "DEPOSIT", "amount": 300.00},
+            )
+            response = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "WITHDRAW", "amount": 120.00},
+            )
+            assert response.json()["new_balance"] == "180.00"
+
+            # Неудачное списание не должно создавать транзакцию
+            failed = await client.post(
+                f"/api/v1/wallets/{wallet_id}/operation",
+                json={"operation_type": "WITHDRAW", "amount": 500.00},
+            )
+            assert failed.status_code == 400
+
+            history = await client.get(
+                f"/api/v1/wallets/{wallet_id}/wallet_transactions"
+            )
+            data = history.json()
+            assert len(data) == 2
+            withdraw = next(t for t in data if t["operation_type"] == "WITHDRAW")
+            assert withdraw["id"] == response.json()["transaction_id"]
+            assert withdraw["previous_balance"] == "300.00"
+            assert withdraw["new_balance"] == "180.00"
+
+    async def test_wallet_transactions_cursor_pagination(self, db_session):
+        """Тест постраничного получения истории по курсору"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+
+            transaction_ids = []
+            for amount in [100.00, 200.00, 300.00, 400.00, 500.00]:
+                response = await client.post(
+                    f"/api/v1/wallets/{wallet_id}/operation",
+                    json={"operation_type": "DEPOSIT", "amount": amount},
+                )
+                transaction_ids.append(response.json()["transaction_id"])
+
+            # Проходим всю историю страницами по 2 операции
+            pages = []
+            params = {"limit": 2}
+            while True:
+                response = await client.get(
+                    f"/api/v1/wallets/{wallet_id}/wallet_transactions", params=params
+                )
+                assert response.status_code == 200
+                pages.append([t["id"] for t in response.json()])
+                next_cursor = response.headers.get("X-Next-Cursor")
+                if not next_cursor:
+                    break
+                params = {"limit": 2, "cursor": next_cursor}
+
+            assert [len(page) for page in pages] == [2, 2, 1]
+            assert [t for page in pages for t in page] == transaction_ids[::-1]
+
+            # Смещение по-прежнему работает
+            response = await client.get(
+                f"/api/v1/wallets/{wallet_id}/wallet_transactions",
+                params={"skip": 2, "limit": 2},
+            )
+            assert [t["id"] for t in response.json()] == pages[1]
+
+    async def test_wallet_transactions_invalid_pagination(self, db_session):
+        """Тест неверного курсора и превышения размера страницы"""
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+
+            response = await client.get(
+                f"/api/v1/wallets/{wallet_id}/wallet_transactions",
+                params={"cursor": "invalid"},
+            )
+            assert response.status_code == 400
+
+            response = await client.get(
+                f"/api/v1/wallets/{wallet_id}/wallet_transactions",
+                params={"limit": 100000},
+            )
+            assert response.status_code == 422
+
+    async def test_export_wallet_transactions(self, db_session):
+        """Тест потоковой выгрузки истории операций в NDJSON и CSV"""
+        import json
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            create_response = await client.post("/api/v1/wallets/")
+            wallet_id = create_response.json()["id"]
+
+            for operation in [("DEPOSIT", 500.00), ("WITHDRAW", 120.50)]:
+                await client.post(
+                    f"/api/v1/wallets/{wallet_id}/operation",
+                    json={"operation_type": operation[0], "amount": operation[1]},
+                )
+
+            response = await client.get(
+                f"/api/v1/wallets/{wallet_id}/transactions/export"
+            )
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/x-ndjson"
+            rows = [json.loads(line) for line in response.text.splitlines()]
+            assert [row["operation_type"] for row in rows] == ["DEPOSIT", "WITHDRAW"]
+            assert rows[1]["previous_balance"] == "500.00"
+            assert rows[1]["new_balance"] == "379.50"
+
+            response = await client.get(
+                f"/api/v1/wallets/{wallet_id}/transactions/export",
+                params={"format": "csv"},
+            )
+            assert response.status_code == 200
+            lines = response.text.splitlines()
+            assert lines[0].startswith("id,wallet_id,operation_type")
+            assert len(lines) == 3
+
+            # Фильтр по дате из будущего не возвращает строк
+            response = await client.get(
+                f"/api/v1/wallets/{wallet_id}/transactions/export",
+                params={"date_from": "2999-01-01T00:00:00+00:00"},
+            )
+            assert response.text == ""
+
+            response = await client.get(
+                f"/api/v1/wallets/{uuid.uuid4()}/transactions/export"
+            )
+            assert response.status_code == 404
+
+
+class TestHistorySerialization:
+    """Тесты сериализации страницы истории без pydantic"""
+
+    def test_history_json_matches_pydantic(self):
+        """Тест: JSON страницы истории побайтно совпадает с сериализацией pydantic"""
+        wallet_id = uuid.uuid4()
+        moments = [
+            datetime(2024, 1, 1, tzinfo=timezone.utc),
+            datetime(2024, 1, 1, 12, 30, 5, 120000, tzinfo=timezone.utc),
+            datetime(2024, 1, 1, 3, 0, 0, 5, tzinfo=timezone(timedelta(hours=3))),
+        ]
+        amounts = [Decimal("100.00"), Decimal("0.00"), Decimal("1E+2")]
+        rows = [
+            ArchivedTransaction(
+                uuid.uuid4(),
+                wallet_id,
+                operation_type,
+                amount,
+                Decimal("12345678901234567.89"),
+                amount,
+                created_at,
+            )
+            for operation_type in ("DEPOSIT", "WITHDRAW")
+            for amount in amounts
+            for created_at in moments
+        ]
+        # Операция над одной полосой кошелька: баланс неизвестен
+        rows.append(rows[0]._replace(previous_balance=None, new_balance=None))
+        adapter = TypeAdapter(list[TransactionResponse])
+        expected = adapter.dump_json(
+            adapter.validate_python(rows, from_attributes=True)
+        )
+
+        assert format_history_json(rows) == expected
+        assert format_history_json([]) == adapter.dump_json([])
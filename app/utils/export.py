@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterable, Optional, Sequence
+
+from app.schemas.transaction import ExportFormat
+
+EXPORT_COLUMNS = (
+    "id",
+    "wallet_id",
+    "operation_type",
+    "amount",
+    "previous_balance",
+    "new_balance",
+    "created_at",
+)
+
+# Типы операций в виде строк JSON
+_OPERATION_TYPES = {name: json.dumps(name) for name in ("DEPOSIT", "WITHDRAW")}
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+
+def _value_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _row_values(row: Sequence) -> list[Optional[str]]:
+    """
+    Значения строки в том же виде, что и в ответах API. Неизвестный
+    баланс (None) - null в NDJSON и пустое значение в CSV
+    """
+    return [_value_text(value) for value in row]
+
+
+def format_csv_header() -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_COLUMNS)
+    return buffer.getvalue().encode()
+
+
+def format_csv_rows(rows: Iterable[Sequence]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(_row_values(row) for row in rows)
+    return buffer.getvalue().encode()
+
+
+def format_ndjson_rows(rows: Iterable[Sequence]) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, _row_values(row)))) + "\n" for row in rows
+    ).encode()
+
+
+# Элемент страницы истории в JSON (как у pydantic: без пробелов)
+_HISTORY_ITEM = (
+    '{"id":"%s","wallet_id":"%s","operation_type":%s,"amount":"%s",'
+    '"previous_balance":%s,"new_balance":%s,"created_at":"%s"}'
+)
+
+
+def _json_balance(value) -> str:
+    """Баланс в JSON: строка Decimal или null, если баланс неизвестен"""
+    return "null" if value is None else '"%s"' % value
+
+
+def format_history_json(rows: Iterable[Sequence]) -> bytes:
+    """
+    Страница истории в JSON за один проход, без валидации pydantic.
+
+    Строки - кортежи колонок EXPORT_COLUMNS. Результат побайтно совпадает
+    с ответом FastAPI для ``list[TransactionResponse]``: id - строки UUID,
+    суммы - строки Decimal (неизвестный баланс - null), время - ISO 8601,
+    UTC с суффиксом Z.
+    Экранирования может требовать только тип операции
+    """
+    # Страница обычно принадлежит одному кошельку
+    wallet_ids: dict = {}
+    items = []
+    for id, wallet_id, operation_type, amount, previous, new, created_at in rows:
+        wallet = wallet_ids.get(wallet_id)
+        if wallet is None:
+            wallet = wallet_ids[wallet_id] = str(wallet_id)
+        moment = created_at.isoformat()
+        if moment.endswith("+00:00"):
+            moment = moment[:-6] + "Z"
+        items.append(
+            _HISTORY_ITEM
+            % (
+                str(id),
+                wallet,
+                _OPERATION_TYPES.get(operation_type) or json.dumps(operation_type),
+                str(amount),
+                _json_balance(previous),
+                _json_balance(new),
+                moment,
+            )
+        )
+    return ("[" + ",".join(items) + "]").encode()
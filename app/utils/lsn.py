@@ -0,0 +1,25 @@
+from typing import Optional
+
+
+def parse_lsn(value: Optional[str]) -> Optional[int]:
+    """
+    Позиция в журнале WAL (pg_lsn, например ``16/B374D848``) как число.
+    Возвращает None для пустого или неверного значения
+    """
+    if not value:
+        return None
+    high, sep, low = value.partition("/")
+    if not sep:
+        return None
+    try:
+        high_value, low_value = int(high, 16), int(low, 16)
+    except ValueError:
+        return None
+    if not (0 <= high_value < 1 << 32 and 0 <= low_value < 1 << 32):
+        return None
+    return high_value << 32 | low_value
+
+
+def format_lsn(value: int) -> str:
+    """Позиция в журнале WAL в текстовом виде pg_lsn"""
+    return f"{value >> 32:X}/{value & 0xFFFFFFFF:X}"
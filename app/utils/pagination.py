@@ -0,0 +1,23 @@
+import base64
+import uuid
+from datetime import datetime
+
+from app.utils.dates import as_utc
+
+
+def encode_cursor(created_at: datetime, transaction_id: uuid.UUID) -> str:
+    """Непрозрачный курсор истории из (created_at, id) последней транзакции"""
+    raw = f"{created_at.isoformat()}|{transaction_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Разбор курсора истории, при неверном курсоре - ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, transaction_id = (
+            base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        )
+        return as_utc(datetime.fromisoformat(created_at)), uuid.UUID(transaction_id)
+    except Exception:
+        raise ValueError(f"Неверный курсор: {cursor}")
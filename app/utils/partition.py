@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+
+PARTITION_PREFIX = "transactions_y"
+
+
+def month_start(value: datetime) -> datetime:
+    """Начало месяца (UTC), в который попадает момент времени"""
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    """Начало месяца через ``count`` месяцев"""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    """Имя месячной партиции таблицы transactions"""
+    return f"{PARTITION_PREFIX}{month.year:04d}m{month.month:02d}"
@@ -1,5 +1,6 @@
+import hashlib
 import uuid
-from decimal import Decimal
+from decimal import ROUND_DOWN, Decimal
 
 from loguru import logger
 
@@ -25,9 +26,65 @@ def calculate_new_balance(
                 requested_amount=amount,
             )
         withdraw = current_balance - amount
-        logger.debug(f"Списание средств выполнено успешно")
+        logger.debug("Списание средств выполнено успешно")
         return withdraw
 
     else:
-        logger.error(f"Неизвестный тип операции: {operation_type}")
+        logger.error("Неизвестный тип операции: {}", operation_type)
         raise ValueError(f"Неизвестный тип операции: {operation_type}")
+
+
+def calculate_balance_delta(operation_type: str, amount: Decimal) -> Decimal:
+    """Изменение баланса со знаком для указанного типа операции"""
+    if operation_type == OperationType.DEPOSIT:
+        return amount
+
+    elif operation_type == OperationType.WITHDRAW:
+        return -amount
+
+    else:
+        logger.error("Неизвестный тип операции: {}", operation_type)
+        raise ValueError(f"Неизвестный тип операции: {operation_type}")
+
+
+def split_balance(balance: Decimal, stripes: int) -> list[Decimal]:
+    """Деление баланса на полосы поровну, остаток от округления - в полосу 0"""
+    share = (balance / stripes).quantize(Decimal("0.01"), rounding=ROUND_DOWN)
+    return [balance - share * (stripes - 1)] + [share] * (stripes - 1)
+
+
+def spread_stripe_change(
+    balances: dict[int, Decimal], delta: Decimal
+) -> dict[int, Decimal]:
+    """
+    Новые балансы полос после изменения суммарного баланса на ``delta``.
+
+    Пополнение зачисляется на полосу с наименьшим балансом. Списание
+    забирает средства из полос по убыванию баланса (при равных балансах -
+    по номеру полосы), пока сумма не будет покрыта. Возвращает только
+    изменившиеся полосы
+    """
+    if delta >= 0:
+        stripe = min(balances, key=lambda s: (balances[s], s))
+        return {stripe: balances[stripe] + delta} if delta else {}
+
+    remaining = -delta
+    changed = {}
+    for stripe in sorted(balances, key=lambda s: (-balances[s], s)):
+        if not remaining:
+            break
+        taken = min(balances[stripe], remaining)
+        if taken:
+            changed[stripe] = balances[stripe] - taken
+            remaining -= taken
+    if remaining:
+        raise ValueError("Сумма списания больше суммарного баланса полос")
+    return changed
+
+
+def operation_request_hash(
+    wallet_id: uuid.UUID, operation_type: str, amount: Decimal
+) -> str:
+    """Отпечаток запроса операции для проверки повторов по ключу идемпотентности"""
+    raw = f"{wallet_id}:{operation_type}:{amount:.2f}"
+    return hashlib.sha256(raw.encode()).hexdigest()